@@ -1,6 +1,26 @@
+import argparse
+import contextlib
+import sys
+
 import requests
-import geopandas as gpd
-from io import BytesIO
+import numpy as np
+
+from ingesta.liviano import centroides_paginado
+from ingesta.metricas import corrida, etapa, perfilar
+from ingesta.pipeline import MOTORES
+from ingesta.sql import armar_insert, direcciones_con_respaldo, renderizar_filas
+
+parser = argparse.ArgumentParser(description="Descarga parcelas de IDECOR en la zona y muestra el INSERT de casas.")
+parser.add_argument("--reporte", metavar="ARCHIVO.json",
+                    help="Guarda un reporte JSON con tiempos por etapa, bytes descargados, parcelas/s y pico de memoria")
+parser.add_argument("--perfil", metavar="ARCHIVO",
+                    help="Perfila toda la corrida y guarda el resultado (.prof con cprofile, .html con pyinstrument)")
+parser.add_argument("--motor", choices=MOTORES, default="geopandas",
+                    help="liviano: centroides con numpy sin geopandas (arranca rápido y usa menos memoria, "
+                         "sin checkpoint); mismo resultado que geopandas")
+parser.add_argument("--perfilador", choices=["cprofile", "pyinstrument"], default="cprofile",
+                    help="Perfilador a usar con --perfil (por defecto cprofile)")
+args = parser.parse_args()
 
 # --- Función para convertir Grados, Minutos, Segundos (DMS) a Grados Decimales ---
 def dms_to_decimal(degrees, minutes, seconds, direction):
@@ -32,8 +52,6 @@ min_lon_d = dms_to_decimal(64, 27, 44.3, 'W')  # ≈ -64.462306
 max_lon_d = dms_to_decimal(64, 26, 6.6, 'W')   # ≈ -64.435167
 
 
-# Formato del BBOX para WFS: minLon,minLat,maxLon,maxLat,CRS
-bbox_coords = f"{min_lon_d},{min_lat_d},{max_lon_d},{max_lat_d}"
 crs_code = "EPSG:4326" # Sistema de Coordenadas de Referencia (WGS84 para lat/lon)
 
 # --- 2. Configuración del servicio WFS de IDECOR ---
@@ -44,105 +62,79 @@ wfs_url = "https://idecor-ws.mapascordoba.gob.ar/geoserver/idecor/wfs"
 # Si este nombre no es exacto, el script no encontrará datos.
 layer_name = "idecor:parcelas" # <<<<<<< ¡VERIFICÁ Y CAMBIÁ ESTO SI ES NECESARIO!
 
-# --- 3. Parámetros para la solicitud WFS GetFeature ---
-params = {
-    'service': 'WFS',
-    'version': '1.0.0', # La versión común. Podría ser '2.0.0' en algunos casos.
-    'request': 'GetFeature',
-    'typeName': layer_name,
-    'outputFormat': 'application/json', # Pedimos GeoJSON
-    'srsName': crs_code, # Especificamos el CRS para la salida
-    'bbox': f"{bbox_coords},{crs_code}" # Aplicamos el filtro de la zona
-}
+# --- 3. Descarga paginada (WFS 2.0 startIndex/count) ---
+# Cuántas parcelas se piden por página; la memoria queda acotada a una página a la vez
+tamano_pagina = 1000
 
 # --- 4. Realizar la solicitud al WFS ---
 print(f"Intentando obtener datos de la capa '{layer_name}' de IDECOR...")
-print(f"URL de la solicitud (para depuración): {wfs_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}")
-
-try:
-    response = requests.get(wfs_url, params=params)
-    response.raise_for_status() # Lanza una excepción para errores HTTP (4xx o 5xx)
 
-    # Verificar si la respuesta es GeoJSON
-    content_type = response.headers.get('content-type', '').split(';')[0].strip()
-    if content_type == 'application/json':
-        geojson_data = response.json()
-        if not geojson_data or not geojson_data.get('features'):
+# Con --reporte/--perfil se mide cada etapa (descarga, parseo, centroides, SQL) para ver dónde se va el tiempo
+perfil = perfilar(args.perfil, args.perfilador) if args.perfil else contextlib.nullcontext()
+with corrida("agregar_casas") as metricas, perfil:
+    try:
+        # Cada página se lee en stream y se reduce a centroides antes de pedir la siguiente
+        if args.motor == "liviano":
+            gdf = centroides_paginado(
+                wfs_url,
+                layer_name,
+                (min_lon_d, min_lat_d, max_lon_d, max_lat_d),
+                crs_code=crs_code,
+                tamano_pagina=tamano_pagina,
+            )
+        else:
+            from ingesta.checkpoint import ruta_checkpoint
+            from ingesta.wfs import descargar_centroides_paginado
+
+            gdf = descargar_centroides_paginado(
+                wfs_url,
+                layer_name,
+                (min_lon_d, min_lat_d, max_lon_d, max_lat_d),
+                crs_code=crs_code,
+                tamano_pagina=tamano_pagina,
+                # Cada página queda guardada: si la corrida se corta, la próxima sigue desde donde quedó
+                checkpoint=ruta_checkpoint(wfs_url, layer_name, (min_lon_d, min_lat_d, max_lon_d, max_lat_d), crs_code),
+            )
+        metricas.datos.update(bbox=[min_lon_d, min_lat_d, max_lon_d, max_lat_d], parcelas=len(gdf))
+        if gdf.empty:
             print("No se encontraron elementos (parcelas/casas) en la zona delimitada o la capa no tiene datos.")
             print("Por favor, verifica el 'layer_name' y las coordenadas del 'bbox'.")
             exit()
 
-        gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
-        
-        # --- SOLUCIÓN AL ERROR DE GEOMETRÍAS NAIVE ---
-        # Forzamos el CRS de la GeoDataFrame. Asumimos que los datos ya vienen en EPSG:4326.
-        gdf.set_crs(crs_code, allow_override=True, inplace=True)
-        # -----------------------------------------------
-
-    else:
-        print(f"Error: El servicio WFS no devolvió 'application/json'. Tipo de contenido recibido: {content_type}")
-        print("Esto puede significar que el 'outputFormat' no es soportado o la solicitud es incorrecta.")
-        print("Intenta revisar la documentación de IDECOR o usar QGIS para depurar la conexión WFS.")
-        exit()
-
-    # --- 5. Procesar los datos y generar los centroides ---
-    if gdf.crs != crs_code:
-        gdf = gdf.to_crs(crs_code)
-
-    # Calcular el centroide de cada geometría (parcela/casa)
-    # Algunas geometrías pueden ser nulas o inválidas, las filtramos
-    gdf['centroid'] = gdf.geometry.centroid
-    gdf = gdf[gdf['centroid'].is_valid]
-
-    # Extraer latitud y longitud
-    gdf['latitud'] = gdf['centroid'].y
-    gdf['longitud'] = gdf['centroid'].x
-
-    # --- 6. Formatear la salida SQL con ID inicial en 2500 ---
-    filas_sql = []
-    # Inicializa el contador de ID
-    current_id = 0 
-
-    for index, row in gdf.iterrows():
-        # Puedes seguir usando 'nomenclatura' o 'gid' si quieres una 'dirección' más descriptiva
-        # Si prefieres que el ID numérico sea la "dirección", simplemente usa current_id.
-        direccion = ""
-        if 'nomenclatura' in row and row['nomenclatura']:
-            direccion = str(row['nomenclatura'])
-        elif 'gid' in row and row['gid']:
-            direccion = str(row['gid'])
+        # --- 6. Formatear la salida SQL con ID inicial en 2500 ---
+        # Las filas se arman columna por columna sobre toda la frame, sin iterrows
+        ids = np.arange(len(gdf))
+
+        # Puedes seguir usando 'nomenclatura' o 'gid' si quieres una 'dirección' más descriptiva.
+        # Si no hay nomenclatura ni gid, usa un ID basado en el contador
+        direcciones = direcciones_con_respaldo(gdf, ids)
+
+        # Las comillas simples de la dirección se escapan doblándolas dentro de renderizar_filas
+        with etapa("sql") as medicion:
+            filas_sql = renderizar_filas(direcciones, gdf['latitud'], gdf['longitud'], ids=ids)
+            medicion.items = len(filas_sql)
+
+        if len(filas_sql):
+            # **Modificación en el INSERT INTO para incluir el nuevo campo 'id'**
+            # Asume que tu tabla `casas` tiene una columna `id` (por ejemplo, INT PRIMARY KEY)
+            sql_insert = armar_insert(filas_sql, tabla="casas")
+
+            with etapa("impresion"):
+                print("\n--- SQL Generado ---")
+                print(sql_insert)
         else:
-            # Si no hay nomenclatura ni gid, usa un ID basado en el contador
-            direccion = f"IDECOR_Parcela_{current_id}" 
-
-        lat = row['latitud']
-        lon = row['longitud']
-
-        # Escapar comillas simples en la dirección para SQL (doblando la comilla)
-        direccion_escaped = str(direccion).replace("'", "''")
-
-        # **Aquí está el cambio clave:** Agregamos el `current_id` a la inserción
-        filas_sql.append(f"({current_id}, '{direccion_escaped}', {lat}, {lon})")
-        
-        # Incrementa el ID para la siguiente fila
-        current_id += 1
-
-    if filas_sql:
-        # Generar la parte de las filas del SQL por separado
-        filas_unidas = ',\n'.join(filas_sql)
-
-        # **Modificación en el INSERT INTO para incluir el nuevo campo 'id'**
-        # Asume que tu tabla `casas` tiene una columna `id` (por ejemplo, INT PRIMARY KEY)
-        sql_insert = f"""INSERT INTO casas (id, direccion, latitud, longitud) VALUES
-{filas_unidas};"""
-
-        print("\n--- SQL Generado ---")
-        print(sql_insert)
-    else:
-        print("No se generaron filas SQL. Posiblemente no se encontraron parcelas en la zona.")
-
-except requests.exceptions.RequestException as e:
-    print(f"Error al conectar o recibir datos del servicio WFS de IDECOR: {e}")
-    print("Por favor, verifica tu conexión a internet, la URL del WFS, y si el servicio está activo.")
-except Exception as e:
-    print(f"Ocurrió un error inesperado: {e}")
+            print("No se generaron filas SQL. Posiblemente no se encontraron parcelas en la zona.")
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error al conectar o recibir datos del servicio WFS de IDECOR: {e}")
+        print("Por favor, verifica tu conexión a internet, la URL del WFS, y si el servicio está activo.")
+    except Exception as e:
+        print(f"Ocurrió un error inesperado: {e}")
+    finally:
+        # El resumen va a stderr para no mezclarse con el SQL que sale por stdout
+        if args.reporte:
+            metricas.guardar(args.reporte)
+            print(metricas.resumen(), file=sys.stderr)
+            print(f"Reporte de la corrida guardado en {args.reporte}", file=sys.stderr)
+        if args.perfil:
+            print(f"Perfil guardado en {args.perfil}", file=sys.stderr)
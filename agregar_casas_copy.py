@@ -1,6 +1,9 @@
+import json
+
 import requests
 import geopandas as gpd
-from io import BytesIO
+
+from ingesta.cliente import crear_sesion, pedir_condicional
 
 # --- 1. Definición de la zona delimitada (Bounding Box) ---
 
@@ -31,12 +34,13 @@ params = {
 print(f"Solicitando datos a IDECOR para la capa '{layer_name}'...")
 
 try:
-    response = requests.get(wfs_url, params=params)
-    response.raise_for_status()
+    # Sesión con reintentos y timeout; si la zona no cambió desde la última vez, IDECOR contesta 304
+    with crear_sesion(1) as session:
+        contenido, content_type = pedir_condicional(session, wfs_url, params)
 
-    content_type = response.headers.get('content-type', '').split(';')[0].strip()
+    content_type = content_type.split(';')[0].strip()
     if content_type == 'application/json':
-        geojson_data = response.json()
+        geojson_data = json.loads(contenido)
         if not geojson_data.get('features'):
             print("No se encontraron parcelas en el área definida.")
             exit()
@@ -0,0 +1,95 @@
+import argparse
+import csv
+import json
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+from ingesta.cliente import TIMEOUT, crear_sesion
+from ingesta.rutas import armar_rutas, largo_recorrido, proyectar_metros
+
+# Reparte las casas en rutas parejas y compactas, una por persona, en vez de
+# dibujar rectángulos a mano en admin.html.
+parser = argparse.ArgumentParser(description="Arma rutas de visita balanceadas y las asigna con /asignar.")
+parser.add_argument("usuarios", nargs="+", help="Personas a las que se reparten las casas (una ruta por persona)")
+parser.add_argument("--servidor", help="URL de la app (ej. http://localhost:3000): lee /casas y asigna con /asignar")
+parser.add_argument("--archivo", help="En vez del servidor, lee las casas de un .parquet o .csv con id, latitud y longitud")
+parser.add_argument("--fecha", default=date.today().isoformat(), help="Fecha de asignación (por defecto hoy)")
+parser.add_argument("--todas", action="store_true", help="Reparte también las casas que ya tienen a alguien asignado")
+parser.add_argument("--salida", default="rutas", help="Carpeta donde se guardan las rutas en CSV y GeoJSON")
+parser.add_argument("--asignar", action="store_true", help="Manda las asignaciones al servidor (sin esto solo genera archivos)")
+parser.add_argument("--semilla", type=int, default=0, help="Semilla del k-means, para repetir el mismo reparto")
+
+
+def leer_casas(args, session):
+    if args.archivo:
+        ruta = Path(args.archivo)
+        casas = pd.read_parquet(ruta) if ruta.suffix == ".parquet" else pd.read_csv(ruta)
+    else:
+        response = session.get(f"{args.servidor.rstrip('/')}/casas", timeout=TIMEOUT)
+        response.raise_for_status()
+        casas = pd.DataFrame(response.json())
+    if casas.empty:
+        return casas
+    if not args.todas and "asignado_a" in casas:
+        casas = casas[casas["asignado_a"].isna()]
+    # pg devuelve los numeric como texto
+    casas = casas.assign(latitud=pd.to_numeric(casas["latitud"]), longitud=pd.to_numeric(casas["longitud"]))
+    return casas.dropna(subset=["latitud", "longitud"]).reset_index(drop=True)
+
+
+def guardar_rutas(salida, casas, rutas, usuarios):
+    """Una fila por casa en rutas.csv (con su orden de visita) y una línea por ruta en rutas.geojson."""
+    salida.mkdir(parents=True, exist_ok=True)
+    with open(salida / "rutas.csv", "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["usuario", "orden", "id", "direccion", "latitud", "longitud"])
+        for usuario, ruta in zip(usuarios, rutas):
+            parte = casas.iloc[ruta]
+            for orden, casa in enumerate(parte.itertuples(index=False), start=1):
+                escritor.writerow([usuario, orden, casa.id, getattr(casa, "direccion", ""), casa.latitud, casa.longitud])
+
+    features = [{
+        "type": "Feature",
+        "properties": {"usuario": usuario, "casas": len(ruta)},
+        "geometry": {
+            "type": "LineString",
+            "coordinates": casas.iloc[ruta][["longitud", "latitud"]].to_numpy().tolist(),
+        },
+    } for usuario, ruta in zip(usuarios, rutas)]
+    (salida / "rutas.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if not args.servidor and not args.archivo:
+        parser.error("hace falta --servidor o --archivo")
+    if args.asignar and not args.servidor:
+        parser.error("--asignar necesita --servidor")
+
+    with crear_sesion(1) as session:
+        casas = leer_casas(args, session)
+        if casas.empty:
+            print("No hay casas para repartir.")
+            exit()
+
+        rutas = armar_rutas(casas["latitud"], casas["longitud"], len(args.usuarios), semilla=args.semilla)
+        usuarios = args.usuarios[:len(rutas)]
+        puntos = proyectar_metros(casas["latitud"], casas["longitud"])
+        for usuario, ruta in zip(usuarios, rutas):
+            print(f"{usuario}: {len(ruta)} casas, {largo_recorrido(puntos, ruta) / 1000:.1f} km de recorrido")
+
+        salida = Path(args.salida)
+        guardar_rutas(salida, casas, rutas, usuarios)
+        print(f"Rutas guardadas en {salida / 'rutas.csv'} y {salida / 'rutas.geojson'}")
+
+        if args.asignar:
+            url = f"{args.servidor.rstrip('/')}/asignar"
+            for usuario, ruta in zip(usuarios, rutas):
+                ids = casas["id"].to_numpy()[ruta].astype(int).tolist()
+                # Con ordenar=true el servidor escalona fecha_asignacion y la app muestra las casas en este orden
+                response = session.post(url, json={"usuario": usuario, "ids": ids, "fecha": args.fecha, "ordenar": True},
+                                        timeout=TIMEOUT)
+                response.raise_for_status()
+                print(f"Asignadas {len(ids)} casas a {usuario}")
@@ -0,0 +1,208 @@
+"""Benchmark de la ingesta de parcelas de IDECOR contra un WFS local con datos sintéticos.
+
+Mide por separado cada etapa del pipeline (descarga, parseo, armado de la
+GeoDataFrame, centroides, clasificación, generación de SQL y de COPY) y además
+las descargas completas (tiles, tiles con filtro en el servidor y paginada).
+Las etapas *_liviano son lo mismo con el motor sin geopandas (ingesta/liviano.py).
+Cada tamaño corre en un proceso aparte para que el pico de memoria (RSS) sea
+el de ese tamaño y no el acumulado.
+
+    python benchmarks/bench_ingesta.py --parcelas 10000 100000
+    python benchmarks/bench_ingesta.py --guardar-baseline
+
+Los tiempos se comparan con benchmarks/baseline.json: si alguna etapa queda más
+lenta que la tolerancia, el script termina con código 1. El baseline depende de
+la máquina, así que conviene regenerarlo al cambiar de equipo.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import requests
+import geopandas as gpd
+
+# Para poder correrlo como `python benchmarks/bench_ingesta.py` desde la raíz del repo
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from ingesta.clasificacion import clasificar  # noqa: E402
+from ingesta.descarga import FiltroWFS  # noqa: E402
+from ingesta.geometria import calcular_centroides  # noqa: E402
+from ingesta.liviano import centroides, centroides_en_tiles  # noqa: E402
+from ingesta.postgres import escribir_copy, lotes_csv  # noqa: E402
+from ingesta.sql import escribir_inserts_por_lotes, lotes_de_filas  # noqa: E402
+from ingesta.wfs import descargar_centroides_paginado, descargar_parcelas_en_tiles  # noqa: E402
+from parcelas_sinteticas import generar_features  # noqa: E402
+from servidor_wfs import ServidorWFS  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+CAPA = "idecor:parcelas"
+# Margen sobre el baseline antes de considerar que una etapa empeoró (0.5 = 50% más lenta)
+TOLERANCIA = 0.5
+# Por debajo de este tiempo la medición es casi todo ruido y no se compara
+MINIMO_COMPARABLE_SEGUNDOS = 0.05
+
+
+def _rss_pico_mb():
+    # En Linux ru_maxrss viene en KB; en macOS, en bytes
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+@contextlib.contextmanager
+def _cronometro(tiempos, etapa):
+    inicio = time.perf_counter()
+    yield
+    transcurrido = time.perf_counter() - inicio
+    tiempos[etapa] = min(transcurrido, tiempos.get(etapa, float("inf")))
+
+
+def _una_pasada(servidor, bbox, tiempos):
+    """Corre todas las etapas una vez y guarda en `tiempos` el mejor tiempo de cada una."""
+    with _cronometro(tiempos, "descarga"):
+        respuesta = requests.get(servidor.url, params={
+            "service": "WFS", "version": "1.0.0", "request": "GetFeature", "typeName": CAPA,
+            "outputFormat": "application/json", "bbox": ",".join(map(str, bbox)),
+        }, timeout=600)
+        respuesta.raise_for_status()
+        crudo = respuesta.content
+
+    with _cronometro(tiempos, "parseo"):
+        features = json.loads(crudo)["features"]
+
+    with _cronometro(tiempos, "centroides_liviano"):
+        centroides([feature["geometry"] for feature in features])
+
+    with _cronometro(tiempos, "geodataframe"):
+        gdf = gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
+    del features, crudo
+
+    with _cronometro(tiempos, "centroides"):
+        puntos, _ = calcular_centroides(gdf.geometry)
+        gdf["latitud"] = puntos.y
+        gdf["longitud"] = puntos.x
+
+    with _cronometro(tiempos, "clasificacion"):
+        gdf["categoria"] = clasificar(gdf)
+
+    ids = np.arange(len(gdf))
+    with open(os.devnull, "w") as devnull:
+        with _cronometro(tiempos, "sql"):
+            escribir_inserts_por_lotes(devnull, lotes_de_filas(gdf, ids))
+        with _cronometro(tiempos, "copy"):
+            escribir_copy(devnull, lotes_csv(gdf, ids))
+
+    # Las descargas completas imprimen progreso por tile/página: acá solo interesa el tiempo
+    with contextlib.redirect_stdout(io.StringIO()):
+        with _cronometro(tiempos, "tiles_completo"):
+            descargar_parcelas_en_tiles(servidor.url, CAPA, bbox)
+        # Lo mismo pidiéndole a GeoServer solo las edificadas y tres atributos
+        with _cronometro(tiempos, "tiles_filtrado"):
+            descargar_parcelas_en_tiles(servidor.url, CAPA, bbox,
+                                        filtro=FiltroWFS(["Estado", "nomenclatura", "gid"], ["edificadas"]))
+        # Descarga, centroides y atributos sin armar GeoDataFrames
+        with _cronometro(tiempos, "tiles_liviano"):
+            centroides_en_tiles(servidor.url, CAPA, bbox)
+        with _cronometro(tiempos, "paginado_completo"):
+            descargar_centroides_paginado(servidor.url, CAPA, bbox)
+    return len(gdf)
+
+
+def medir(cantidad, repeticiones):
+    """Levanta el WFS local con `cantidad` parcelas sintéticas y mide todas las etapas."""
+    servidor = ServidorWFS(generar_features(cantidad)).iniciar()
+    e = servidor.envolventes
+    bbox = (e[:, 0].min(), e[:, 1].min(), e[:, 2].max(), e[:, 3].max())
+    tiempos = {}
+    try:
+        for _ in range(repeticiones):
+            parcelas = _una_pasada(servidor, bbox, tiempos)
+    finally:
+        servidor.detener()
+
+    return {
+        "etapas": {
+            etapa: {"segundos": round(segundos, 4), "parcelas_por_segundo": round(parcelas / segundos)}
+            for etapa, segundos in tiempos.items()
+        },
+        "rss_pico_mb": round(_rss_pico_mb(), 1),
+    }
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Etapas más lentas (o con más memoria) que el baseline más la tolerancia, y las que no tienen baseline.
+
+    Devuelve (regresiones, sin_baseline): una etapa nueva no se puede comparar,
+    pero tiene que quedar a la vista para que se regenere el baseline.
+    """
+    regresiones = []
+    sin_baseline = []
+    for cantidad, actual in resultados.items():
+        base = baseline.get(cantidad)
+        if not base:
+            sin_baseline.append(f"{cantidad} parcelas (todas las etapas)")
+            continue
+        for etapa, medicion in actual["etapas"].items():
+            if etapa not in base["etapas"]:
+                sin_baseline.append(f"{cantidad} parcelas, {etapa}")
+                continue
+            anterior = base["etapas"][etapa]["segundos"]
+            if anterior < MINIMO_COMPARABLE_SEGUNDOS:
+                continue
+            if medicion["segundos"] > anterior * (1 + tolerancia):
+                regresiones.append(f"{cantidad} parcelas, {etapa}: {anterior:.3f}s -> {medicion['segundos']:.3f}s")
+        if actual["rss_pico_mb"] > base["rss_pico_mb"] * (1 + tolerancia):
+            regresiones.append(f"{cantidad} parcelas, memoria: {base['rss_pico_mb']} MB -> {actual['rss_pico_mb']} MB")
+    return regresiones, sin_baseline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la ingesta de parcelas contra un WFS local.")
+    parser.add_argument("--parcelas", type=int, nargs="+", default=[10000],
+                        help="Tamaños a medir (ej. 10000 100000 1000000)")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Pasadas por tamaño; se queda con el mejor tiempo")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help=f"Cuánto más lenta puede ser una etapa que el baseline (por defecto {TOLERANCIA})")
+    parser.add_argument("--guardar-baseline", action="store_true", help=f"Guarda los resultados en {BASELINE.name}")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar también los resultados de esta corrida")
+    args = parser.parse_args()
+
+    resultados = {}
+    for cantidad in args.parcelas:
+        # Un proceso por tamaño: ru_maxrss nunca baja, así cada pico es el de su tamaño
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            resultado = executor.submit(medir, cantidad, args.repeticiones).result()
+        resultados[str(cantidad)] = resultado
+
+        print(f"\n{cantidad} parcelas (pico de memoria {resultado['rss_pico_mb']} MB)")
+        for etapa, medicion in resultado["etapas"].items():
+            print(f"  {etapa:<18} {medicion['segundos']:>9.3f} s {medicion['parcelas_por_segundo']:>12,} parcelas/s")
+
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(resultados, indent=2) + "\n")
+
+    if args.guardar_baseline:
+        baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        baseline.update(resultados)
+        BASELINE.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\nBaseline guardado en {BASELINE}")
+    elif BASELINE.exists():
+        regresiones, sin_baseline = comparar(resultados, json.loads(BASELINE.read_text()), args.tolerancia)
+        if sin_baseline:
+            print("\nSin baseline para comparar (regenerarlo con --guardar-baseline):")
+            for etapa in sin_baseline:
+                print(f"  {etapa}")
+        if regresiones:
+            print("\nRegresiones respecto del baseline:")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            sys.exit(1)
+        print("\nSin regresiones respecto del baseline.")
@@ -0,0 +1,90 @@
+import argparse
+import json
+import math
+import random
+
+# Centro aproximado de Villa del Prado, para que las parcelas caigan en zonas reales
+CENTRO_LON = -64.39
+CENTRO_LAT = -31.617
+# Tamaño típico de un lote (≈ 12 x 30 m) y de una manzana (10 x 2 lotes) en grados
+LADO_LON = 0.000125
+LADO_LAT = 0.00027
+LOTES_POR_MANZANA = 20
+
+ESTADOS = [
+    ("Edificado", 0.55),
+    ("Baldío", 0.30),
+    ("BALDIO EN CONSTRUCCION", 0.05),
+    ("Sin dato", 0.10),
+]
+
+
+def _estado(rng):
+    r = rng.random()
+    acumulado = 0
+    for estado, peso in ESTADOS:
+        acumulado += peso
+        if r < acumulado:
+            return estado
+    return ESTADOS[-1][0]
+
+
+def generar_features(cantidad, semilla=0, proporcion_invalidas=0.01):
+    """Genera `cantidad` features GeoJSON tipo IDECOR (polígonos de lotes con Estado y nomenclatura).
+
+    Los lotes se ubican en una grilla cuadrada alrededor del centro, con un
+    pequeño corrimiento al azar. Una proporción de parcelas sale con el
+    polígono cruzado (moño) para ejercitar la reparación de geometrías.
+    """
+    rng = random.Random(semilla)
+    columnas = math.ceil(math.sqrt(cantidad))
+    origen_lon = CENTRO_LON - columnas * LADO_LON / 2
+    origen_lat = CENTRO_LAT - columnas * LADO_LAT / 2
+
+    for i in range(cantidad):
+        fila, columna = divmod(i, columnas)
+        x = origen_lon + columna * LADO_LON + rng.uniform(-0.2, 0.2) * LADO_LON
+        y = origen_lat + fila * LADO_LAT + rng.uniform(-0.2, 0.2) * LADO_LAT
+        dx = LADO_LON * rng.uniform(0.8, 0.95)
+        dy = LADO_LAT * rng.uniform(0.8, 0.95)
+        if rng.random() < proporcion_invalidas:
+            anillo = [[x, y], [x + dx, y + dy], [x + dx, y], [x, y + dy], [x, y]]
+        else:
+            anillo = [[x, y], [x + dx, y], [x + dx, y + dy], [x, y + dy], [x, y]]
+
+        manzana, lote = divmod(i, LOTES_POR_MANZANA)
+        yield {
+            "type": "Feature",
+            "id": f"parcelas.{i + 1}",
+            "geometry": {"type": "Polygon", "coordinates": [anillo]},
+            "properties": {
+                "gid": i + 1,
+                "nomenclatura": f"13-01-48-01-01-{manzana:04d}-{lote + 1:03d}",
+                "Estado": _estado(rng),
+            },
+        }
+
+
+def escribir_feature_collection(ruta, features):
+    """Escribe la FeatureCollection de a una feature, sin tenerlas todas en memoria."""
+    total = 0
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for feature in features:
+            if total:
+                f.write(",\n")
+            f.write(json.dumps(feature, ensure_ascii=False))
+            total += 1
+        f.write("\n]}\n")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una FeatureCollection sintética de parcelas tipo IDECOR.")
+    parser.add_argument("cantidad", type=int, help="Cantidad de parcelas (ej. 10000, 1000000)")
+    parser.add_argument("--salida", default="parcelas_sinteticas.geojson", help="Archivo GeoJSON de salida")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla para que el resultado sea reproducible")
+    args = parser.parse_args()
+
+    total = escribir_feature_collection(args.salida, generar_features(args.cantidad, args.semilla))
+    print(f"Archivo generado: {args.salida} ({total} parcelas)")
@@ -0,0 +1,226 @@
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# Límite de features por respuesta, como el maxFeatures de GeoServer
+LIMITE_FEATURES = 100000
+# Nombre de la columna de geometría que informa DescribeFeatureType
+GEOMETRIA = "geom"
+# Lo único que entiende del CQL: el BBOX del pedido y un OR de condiciones ILIKE
+_CQL_BBOX = re.compile(r"^BBOX\((\w+),([^,]+),([^,]+),([^,]+),([^,]+),'[^']*'\) AND \((.*)\)$")
+_CQL_ILIKE = re.compile(r"^\((\w+) ILIKE '%([^%']*)%'\)$")
+
+
+def _puntos(coordenadas):
+    """Todos los puntos de las coordenadas GeoJSON de un Polygon o MultiPolygon."""
+    if not coordenadas:
+        return
+    if isinstance(coordenadas[0], (int, float)):
+        yield coordenadas[:2]
+        return
+    for parte in coordenadas:
+        yield from _puntos(parte)
+
+
+class ServidorWFS:
+    """WFS local que responde GetFeature en GeoJSON sobre un conjunto fijo de features.
+
+    Imita lo que usan los scripts de IDECOR: filtro por `bbox`, paginado con
+    `startIndex`/`count` (o `maxFeatures` en WFS 1.0), límite de features por
+    respuesta y los campos totalFeatures/numberMatched/numberReturned.
+
+    Para probar el cliente HTTP: con `fallas=N` los próximos N pedidos reciben
+    un 503; con `validadores=True` cada respuesta lleva ETag y Last-Modified y
+    un pedido condicional que coincide recibe 304 (subir `version` simula que
+    la capa cambió); con `comprimir=True` se comprime si el cliente lo acepta.
+
+    También responde DescribeFeatureType, `propertyName` y un CQL_FILTER mínimo
+    (BBOX más un OR de ILIKE); cualquier otro CQL recibe un 400, como un
+    filtro que GeoServer no entiende.
+    """
+
+    def __init__(self, features, puerto=0, limite=LIMITE_FEATURES, fallas=0, validadores=False, comprimir=False):
+        # Cada feature se serializa una sola vez; las respuestas solo concatenan bytes
+        self.features = []
+        self.originales = []
+        envolventes = []
+        for feature in features:
+            puntos = np.asarray(list(_puntos((feature["geometry"] or {}).get("coordinates"))), dtype=float)
+            # Sin coordenadas (geometría nula o vacía) no cae en ningún BBOX, como en GeoServer
+            envolventes.append((*puntos.min(axis=0)[:2], *puntos.max(axis=0)[:2]) if len(puntos) else (np.nan,) * 4)
+            self.features.append(json.dumps(feature, ensure_ascii=False).encode("utf-8"))
+            self.originales.append(feature)
+        self.envolventes = np.asarray(envolventes).reshape(-1, 4)
+        self.limite = limite
+        self.fallas = fallas
+        self.validadores = validadores
+        self.comprimir = comprimir
+        self.version = 1
+        self.modificado = formatdate(usegmt=True)
+        self.pedidos = 0
+        self.no_modificados = 0
+        self._http = ThreadingHTTPServer(("127.0.0.1", puerto), self._manejador())
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._http.server_address[:2]
+        return f"http://{host}:{puerto}/geoserver/idecor/wfs"
+
+    def seleccionar(self, bbox):
+        """Índices de las features cuya envolvente se cruza con el BBOX (como hace GeoServer)."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        e = self.envolventes
+        return np.flatnonzero((e[:, 0] <= max_lon) & (e[:, 2] >= min_lon) & (e[:, 1] <= max_lat) & (e[:, 3] >= min_lat))
+
+    def describir(self):
+        """Cuerpo JSON de DescribeFeatureType, con los atributos de la primera feature."""
+        propiedades = self.originales[0]["properties"] if self.originales else {}
+        return json.dumps({"featureTypes": [{
+            "typeName": "parcelas",
+            "properties": [{"name": GEOMETRIA, "type": "gml:Polygon"}]
+            + [{"name": nombre, "type": "xsd:string"} for nombre in propiedades],
+        }]}).encode("utf-8")
+
+    def _filtrar_cql(self, cql):
+        """Índices que cumplen el CQL_FILTER, o None si el CQL no se entiende."""
+        coincidencia = _CQL_BBOX.match(cql)
+        if not coincidencia or coincidencia.group(1) != GEOMETRIA:
+            return None
+        condiciones = [_CQL_ILIKE.match(parte) for parte in coincidencia.group(6).split(" OR ")]
+        if not all(condiciones):
+            return None
+        indices = self.seleccionar([float(v) for v in coincidencia.group(2, 3, 4, 5)])
+        return np.array([
+            i for i in indices
+            if any(c.group(2).upper() in str(self.originales[i]["properties"].get(c.group(1)) or "").upper()
+                   for c in condiciones)
+        ], dtype=int)
+
+    def _serializar(self, i, propiedades):
+        if propiedades is None:
+            return self.features[i]
+        feature = self.originales[i]
+        return json.dumps({
+            **feature,
+            "properties": {k: v for k, v in feature["properties"].items() if k in propiedades},
+        }, ensure_ascii=False).encode("utf-8")
+
+    def responder(self, params):
+        """Arma el cuerpo GeoJSON de un GetFeature (None si el pedido no se entiende)."""
+        if "CQL_FILTER" in params:
+            indices = self._filtrar_cql(params["CQL_FILTER"])
+            if indices is None:
+                return None
+        elif "bbox" in params:
+            indices = self.seleccionar([float(v) for v in params["bbox"].split(",")[:4]])
+        else:
+            indices = np.arange(len(self.features))
+        propiedades = set(params["propertyName"].split(",")) if "propertyName" in params else None
+        inicio = int(params.get("startIndex", 0))
+        cantidad = min(int(params.get("count", params.get("maxFeatures", self.limite))), self.limite)
+        pagina = indices[inicio:inicio + cantidad]
+
+        cabecera = json.dumps({
+            "type": "FeatureCollection",
+            "totalFeatures": len(indices),
+            "numberMatched": len(indices),
+            "numberReturned": len(pagina),
+        })
+        return b"".join([
+            cabecera[:-1].encode("utf-8"),
+            b', "features": [',
+            b",".join(self._serializar(i, propiedades) for i in pagina),
+            b"]}",
+        ])
+
+    def _manejador(self):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _sin_cuerpo(self, estado, encabezados=()):
+                self.send_response(estado)
+                for nombre, valor in encabezados:
+                    self.send_header(nombre, valor)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                servidor.pedidos += 1
+                if servidor.fallas > 0:
+                    servidor.fallas -= 1
+                    self._sin_cuerpo(503, [("Retry-After", "0")])
+                    return
+
+                # El ETag depende de la consulta y de la versión de los datos
+                etag = f'"{hashlib.sha1(f"{servidor.version}:{self.path}".encode()).hexdigest()[:16]}"'
+                validadores = [("ETag", etag), ("Last-Modified", servidor.modificado)] if servidor.validadores else []
+                if servidor.validadores and self.headers.get("If-None-Match") == etag:
+                    servidor.no_modificados += 1
+                    self._sin_cuerpo(304, validadores)
+                    return
+
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                if params.get("request") == "DescribeFeatureType":
+                    cuerpo = servidor.describir()
+                else:
+                    cuerpo = servidor.responder(params)
+                if cuerpo is None:
+                    error = b"<ServiceExceptionReport><ServiceException>Could not parse CQL filter</ServiceException></ServiceExceptionReport>"
+                    self.send_response(400)
+                    self.send_header("Content-Type", "application/xml")
+                    self.send_header("Content-Length", str(len(error)))
+                    self.end_headers()
+                    self.wfile.write(error)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json;charset=UTF-8")
+                if servidor.comprimir and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    cuerpo = gzip.compress(cuerpo, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                for nombre, valor in validadores:
+                    self.send_header(nombre, valor)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+        return Manejador
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sirve un GeoJSON de parcelas como si fuera el WFS de IDECOR.")
+    parser.add_argument("geojson", help="FeatureCollection a servir (ej. la de parcelas_sinteticas.py)")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--limite", type=int, default=LIMITE_FEATURES, help="Máximo de features por respuesta")
+    parser.add_argument("--fallas", type=int, default=0, help="Cantidad de pedidos iniciales que reciben un 503")
+    parser.add_argument("--validadores", action="store_true", help="Manda ETag/Last-Modified y contesta 304")
+    parser.add_argument("--gzip", action="store_true", help="Comprime las respuestas si el cliente acepta gzip")
+    args = parser.parse_args()
+
+    with open(args.geojson, encoding="utf-8") as f:
+        servidor = ServidorWFS(json.load(f)["features"], args.puerto, args.limite,
+                               fallas=args.fallas, validadores=args.validadores, comprimir=args.gzip)
+    print(f"WFS local en {servidor.url} ({len(servidor.features)} parcelas). Ctrl-C para cortar.")
+    servidor._http.serve_forever()
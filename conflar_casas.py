@@ -0,0 +1,89 @@
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ingesta.cliente import TIMEOUT, crear_sesion
+from ingesta.conflacion import TOLERANCIA_METROS, conflar
+from ingesta.postgres import psycopg2
+from ingesta.sql import armar_insert, renderizar_filas, sql_ajustar_secuencia
+
+# Antes de cargar puntos de otra fuente (IDECOR, OSM, una planilla) se comparan
+# con las casas que ya están en la base, para no mandar dos veces a la misma casa.
+parser = argparse.ArgumentParser(description="Compara puntos nuevos con las casas existentes y se queda solo con las casas nuevas.")
+parser.add_argument("entradas", nargs="+",
+                    help="Archivos .parquet o .csv con latitud y longitud (y direccion); se comparan en este orden")
+existentes = parser.add_mutually_exclusive_group(required=True)
+existentes.add_argument("--base", action="store_true", help="Lee las casas existentes de la base de DATABASE_URL")
+existentes.add_argument("--servidor", help="Lee las casas existentes de /casas de la app (ej. http://localhost:3000)")
+existentes.add_argument("--existentes", help="Lee las casas existentes de un .parquet o .csv con id, latitud y longitud")
+parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_METROS,
+                    help=f"Metros hasta los que dos puntos son la misma casa (por defecto {TOLERANCIA_METROS})")
+parser.add_argument("--salida", default="casas_nuevas.sql",
+                    help="Dónde escribir las casas nuevas: .sql (INSERT para psql), .csv o .parquet")
+parser.add_argument("--reporte", default="conflacion.csv",
+                    help="CSV con cada punto de entrada, su estado y la casa con la que coincidió")
+
+
+def leer_puntos(ruta):
+    ruta = Path(ruta)
+    puntos = pd.read_parquet(ruta) if ruta.suffix == ".parquet" else pd.read_csv(ruta)
+    # pg y los CSV pueden traer las coordenadas como texto
+    return puntos.assign(latitud=pd.to_numeric(puntos["latitud"]), longitud=pd.to_numeric(puntos["longitud"]))
+
+
+def leer_existentes(args):
+    if args.existentes:
+        return leer_puntos(args.existentes)
+    if args.servidor:
+        with crear_sesion(1) as session:
+            response = session.get(f"{args.servidor.rstrip('/')}/casas", timeout=TIMEOUT)
+            response.raise_for_status()
+        casas = pd.DataFrame(response.json(), columns=["id", "latitud", "longitud"])
+    else:
+        if psycopg2 is None:
+            raise SystemExit("Para leer de la base hace falta instalar psycopg2 (pip install psycopg2-binary).")
+        with psycopg2.connect(os.environ["DATABASE_URL"]) as conn, conn.cursor() as cur:
+            cur.execute("SELECT id, latitud, longitud FROM casas WHERE latitud IS NOT NULL AND longitud IS NOT NULL")
+            casas = pd.DataFrame(cur.fetchall(), columns=["id", "latitud", "longitud"])
+        conn.close()
+    return casas.assign(latitud=pd.to_numeric(casas["latitud"]), longitud=pd.to_numeric(casas["longitud"]))
+
+
+def escribir_nuevas(ruta, nuevas):
+    ruta = Path(ruta)
+    if ruta.suffix == ".parquet":
+        nuevas.to_parquet(ruta, index=False)
+    elif ruta.suffix == ".csv":
+        nuevas.to_csv(ruta, index=False)
+    else:
+        # Sin id: las casas nuevas toman el siguiente de la secuencia, como las de /agregar.
+        # Las cargas con ids explícitos no la mueven: primero se la deja después del id más alto
+        direcciones = nuevas["direccion"] if "direccion" in nuevas else np.char.add("Punto_", np.arange(len(nuevas)).astype(str))
+        filas = renderizar_filas(direcciones, nuevas["latitud"], nuevas["longitud"])
+        with open(ruta, "w") as f:
+            if len(filas):
+                f.write(sql_ajustar_secuencia())
+                f.write(armar_insert(filas, columnas="direccion, latitud, longitud") + "\n")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    casas = leer_existentes(args)
+    entrantes = pd.concat(
+        [leer_puntos(ruta).assign(origen=Path(ruta).name) for ruta in args.entradas],
+        ignore_index=True,
+    ).dropna(subset=["latitud", "longitud"]).reset_index(drop=True)
+    print(f"Comparando {len(entrantes)} puntos contra {len(casas)} casas existentes (tolerancia {args.tolerancia} m)...")
+
+    resultado = conflar(casas, entrantes, tolerancia=args.tolerancia)
+    reporte = pd.concat([entrantes, resultado], axis=1)
+    reporte.to_csv(args.reporte, index_label="indice")
+
+    for (origen, estado), cantidad in reporte.groupby(["origen", "estado"], observed=False).size().items():
+        print(f"  {origen}: {cantidad} {estado}s")
+    nuevas = entrantes[resultado["estado"] == "nueva"].drop(columns="origen")
+    escribir_nuevas(args.salida, nuevas)
+    print(f"{len(nuevas)} casas nuevas en {args.salida}; detalle de cada punto en {args.reporte}")
@@ -0,0 +1,17 @@
+import argparse
+
+from ingesta.mapa import DIRECTORIO_MAPA, exportar_mapa_desde_base
+
+# Se corre después de cargar las casas (los SQL generados, --cargar o --sync):
+# los datos del mapa salen de la tabla casas, con sus ids y estados de verdad.
+parser = argparse.ArgumentParser(description="Genera los puntos y grupos por zoom del mapa de admin.html desde la tabla casas.")
+parser.add_argument("--salida", default=str(DIRECTORIO_MAPA),
+                    help=f"Carpeta de los datos del mapa (por defecto {DIRECTORIO_MAPA}, la que sirve server.js)")
+parser.add_argument("--dsn", help="Conexión a la base (por defecto DATABASE_URL, como db.js)")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    manifest = exportar_mapa_desde_base(args.dsn, args.salida)
+    print(f"Datos del mapa generados en {args.salida} ({manifest['total']} puntos, "
+          f"grupos para zoom {min(manifest['grupos'], key=int)} a {max(manifest['grupos'], key=int)})")
@@ -0,0 +1 @@
+"""Funciones compartidas para descargar parcelas de IDECOR y generar la carga de casas."""
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import requests
+import geopandas as gpd
+
+from ingesta.cliente import desalojar_respuestas
+from ingesta.metricas import contar
+
+try:
+    import pyarrow  # noqa: F401  (lo usa geopandas para GeoParquet)
+except ImportError:  # sin pyarrow no hay GeoParquet: se descarga siempre
+    pyarrow = None
+
+# --- Configuración de la cache local ---
+# Vive en la raíz del repo (ignorada por git) para que la compartan todos los scripts
+DIRECTORIO_CACHE = Path(__file__).resolve().parent.parent / ".cache_idecor"
+TTL_SEGUNDOS = 7 * 24 * 3600           # una semana: IDECOR no cambia las parcelas tan seguido
+TAMANO_MAXIMO_BYTES = 500 * 1024 ** 2  # al pasarse se borran las entradas menos usadas
+
+
+def clave_cache(wfs_url, layer_name, bbox, srs_name, version, filtro=None):
+    """Clave de contenido para una descarga: hash de todo lo que cambia la respuesta del WFS."""
+    # Redondeamos el BBOX para que la misma zona calculada desde DMS dé siempre la misma clave
+    bbox_normalizado = [round(float(c), 7) for c in bbox]
+    partes = [wfs_url, layer_name, bbox_normalizado, srs_name, version]
+    # Sin filtro la clave queda igual que antes, así no se invalida la cache ya descargada
+    if filtro is not None:
+        partes.append(filtro.clave())
+    texto = json.dumps(partes)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _rutas(clave, directorio):
+    return directorio / f"{clave}.parquet", directorio / f"{clave}.json"
+
+
+def leer_cache(clave, directorio=DIRECTORIO_CACHE, ttl=TTL_SEGUNDOS, aceptar_vencida=False):
+    """Devuelve la GeoDataFrame guardada para la clave, o None si no está o venció."""
+    ruta_datos, ruta_meta = _rutas(clave, directorio)
+    if pyarrow is None or not ruta_datos.exists() or not ruta_meta.exists():
+        return None
+
+    meta = json.loads(ruta_meta.read_text(encoding="utf-8"))
+    if not aceptar_vencida and time.time() - meta["guardado"] > ttl:
+        return None
+
+    gdf = gpd.read_parquet(ruta_datos)
+    # Tocamos el archivo para que la expulsión por tamaño lo trate como usado recientemente
+    os.utime(ruta_datos)
+    return gdf
+
+
+def guardar_cache(clave, gdf, metadatos, directorio=DIRECTORIO_CACHE):
+    """Guarda la GeoDataFrame como GeoParquet junto a un JSON con los parámetros de la descarga."""
+    if pyarrow is None:
+        print("Atención: pyarrow no está instalado, no se guarda la cache local.")
+        return
+    directorio.mkdir(parents=True, exist_ok=True)
+    ruta_datos, ruta_meta = _rutas(clave, directorio)
+
+    # Escribimos a un temporal y renombramos: un Ctrl-C a mitad no deja una entrada corrupta
+    temporal = ruta_datos.with_suffix(".parquet.tmp")
+    gdf.to_parquet(temporal, compression="zstd")
+    os.replace(temporal, ruta_datos)
+    ruta_meta.write_text(json.dumps({**metadatos, "guardado": time.time(), "filas": len(gdf)}), encoding="utf-8")
+
+
+def desalojar(directorio=DIRECTORIO_CACHE, ttl=TTL_SEGUNDOS, tamano_maximo=TAMANO_MAXIMO_BYTES):
+    """Borra las entradas vencidas y, si la cache sigue grande, las menos usadas recientemente.
+
+    También recorta las respuestas HTTP guardadas en la subcarpeta http/.
+    """
+    if not directorio.exists():
+        return
+    ahora = time.time()
+    entradas = []
+    for ruta_datos in directorio.glob("*.parquet"):
+        ruta_meta = ruta_datos.with_suffix(".json")
+        stat = ruta_datos.stat()
+        # El vencimiento se mide desde la descarga; el mtime solo marca el último uso
+        guardado = json.loads(ruta_meta.read_text(encoding="utf-8"))["guardado"] if ruta_meta.exists() else 0
+        if ahora - guardado > ttl:
+            ruta_datos.unlink(missing_ok=True)
+            ruta_meta.unlink(missing_ok=True)
+        else:
+            entradas.append((stat.st_mtime, stat.st_size, ruta_datos, ruta_meta))
+
+    total = sum(tamano for _, tamano, _, _ in entradas)
+    for _, tamano, ruta_datos, ruta_meta in sorted(entradas, key=lambda e: e[0]):
+        if total <= tamano_maximo:
+            break
+        ruta_datos.unlink(missing_ok=True)
+        ruta_meta.unlink(missing_ok=True)
+        total -= tamano
+
+    # Las respuestas HTTP de los pedidos condicionales (ver ingesta/cliente.py) tienen su propio tope
+    desalojar_respuestas(directorio / "http")
+
+
+def parcelas_con_cache(descargar, wfs_url, layer_name, bbox, srs_name="EPSG:4326", version="1.0.0",
+                       refrescar=False, directorio=DIRECTORIO_CACHE, ttl=TTL_SEGUNDOS, **kwargs_descarga):
+    """Devuelve las parcelas de la cache local o las descarga con `descargar` y las guarda.
+
+    `descargar` es una función como ingesta.wfs.descargar_parcelas_en_tiles que
+    devuelve una GeoDataFrame; recibe (wfs_url, layer_name, bbox, crs_code=..., version=..., **kwargs_descarga).
+    Con `refrescar=True` se ignora lo guardado. Si la entrada venció y no hay
+    conexión, se usa igual la versión vieja para poder trabajar offline. La
+    descarga recibe además una carpeta de checkpoint propia de esta clave, así
+    una corrida cortada se retoma desde lo que ya había bajado.
+    """
+    clave = clave_cache(wfs_url, layer_name, bbox, srs_name, version, kwargs_descarga.get("filtro"))
+    kwargs_descarga.setdefault("checkpoint", directorio / "checkpoints" / clave)
+
+    if not refrescar:
+        gdf = leer_cache(clave, directorio, ttl)
+        if gdf is not None:
+            contar("cache_aciertos")
+            print(f"Usando cache local ({len(gdf)} parcelas, clave {clave[:12]}). Usá --refresh para volver a descargar.")
+            return gdf
+
+    try:
+        gdf = descargar(wfs_url, layer_name, bbox, crs_code=srs_name, version=version, **kwargs_descarga)
+    except requests.exceptions.RequestException as e:
+        vieja = None if refrescar else leer_cache(clave, directorio, ttl, aceptar_vencida=True)
+        if vieja is None:
+            raise
+        contar("cache_vencida_usada")
+        print(f"No se pudo descargar de IDECOR ({e}); usando la cache vencida.")
+        return vieja
+
+    guardar_cache(clave, gdf, {
+        "wfs_url": wfs_url,
+        "layer_name": layer_name,
+        "bbox": list(bbox),
+        "srs_name": srs_name,
+        "version": version,
+        "filtro": kwargs_descarga["filtro"].clave() if kwargs_descarga.get("filtro") is not None else None,
+    }, directorio)
+    desalojar(directorio, ttl)
+    return gdf
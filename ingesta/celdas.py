@@ -0,0 +1,207 @@
+import io
+import math
+
+import numpy as np
+import pandas as pd
+
+from ingesta.metricas import etapa
+
+# --- Índice de celdas (geohash) ---
+# Cada casa guarda su geohash de PRECISION caracteres; como es jerárquico, los
+# primeros n caracteres son la celda de nivel n que la contiene, así que una
+# sola columna sirve para todas las resoluciones:
+#   5 ≈ 4.9 x 4.9 km (una localidad)   7 ≈ 153 x 153 m (unas manzanas)
+#   6 ≈ 1.2 x 0.6 km (un barrio)       8 ≈ 38 x 19 m (unos lotes)
+PRECISION = 9
+ALFABETO = np.frombuffer(b"0123456789bcdefghjkmnpqrstuvwxyz", dtype=np.uint8)
+# Cuántas celdas como mucho se usan para cubrir un rectángulo en una consulta
+MAXIMO_CELDAS = 32
+# Casas por lote al completar la columna geohash en la base
+TAMANO_LOTE_GEOHASH = 10000
+
+
+def _bits(precision):
+    """Bits de longitud y de latitud de un geohash de `precision` caracteres."""
+    total = 5 * precision
+    return total - total // 2, total // 2
+
+
+def geohash(latitudes, longitudes, precision=PRECISION):
+    """Geohash de todos los puntos de una vez, como array de strings de numpy.
+
+    Cada coordenada se cuantiza a un entero de los bits que le tocan, se
+    intercalan los bits (primero longitud) y el entero resultante se corta en
+    grupos de 5 bits que indexan el alfabeto base32 del geohash.
+    """
+    if not 1 <= precision <= 12:
+        raise ValueError("La precisión del geohash va de 1 a 12 caracteres.")
+    bits_lon, bits_lat = _bits(precision)
+    lat = np.asarray(latitudes, dtype=float)
+    lon = np.asarray(longitudes, dtype=float)
+    x = np.clip(((lon + 180) / 360 * 2 ** bits_lon).astype(np.int64), 0, 2 ** bits_lon - 1)
+    y = np.clip(((lat + 90) / 180 * 2 ** bits_lat).astype(np.int64), 0, 2 ** bits_lat - 1)
+
+    codigo = np.zeros(len(lat), dtype=np.int64)
+    for i in range(5 * precision):
+        # Los bits pares (contando desde el más significativo) son de longitud
+        if i % 2 == 0:
+            bits_lon -= 1
+            bit = (x >> bits_lon) & 1
+        else:
+            bits_lat -= 1
+            bit = (y >> bits_lat) & 1
+        codigo = (codigo << 1) | bit
+
+    desplazamientos = 5 * np.arange(precision - 1, -1, -1)
+    indices = (codigo[:, None] >> desplazamientos) & 31
+    caracteres = np.ascontiguousarray(ALFABETO[indices])
+    return caracteres.view(f"S{precision}").ravel().astype(str)
+
+
+def tamano_celda(precision):
+    """(ancho en grados de longitud, alto en grados de latitud) de una celda de `precision`."""
+    bits_lon, bits_lat = _bits(precision)
+    return 360 / 2 ** bits_lon, 180 / 2 ** bits_lat
+
+
+def cubrir_bbox(bbox, maximo=MAXIMO_CELDAS, precision_maxima=PRECISION):
+    """Celdas (prefijos de geohash) que cubren el BBOX, lo más chicas posible sin pasar de `maximo`."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    celdas = None
+    for precision in range(1, precision_maxima + 1):
+        ancho, alto = tamano_celda(precision)
+        columnas = math.floor(max_lon / ancho) - math.floor(min_lon / ancho) + 1
+        filas = math.floor(max_lat / alto) - math.floor(min_lat / alto) + 1
+        if columnas * filas > maximo:
+            break
+        # Un punto por celda de la grilla, en su centro: su geohash es el de la celda
+        lon = (np.floor(min_lon / ancho) + np.arange(columnas) + 0.5) * ancho
+        lat = (np.floor(min_lat / alto) + np.arange(filas) + 0.5) * alto
+        lon, lat = np.meshgrid(lon, lat)
+        celdas = np.unique(geohash(lat.ravel(), lon.ravel(), precision))
+    return celdas if celdas is not None else np.array([""])
+
+
+class IndiceCeldas:
+    """Índice en memoria de puntos por geohash, para consultas por prefijo sin recorrer todo.
+
+    Los geohash se ordenan una sola vez; todas las casas de una celda quedan
+    contiguas, así que cada prefijo se resuelve con dos búsquedas binarias.
+    """
+
+    def __init__(self, geohashes):
+        geohashes = np.asarray(geohashes, dtype=str)
+        self._orden = np.argsort(geohashes, kind="stable")
+        self._ordenados = geohashes[self._orden]
+
+    def en_celdas(self, prefijos):
+        """Posiciones (en el orden original) de los puntos que caen en alguna de las celdas."""
+        prefijos = np.asarray(prefijos, dtype=str)
+        # "~" va después de todo el alfabeto del geohash: [prefijo, prefijo~) es la celda entera
+        desde = np.searchsorted(self._ordenados, prefijos, side="left")
+        hasta = np.searchsorted(self._ordenados, np.char.add(prefijos, "~"), side="left")
+        if not len(prefijos):
+            return np.array([], dtype=np.int64)
+        posiciones = np.concatenate([self._orden[d:h] for d, h in zip(desde, hasta)])
+        return np.unique(posiciones)
+
+    def en_bbox(self, bbox, latitudes, longitudes):
+        """Posiciones de los puntos dentro del BBOX: candidatos por celda y después el filtro exacto."""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        candidatos = self.en_celdas(cubrir_bbox(bbox))
+        lat = np.asarray(latitudes, dtype=float)[candidatos]
+        lon = np.asarray(longitudes, dtype=float)[candidatos]
+        return candidatos[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+
+    def contar(self, precision, valores=None):
+        """Cantidad de puntos por celda de `precision` (y por cada valor de `valores`, si se pasa)."""
+        celdas = pd.Series(self._ordenados.astype(f"U{precision}"), name="celda")
+        if valores is None:
+            return celdas.value_counts(sort=False).sort_index()
+        valores = pd.Series(np.asarray(valores)[self._orden], name="valor")
+        return pd.crosstab(celdas, valores)
+
+
+# --- Consultas sobre la columna casas.geohash ---
+# La columna tiene un índice con text_pattern_ops (ver "script bd neon"), así que
+# cada `geohash LIKE 'prefijo%'` es un rango del índice y no un recorrido de la tabla.
+
+def tiene_columna_geohash(cur, tabla="casas"):
+    cur.execute("""
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attname = 'geohash' AND NOT attisdropped
+    """, (tabla,))
+    return cur.fetchone() is not None
+
+
+def _filtro_celdas(prefijos):
+    """Condición SQL (con sus parámetros) de que el geohash empiece con alguno de los prefijos."""
+    condicion = " OR ".join(["geohash LIKE %s"] * len(prefijos))
+    return f"({condicion})", [f"{prefijo}%" for prefijo in prefijos]
+
+
+def casas_en_bbox(cur, bbox, tabla="casas", columnas="id, latitud, longitud"):
+    """Casas dentro del BBOX (min_lon, min_lat, max_lon, max_lat), buscadas por prefijo de celda."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    condicion, parametros = _filtro_celdas(cubrir_bbox(bbox).tolist())
+    cur.execute(f"""
+        SELECT {columnas} FROM {tabla}
+        WHERE {condicion}
+          AND longitud BETWEEN %s AND %s AND latitud BETWEEN %s AND %s
+    """, parametros + [min_lon, max_lon, min_lat, max_lat])
+    return cur.fetchall()
+
+
+def contar_por_celda(cur, precision, bbox=None, por="estado", tabla="casas"):
+    """Casas por celda de `precision` caracteres y por `por` (ej. estado).
+
+    Con `bbox` se cuentan solo las celdas que lo cubren (ver cubrir_bbox), sin
+    recorrer el resto de la tabla. Devuelve una lista de (celda, valor, cantidad).
+    """
+    condicion, parametros = ("TRUE", []) if bbox is None else _filtro_celdas(cubrir_bbox(bbox).tolist())
+    cur.execute(f"""
+        SELECT left(geohash, %s) AS celda, {por}, count(*)
+        FROM {tabla}
+        WHERE geohash IS NOT NULL AND {condicion}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """, [precision] + parametros)
+    return cur.fetchall()
+
+
+def completar_geohash(cur, tabla="casas", precision=PRECISION, tamano_lote=TAMANO_LOTE_GEOHASH):
+    """Calcula el geohash de las casas que todavía no lo tienen, de a `tamano_lote`.
+
+    En una base con el trigger casas_geohash (ver "script bd neon") las casas
+    ya entran con su celda y esto no encuentra nada; sirve para las que se
+    cargaron antes del trigger. Solo se leen las casas sin geohash, nunca la
+    tabla entera. No hace nada si la tabla no tiene la columna. Devuelve la
+    cantidad de casas actualizadas (None sin columna).
+    """
+    if not tiene_columna_geohash(cur, tabla):
+        return None
+    actualizadas = 0
+    ultimo_id = None
+    with etapa("geohash") as medicion:
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS geohash_nuevos (id integer PRIMARY KEY, geohash text) ON COMMIT DROP")
+        while True:
+            # Por id y no con OFFSET: cada lote es un rango del índice de la clave primaria
+            cur.execute(f"""
+                SELECT id, latitud, longitud FROM {tabla}
+                WHERE geohash IS NULL AND latitud IS NOT NULL AND longitud IS NOT NULL
+                  AND (%(desde)s::integer IS NULL OR id > %(desde)s)
+                ORDER BY id
+                LIMIT %(lote)s
+            """, {"desde": ultimo_id, "lote": tamano_lote})
+            filas = pd.DataFrame(cur.fetchall(), columns=["id", "latitud", "longitud"])
+            if filas.empty:
+                break
+            medicion.items += len(filas)
+            ultimo_id = int(filas["id"].iloc[-1])
+            calculados = geohash(filas["latitud"].astype(float), filas["longitud"].astype(float), precision)
+            cur.execute("TRUNCATE geohash_nuevos")
+            csv = "\n".join(np.char.add(np.char.add(filas["id"].to_numpy().astype(str), ","), calculados).tolist()) + "\n"
+            cur.copy_expert("COPY geohash_nuevos (id, geohash) FROM STDIN WITH (FORMAT csv)", io.StringIO(csv))
+            cur.execute(f"UPDATE {tabla} c SET geohash = g.geohash FROM geohash_nuevos g WHERE c.id = g.id")
+            actualizadas += cur.rowcount
+    return actualizadas
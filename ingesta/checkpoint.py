@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import geopandas as gpd
+
+try:
+    import pyarrow  # noqa: F401  (lo usa geopandas para GeoParquet)
+except ImportError:  # sin pyarrow no hay dónde guardar las piezas: se descarga todo de una
+    pyarrow = None
+
+# --- Checkpoints de descargas largas ---
+# Cada descarga en curso tiene su carpeta con un Parquet por pieza (tile o página)
+# y un journal JSONL que se escribe recién cuando la pieza quedó en disco.
+DIRECTORIO_CHECKPOINTS = Path(__file__).resolve().parent.parent / ".cache_idecor" / "checkpoints"
+# Una descarga cortada hace más de un día se empieza de nuevo en vez de mezclar datos viejos
+VIGENCIA_SEGUNDOS = 24 * 3600
+
+
+def ruta_checkpoint(*partes, directorio=DIRECTORIO_CHECKPOINTS):
+    """Carpeta de checkpoint para una descarga identificada por `partes` (URL, capa, BBOX, ...)."""
+    texto = json.dumps([str(parte) for parte in partes])
+    return directorio / hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """Journal de las piezas ya descargadas de una descarga, para retomarla si se corta.
+
+    `piezas` tiene el registro de cada pieza terminada (por clave) y `completo`
+    indica que la descarga llegó al final. Es seguro guardar desde varios hilos.
+    """
+
+    def __init__(self, directorio, vigencia=VIGENCIA_SEGUNDOS):
+        self.directorio = Path(directorio)
+        self._journal = self.directorio / "journal.jsonl"
+        self._lock = threading.Lock()
+        self.piezas = {}
+        self.completo = False
+
+        if self._journal.exists() and time.time() - self._journal.stat().st_mtime > vigencia:
+            self.borrar()
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        if not self._journal.exists():
+            return
+        for linea in self._journal.read_text(encoding="utf-8").splitlines():
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:  # última línea a medio escribir por un corte
+                continue
+            if registro.get("completo"):
+                self.completo = True
+            elif registro.get("archivo") is None or (self.directorio / registro["archivo"]).exists():
+                self.piezas[registro["clave"]] = registro
+
+    def _anotar(self, registro):
+        with self._lock, open(self._journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def guardar(self, clave, gdf, **datos):
+        """Guarda la pieza en su Parquet y recién después la anota en el journal."""
+        archivo = None
+        if gdf is not None and len(gdf):
+            archivo = f"pieza_{hashlib.sha1(clave.encode('utf-8')).hexdigest()[:16]}.parquet"
+            # Temporal + rename: una pieza a medio escribir nunca queda con su nombre final
+            temporal = self.directorio / f"{archivo}.tmp"
+            gdf.to_parquet(temporal, compression="zstd")
+            os.replace(temporal, self.directorio / archivo)
+        registro = {"clave": clave, "archivo": archivo, "filas": 0 if gdf is None else len(gdf), **datos}
+        self._anotar(registro)
+        self.piezas[clave] = registro
+
+    def cargar(self, clave):
+        """La pieza guardada para `clave` (None si estaba vacía)."""
+        archivo = self.piezas[clave]["archivo"]
+        return gpd.read_parquet(self.directorio / archivo) if archivo else None
+
+    def marcar_completo(self):
+        self._anotar({"completo": True})
+        self.completo = True
+
+    def borrar(self):
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+
+def abrir_checkpoint(directorio, vigencia=VIGENCIA_SEGUNDOS):
+    """Abre (o crea) el checkpoint de `directorio`; None si no se pidió o no hay pyarrow."""
+    if directorio is None:
+        return None
+    if pyarrow is None:
+        print("Atención: pyarrow no está instalado, la descarga no se puede retomar si se corta.")
+        return None
+    return Checkpoint(directorio, vigencia)
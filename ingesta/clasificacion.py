@@ -0,0 +1,86 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from ingesta.metricas import etapa
+
+# --- Reglas de clasificación de parcelas ---
+# (categoría, columna de IDECOR, patrón). El patrón es una regex que se busca en
+# el valor en mayúsculas; si una parcela cumple varias reglas gana la primera.
+REGLAS_ESTADO = [
+    ("edificadas", "Estado", "EDIF"),
+    ("baldios", "Estado", "BALD"),
+]
+CATEGORIA_DESCONOCIDA = "desconocidas"
+
+
+def _regla_por_valor(columna, reglas_columna, sin_regla):
+    """Para cada valor distinto de la columna, el índice de la primera regla que cumple."""
+    valores = columna.cat.categories.astype(str).str.upper()
+    ganadora = np.full(len(valores), sin_regla, dtype=np.int64)
+    # De atrás para adelante, así la primera regla que cumple es la que queda
+    for indice, patron in reversed(reglas_columna):
+        ganadora[np.asarray(valores.str.contains(patron, regex=True))] = indice
+    # Código -1 de pandas = valor nulo: va al final del array como "sin regla"
+    return np.append(ganadora, sin_regla)
+
+
+def clasificar(df, reglas=REGLAS_ESTADO, desconocida=CATEGORIA_DESCONOCIDA):
+    """Devuelve una columna categórica con la categoría de cada parcela según `reglas`.
+
+    Cada columna usada por las reglas se pasa a categórica una sola vez, las
+    regex se evalúan sobre los valores distintos (unas pocas decenas, no una
+    por parcela) y las filas se resuelven con un único indexado por códigos.
+    """
+    with etapa("clasificacion") as medicion:
+        medicion.items = len(df)
+        categorias = list(dict.fromkeys(categoria for categoria, _, _ in reglas))
+        if desconocida not in categorias:
+            categorias.append(desconocida)
+        sin_regla = len(reglas)
+        # Índice de regla -> código de la categoría resultante (el último es "sin regla")
+        codigo_de_regla = np.array([categorias.index(c) for c, _, _ in reglas] + [categorias.index(desconocida)])
+
+        regla_fila = np.full(len(df), sin_regla, dtype=np.int64)
+        columnas = dict.fromkeys(columna for _, columna, _ in reglas)
+        for columna in columnas:
+            if columna not in df:
+                continue
+            valores = df[columna].astype("category")
+            reglas_columna = [(i, patron) for i, (_, col, patron) in enumerate(reglas) if col == columna]
+            regla_valor = _regla_por_valor(valores, reglas_columna, sin_regla)
+            # Con varias columnas gana la regla de menor índice entre todas
+            regla_fila = np.minimum(regla_fila, regla_valor[valores.cat.codes.to_numpy()])
+
+        return pd.Categorical.from_codes(codigo_de_regla[regla_fila], categories=categorias)
+
+
+def filtro_cql(categorias, reglas=REGLAS_ESTADO, desconocida=CATEGORIA_DESCONOCIDA):
+    """Condición CQL que deja pasar las parcelas de `categorias`, para que filtre GeoServer.
+
+    Respeta el orden de las reglas (una parcela es de la primera que cumple).
+    Devuelve None si no hace falta filtrar (se piden todas las categorías) o si
+    las reglas no se pueden escribir en CQL: patrones que no son texto literal
+    o reglas sobre más de una columna. El resultado puede traer de más, nunca
+    de menos: igual hay que clasificar en local.
+    """
+    todas = {categoria for categoria, _, _ in reglas} | {desconocida}
+    if not categorias or todas <= set(categorias):
+        return None
+    columnas = {columna for _, columna, _ in reglas}
+    if len(columnas) != 1 or any(re.escape(patron) != patron or "'" in patron for _, _, patron in reglas):
+        return None
+    columna = columnas.pop()
+    cumple = [f"{columna} ILIKE '%{patron}%'" for _, _, patron in reglas]
+
+    condiciones = []
+    for i, (categoria, _, _) in enumerate(reglas):
+        if categoria not in categorias:
+            continue
+        # Las reglas anteriores de otra categoría ganan sobre esta
+        anteriores = [cumple[j] for j in range(i) if reglas[j][0] != categoria]
+        condiciones.append(" AND ".join([cumple[i]] + [f"NOT ({c})" for c in anteriores]))
+    if desconocida in categorias:
+        condiciones.append(f"NOT ({' OR '.join(cumple)}) OR {columna} IS NULL")
+    return " OR ".join(f"({c})" for c in condiciones)
@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ingesta.metricas import contar
+
+# --- Cliente HTTP compartido para IDECOR ---
+# (conexión, lectura) en segundos: conectar es rápido o no es; GeoServer puede
+# tardar bastante en armar una respuesta grande antes de mandar el primer byte.
+TIMEOUT = (10, 120)
+TAMANO_POOL = 4
+# Reintentos con espera exponencial (0.5, 1, 2, 4, 8 s) ante cortes y errores transitorios
+REINTENTOS = 5
+BACKOFF_SEGUNDOS = 0.5
+ESTADOS_REINTENTABLES = (429, 500, 502, 503, 504)
+# Respuestas guardadas con su ETag/Last-Modified para los pedidos condicionales
+DIRECTORIO_HTTP = Path(__file__).resolve().parent.parent / ".cache_idecor" / "http"
+# Al pasarse se borran las respuestas usadas hace más tiempo
+TAMANO_MAXIMO_HTTP_BYTES = 200 * 1024 ** 2
+
+
+class _RetryConMetricas(Retry):
+    """Retry de urllib3 que además cuenta cada reintento en las métricas de la corrida."""
+
+    def increment(self, *args, **kwargs):
+        contar("reintentos")
+        return super().increment(*args, **kwargs)
+
+
+def crear_sesion(tamano_pool=TAMANO_POOL, reintentos=REINTENTOS, backoff=BACKOFF_SEGUNDOS):
+    """Sesión HTTP con pool de conexiones, reintentos con backoff y compresión negociada.
+
+    Solo se reintentan GET/HEAD (son idempotentes), respetando el Retry-After
+    que mande el servidor. Si se agotan los reintentos se devuelve la última
+    respuesta, así `raise_for_status()` informa el error real de GeoServer.
+    """
+    session = requests.Session()
+    retry = _RetryConMetricas(
+        total=reintentos,
+        backoff_factor=backoff,
+        status_forcelist=ESTADOS_REINTENTABLES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=tamano_pool, pool_maxsize=tamano_pool, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # requests ya lo manda por defecto; lo dejamos explícito porque el GeoJSON comprime ~10 a 1
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+def _rutas(url, params, directorio):
+    texto = json.dumps([url, sorted((str(k), str(v)) for k, v in params.items())])
+    clave = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+    return directorio / f"{clave}.json", directorio / f"{clave}.gz"
+
+
+def pedir_condicional(session, url, params, directorio=DIRECTORIO_HTTP, timeout=TIMEOUT):
+    """GET que reutiliza la respuesta anterior si el servidor dice que no cambió.
+
+    Si ya se guardó una respuesta para la misma URL y parámetros, se manda con
+    If-None-Match/If-Modified-Since: un 304 cuesta un solo ida y vuelta sin
+    cuerpo y se devuelve lo guardado. Solo se guardan respuestas que traen
+    ETag o Last-Modified. Con `directorio=None` es un GET común.
+    Devuelve (contenido en bytes, content-type).
+    """
+    ruta_meta, ruta_cuerpo = _rutas(url, params, directorio) if directorio else (None, None)
+    meta = None
+    encabezados = {}
+    if ruta_meta and ruta_meta.exists() and ruta_cuerpo.exists():
+        meta = json.loads(ruta_meta.read_text(encoding="utf-8"))
+        if meta.get("etag"):
+            encabezados["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            encabezados["If-Modified-Since"] = meta["last_modified"]
+
+    response = session.get(url, params=params, headers=encabezados, timeout=timeout)
+    contar("pedidos_wfs")
+    if response.status_code == 304 and meta is not None:
+        try:
+            contenido = gzip.decompress(ruta_cuerpo.read_bytes())
+            # Tocamos el archivo para que desalojar_respuestas lo trate como usado recientemente
+            os.utime(ruta_cuerpo)
+        except FileNotFoundError:
+            # Otro proceso lo desalojó entre el pedido y la lectura: se pide de nuevo, sin condición
+            return pedir_condicional(session, url, params, None, timeout)
+        contar("respuestas_no_modificadas")
+        return contenido, meta["content_type"]
+    response.raise_for_status()
+
+    contenido = response.content
+    # Bytes que viajaron por la red (comprimidos, si el servidor usó gzip)
+    contar("bytes_descargados", response.raw.tell() or len(contenido))
+    content_type = response.headers.get("content-type", "")
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if ruta_meta and (etag or last_modified):
+        directorio.mkdir(parents=True, exist_ok=True)
+        # Temporal + rename: un corte a mitad no deja un cuerpo incompleto asociado a un ETag válido
+        temporal = ruta_cuerpo.with_suffix(".gz.tmp")
+        temporal.write_bytes(gzip.compress(contenido, compresslevel=1))
+        os.replace(temporal, ruta_cuerpo)
+        ruta_meta.write_text(json.dumps({
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": content_type,
+        }), encoding="utf-8")
+    return contenido, content_type
+
+
+def desalojar_respuestas(directorio=DIRECTORIO_HTTP, tamano_maximo=TAMANO_MAXIMO_HTTP_BYTES):
+    """Borra las respuestas guardadas menos usadas hasta que el directorio quede bajo `tamano_maximo`.
+
+    No hay vencimiento por tiempo: una respuesta vieja igual se revalida con el
+    servidor antes de usarse. También se borran los restos de cortes (cuerpos
+    sin metadatos, temporales).
+    """
+    if not directorio.exists():
+        return
+    ahora = time.time()
+    for temporal in directorio.glob("*.tmp"):
+        # Uno reciente puede ser de otro proceso escribiendo ahora mismo (ingestar_zonas.py)
+        if ahora - temporal.stat().st_mtime > 3600:
+            temporal.unlink(missing_ok=True)
+    entradas = []
+    for ruta_cuerpo in directorio.glob("*.gz"):
+        ruta_meta = ruta_cuerpo.with_suffix(".json")
+        if not ruta_meta.exists():
+            ruta_cuerpo.unlink(missing_ok=True)
+            continue
+        stat = ruta_cuerpo.stat()
+        entradas.append((stat.st_mtime, stat.st_size + ruta_meta.stat().st_size, ruta_cuerpo, ruta_meta))
+
+    total = sum(tamano for _, tamano, _, _ in entradas)
+    for _, tamano, ruta_cuerpo, ruta_meta in sorted(entradas, key=lambda e: e[0]):
+        if total <= tamano_maximo:
+            break
+        ruta_meta.unlink(missing_ok=True)
+        ruta_cuerpo.unlink(missing_ok=True)
+        total -= tamano
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+from ingesta.metricas import etapa
+from ingesta.rutas import proyectar_metros
+
+# --- Conflación de puntos contra las casas existentes ---
+# Dos puntos a menos de esto son la misma casa: el centroide de la parcela de
+# IDECOR, el centro del edificio de OSM y un punto cargado a mano desde el
+# celular pueden caer en distintos lugares del mismo lote.
+TOLERANCIA_METROS = 8.0
+ESTADOS = ["nueva", "existente", "repetida"]
+
+
+def conflar(existentes, entrantes, tolerancia=TOLERANCIA_METROS):
+    """Separa las casas `entrantes` en nuevas y ya existentes, comparando por distancia.
+
+    `existentes` y `entrantes` son frames con latitud/longitud (las existentes,
+    además, con id). Cada entrante se busca en un STRtree de las existentes con
+    una sola consulta de vecino más cercano para todas; si está a menos de
+    `tolerancia` metros es la misma casa. Entre las que quedan, si dos entrantes
+    están a menos de la tolerancia entre sí se queda la primera.
+
+    Devuelve una frame con una fila por entrante, en el mismo orden:
+    estado ('nueva', 'existente' o 'repetida'), id_existente, indice_repetida
+    (la entrante que se conservó en su lugar) y distancia_m.
+    """
+    with etapa("conflacion") as medicion:
+        medicion.items = len(entrantes)
+        estado = np.full(len(entrantes), "nueva", dtype=object)
+        id_existente = np.full(len(entrantes), pd.NA, dtype=object)
+        indice_repetida = np.full(len(entrantes), -1)
+        distancia = np.full(len(entrantes), np.nan)
+
+        if not len(entrantes):
+            return _reporte(entrantes, estado, id_existente, indice_repetida, distancia)
+
+        # Un solo plano en metros para los dos conjuntos, así las distancias son comparables
+        latitudes = pd.to_numeric(pd.concat([existentes["latitud"], entrantes["latitud"]])).to_numpy(dtype=float)
+        longitudes = pd.to_numeric(pd.concat([existentes["longitud"], entrantes["longitud"]])).to_numpy(dtype=float)
+        puntos = shapely.points(proyectar_metros(latitudes, longitudes))
+        puntos_e, puntos_n = puntos[:len(existentes)], puntos[len(existentes):]
+
+        if len(existentes):
+            arbol = shapely.STRtree(puntos_e)
+            (entrante, cercana), metros = arbol.query_nearest(
+                puntos_n, max_distance=tolerancia, return_distance=True, all_matches=False,
+            )
+            estado[entrante] = "existente"
+            id_existente[entrante] = existentes["id"].to_numpy()[cercana]
+            distancia[entrante] = metros
+
+        # Repetidas dentro de las mismas entrantes (ej. IDECOR y OSM en la misma corrida)
+        nuevas = np.flatnonzero(estado == "nueva")
+        if len(nuevas) > 1:
+            arbol = shapely.STRtree(puntos_n[nuevas])
+            a, b = arbol.query(puntos_n[nuevas], predicate="dwithin", distance=tolerancia)
+            pares = a < b
+            a, b = nuevas[a[pares]], nuevas[b[pares]]
+            # Se recorre en orden solo la lista de pares cercanos, que es corta: una entrante se
+            # descarta si está cerca de otra anterior que se conservó
+            for orden in np.lexsort((a, b)):
+                anterior, posterior = a[orden], b[orden]
+                if estado[anterior] == "nueva" and estado[posterior] == "nueva":
+                    estado[posterior] = "repetida"
+                    indice_repetida[posterior] = anterior
+                    distancia[posterior] = shapely.distance(puntos_n[anterior], puntos_n[posterior])
+
+        return _reporte(entrantes, estado, id_existente, indice_repetida, distancia)
+
+
+def _reporte(entrantes, estado, id_existente, indice_repetida, distancia):
+    return pd.DataFrame({
+        "estado": pd.Categorical(estado, categories=ESTADOS),
+        "id_existente": id_existente,
+        "indice_repetida": indice_repetida,
+        "distancia_m": np.round(distancia, 2),
+    }, index=entrantes.index)
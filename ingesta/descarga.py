@@ -0,0 +1,370 @@
+import io
+import json
+import math
+import re
+from itertools import islice
+
+import numpy as np
+import requests
+
+from ingesta.clasificacion import REGLAS_ESTADO, clasificar, filtro_cql
+from ingesta.cliente import TIMEOUT, pedir_condicional
+from ingesta.metricas import contar, etapa, medir_iterable
+
+try:
+    import orjson
+except ImportError:  # sin orjson se parsea con json, que da lo mismo pero más lento
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # sin ijson se parsea cada página entera, que igual está acotada por `count`
+    ijson = None
+
+# Pedidos al WFS de IDECOR: tiles, filtros y paginado. No usa geopandas, así lo
+# comparten la ingesta con GeoDataFrames (ingesta/wfs.py) y el motor liviano
+# (ingesta/liviano.py).
+
+# --- Valores por defecto de la descarga en tiles ---
+# 0.01 grados ≈ 1.1 km de lado: con la densidad de parcelas de Córdoba queda
+# bastante por debajo del límite de features que devuelve GeoServer por pedido.
+TAMANO_TILE_GRADOS = 0.01
+MAX_WORKERS = 4
+# Cuántas veces se puede partir en 4 un tile que vino truncado por el límite del servidor
+MAX_SUBDIVISIONES = 3
+# Features por página en el modo paginado (WFS 2.0 startIndex/count)
+TAMANO_PAGINA = 1000
+# Orden de las páginas: sin un orden fijo, el mismo startIndex puede apuntar a otras
+# parcelas entre un pedido y otro (y una descarga retomada repetiría o saltearía algunas)
+ORDEN_PAGINADO = "fid"
+# Bytes del principio y del final de cada página que se guardan para leer los totales
+# (GeoServer los escribe después del array de features, otros servidores antes)
+TAMANO_EXTREMOS = 4096
+_TOTALES = re.compile(rb'"(numberMatched|numberReturned)"\s*:\s*(\d+)')
+
+
+def dividir_bbox_en_tiles(min_lon, min_lat, max_lon, max_lat, tamano_tile=TAMANO_TILE_GRADOS):
+    """Divide el BBOX en una grilla de tiles de `tamano_tile` grados de lado."""
+    columnas = max(1, math.ceil((max_lon - min_lon) / tamano_tile))
+    filas = max(1, math.ceil((max_lat - min_lat) / tamano_tile))
+    paso_lon = (max_lon - min_lon) / columnas
+    paso_lat = (max_lat - min_lat) / filas
+
+    tiles = []
+    for i in range(columnas):
+        for j in range(filas):
+            tiles.append((
+                min_lon + i * paso_lon,
+                min_lat + j * paso_lat,
+                # El último tile cierra exactamente en el borde del BBOX original
+                max_lon if i == columnas - 1 else min_lon + (i + 1) * paso_lon,
+                max_lat if j == filas - 1 else min_lat + (j + 1) * paso_lat,
+            ))
+    return tiles
+
+
+def clave_feature(feature):
+    """Clave estable de una parcela para detectar repetidas entre tiles vecinos."""
+    # GeoServer devuelve un id por feature (ej. 'parcelas.12345'); si no viene,
+    # usamos la nomenclatura o el gid de las propiedades.
+    if feature.get("id"):
+        return feature["id"]
+    props = feature.get("properties") or {}
+    for campo in ("nomenclatura", "gid"):
+        if props.get(campo):
+            return f"{campo}:{props[campo]}"
+    return repr(feature.get("geometry"))
+
+
+def describir_capa(session, wfs_url, layer_name, version="1.0.0"):
+    """Nombre de la columna de geometría y lista de atributos de la capa (DescribeFeatureType)."""
+    params = {
+        'service': 'WFS',
+        'version': version,
+        'request': 'DescribeFeatureType',
+        'typeName': layer_name,
+        'outputFormat': 'application/json',
+    }
+    response = session.get(wfs_url, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    contar("pedidos_wfs")
+    geometria = None
+    atributos = []
+    for propiedad in response.json()['featureTypes'][0]['properties']:
+        # GeoServer informa las geometrías con tipos GML (gml:MultiPolygon, gml:Geometry, ...)
+        if propiedad.get('type', '').startswith('gml:'):
+            geometria = geometria or propiedad['name']
+        else:
+            atributos.append(propiedad['name'])
+    if geometria is None:
+        raise ValueError(f"La capa '{layer_name}' no tiene columna de geometría")
+    return geometria, atributos
+
+
+class FiltroWFS:
+    """Filtro por categoría y selección de atributos que se delegan a GeoServer.
+
+    Las `categorias` (según `reglas`, ver ingesta/clasificacion.py) se piden con
+    CQL_FILTER y `propiedades` con propertyName, así no viajan ni se parsean
+    parcelas y columnas que después se descartan. Si el servidor rechaza el
+    filtro se desactiva y se sigue con pedidos comunes; en los dos casos el
+    resultado se vuelve a filtrar en local, así la salida es siempre la misma.
+    """
+
+    def __init__(self, propiedades=None, categorias=None, reglas=REGLAS_ESTADO):
+        self.propiedades = list(propiedades) if propiedades else None
+        self.categorias = list(categorias) if categorias else None
+        self.reglas = [tuple(regla) for regla in reglas]
+        self.cql = filtro_cql(self.categorias, self.reglas)
+        self.activo = bool(self.cql or self.propiedades)
+        self.geometria = None
+        self._pedidas = self.propiedades
+
+    def clave(self):
+        """Lo que cambia la respuesta del servidor, para la clave de la cache."""
+        return [self.propiedades, self.categorias, self.reglas if self.categorias else None]
+
+    def preparar(self, session, wfs_url, layer_name, version):
+        """Averigua la columna de geometría de la capa, que hace falta en el CQL y en propertyName."""
+        if not self.activo:
+            return
+        try:
+            self.geometria, atributos = describir_capa(session, wfs_url, layer_name, version)
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            self.desactivar(f"no se pudo leer la estructura de la capa: {e}")
+            return
+        if self.propiedades:
+            # Un atributo que la capa no tiene hace fallar el pedido entero
+            self._pedidas = [propiedad for propiedad in self.propiedades if propiedad in atributos]
+
+    def desactivar(self, motivo):
+        if self.activo:
+            self.activo = False
+            contar("filtro_rechazado")
+            print(f"Atención: GeoServer no aceptó el filtro ({motivo}); se descarga todo y se filtra en local.")
+
+    def parametros(self, params, tile, crs_code):
+        """Los parámetros del GetFeature con el filtro y la selección de atributos."""
+        params = dict(params)
+        if self.cql:
+            # GeoServer no acepta bbox y CQL_FILTER juntos: el BBOX va dentro del CQL
+            min_lon, min_lat, max_lon, max_lat = tile
+            del params['bbox']
+            params['CQL_FILTER'] = (f"BBOX({self.geometria},{min_lon},{min_lat},{max_lon},{max_lat},'{crs_code}')"
+                                    f" AND ({self.cql})")
+        if self._pedidas is not None:
+            params['propertyName'] = ",".join([self.geometria, *self._pedidas])
+        return params
+
+    def aplicar_local(self, gdf):
+        """Filtra por categoría y deja solo las columnas pedidas (no cambia nada si ya filtró GeoServer)."""
+        if self.categorias and len(gdf):
+            gdf = gdf[np.asarray(clasificar(gdf, self.reglas).isin(self.categorias))].reset_index(drop=True)
+        if self.propiedades:
+            conservar = {*self.propiedades, 'fid', gdf.geometry.name}
+            gdf = gdf.drop(columns=[columna for columna in gdf.columns if columna not in conservar])
+        return gdf
+
+
+def _es_rechazo(error):
+    """Si el error es el servidor diciendo que no entiende el pedido (y no una falla de red)."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        estado = error.response.status_code if error.response is not None else None
+        return estado is not None and 400 <= estado < 500 and estado != 429
+    # Con WFS 1.0 GeoServer contesta 200 con un ServiceException en XML
+    return isinstance(error, ValueError)
+
+
+def _pedir_geojson(session, wfs_url, params, directorio_http, tile):
+    # Si el tile no cambió desde la última descarga, GeoServer contesta 304 y se usa lo guardado
+    with etapa("descarga"):
+        contenido, content_type = pedir_condicional(session, wfs_url, params, directorio_http)
+
+    content_type = content_type.split(';')[0].strip()
+    if content_type != 'application/json':
+        raise ValueError(f"El servicio WFS no devolvió 'application/json' para el tile {tile}: {content_type}")
+
+    with etapa("parseo") as medicion:
+        geojson_data = orjson.loads(contenido) if orjson is not None else json.loads(contenido)
+        medicion.items = len(geojson_data.get('features') or [])
+    return geojson_data
+
+
+def descargar_tile(session, wfs_url, layer_name, tile, crs_code, version, directorio_http, filtro=None,
+                    profundidad=0):
+    """Descarga las features de un tile; si el servidor lo truncó, lo parte en 4."""
+    min_lon, min_lat, max_lon, max_lat = tile
+    params = {
+        'service': 'WFS',
+        'version': version,
+        'request': 'GetFeature',
+        'typeName': layer_name,
+        'outputFormat': 'application/json',
+        'srsName': crs_code,
+        'bbox': f"{min_lon},{min_lat},{max_lon},{max_lat},{crs_code}"
+    }
+    geojson_data = None
+    if filtro is not None and filtro.activo:
+        try:
+            geojson_data = _pedir_geojson(session, wfs_url, filtro.parametros(params, tile, crs_code),
+                                          directorio_http, tile)
+        except (requests.exceptions.HTTPError, ValueError) as e:
+            if not _es_rechazo(e):
+                raise
+            filtro.desactivar(f"HTTP {e.response.status_code}" if isinstance(e, requests.exceptions.HTTPError) else e)
+    if geojson_data is None:
+        geojson_data = _pedir_geojson(session, wfs_url, params, directorio_http, tile)
+    features = geojson_data.get('features') or []
+
+    # GeoServer informa el total real en 'totalFeatures' (o 'numberMatched' en WFS 2.0).
+    # Si es mayor a lo que vino, el tile llegó al límite de features del servidor.
+    total = geojson_data.get('totalFeatures', geojson_data.get('numberMatched'))
+    if isinstance(total, int) and total > len(features):
+        if profundidad >= MAX_SUBDIVISIONES:
+            print(f"Atención: el tile {tile} sigue truncado ({len(features)} de {total}), bajá el tamaño de tile.")
+            return features
+        contar("tiles_subdivididos")
+        mid_lon = (min_lon + max_lon) / 2
+        mid_lat = (min_lat + max_lat) / 2
+        features = []
+        for sub_tile in [
+            (min_lon, min_lat, mid_lon, mid_lat),
+            (mid_lon, min_lat, max_lon, mid_lat),
+            (min_lon, mid_lat, mid_lon, max_lat),
+            (mid_lon, mid_lat, max_lon, max_lat),
+        ]:
+            features.extend(descargar_tile(session, wfs_url, layer_name, sub_tile, crs_code, version,
+                                            directorio_http, filtro, profundidad + 1))
+    return features
+
+
+def _parsear_features(raw):
+    """Recorre las features de una respuesta GeoJSON a medida que llegan los bytes."""
+    if ijson is None:
+        yield from json.load(raw).get('features') or []
+        return
+    yield from ijson.items(raw, 'features.item', use_float=True)
+
+
+class _LectorConExtremos(io.RawIOBase):
+    """Envuelve la respuesta y guarda sus primeros y últimos bytes mientras se lee en stream.
+
+    Así se leen numberMatched/numberReturned sin armar la página entera ni
+    pasar cada evento del parser por Python.
+    """
+
+    def __init__(self, raw, tamano=TAMANO_EXTREMOS):
+        self._raw = raw
+        self._tamano = tamano
+        self.inicio = b""
+        self.final = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        datos = self._raw.read(len(buffer))
+        n = len(datos)
+        buffer[:n] = datos
+        if len(self.inicio) < self._tamano:
+            self.inicio += datos[:self._tamano - len(self.inicio)]
+        self.final = (self.final + datos)[-self._tamano:]
+        return n
+
+    def totales(self):
+        """numberMatched y numberReturned de la respuesta ya leída (None si no vinieron o son 'unknown')."""
+        # Lo que quede sin leer (el cierre del JSON después de la última feature) también cuenta
+        self.final = (self.final + self._raw.read())[-self._tamano:]
+        encontrados = {}
+        for extremo in (self.inicio, self.final):
+            for campo, valor in _TOTALES.findall(extremo):
+                encontrados[campo.decode()] = int(valor)
+        return encontrados.get('numberMatched'), encontrados.get('numberReturned')
+
+
+def iterar_features_paginado(session, wfs_url, layer_name, bbox, crs_code="EPSG:4326",
+                             tamano_pagina=TAMANO_PAGINA, sort_by=ORDEN_PAGINADO, inicio=0):
+    """Genera las features de la capa página por página usando WFS 2.0 startIndex/count.
+
+    Nunca hay más de una página en memoria: cada respuesta se lee en stream y
+    sus features se entregan de a una. Se pide hasta llegar al numberMatched
+    del servidor (o, si no lo informa, hasta una página vacía), así un límite
+    por página menor que `tamano_pagina` no corta la descarga. `sort_by` fija
+    un orden estable entre páginas (GeoServer lo necesita en algunas capas
+    para que el paginado no repita); si el servidor no lo acepta se sigue sin
+    orden y se avisa.
+    `inicio` es el startIndex de la primera página, para retomar una descarga.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    start_index = inicio
+    while True:
+        params = {
+            'service': 'WFS',
+            'version': '2.0.0',
+            'request': 'GetFeature',
+            'typeNames': layer_name,
+            'outputFormat': 'application/json',
+            # Con 'EPSG:4326' (y no la URN) GeoServer mantiene el orden lon/lat también en WFS 2.0
+            'srsName': crs_code,
+            'bbox': f"{min_lon},{min_lat},{max_lon},{max_lat},{crs_code}",
+            'startIndex': start_index,
+            'count': tamano_pagina,
+        }
+        if sort_by:
+            params['sortBy'] = sort_by
+
+        # Con stream=True esto es solo la espera hasta los encabezados (lo que tarda GeoServer en responder)
+        with etapa("pedido"):
+            response = session.get(wfs_url, params=params, stream=True, timeout=TIMEOUT)
+        with response:
+            if sort_by and 400 <= response.status_code < 500 and response.status_code != 429:
+                # La capa no tiene ese atributo para ordenar: se repite el pedido sin sortBy
+                contar("orden_rechazado")
+                print(f"Atención: GeoServer no aceptó sortBy={sort_by} (HTTP {response.status_code}); "
+                      "se pagina sin orden fijo y las páginas pueden repetir o saltear parcelas.")
+                sort_by = None
+                continue
+            response.raise_for_status()
+            contar("pedidos_wfs")
+            content_type = response.headers.get('content-type', '').split(';')[0].strip()
+            if content_type != 'application/json':
+                raise ValueError(f"El servicio WFS no devolvió 'application/json': {content_type}")
+
+            # Que urllib3 descomprima el gzip mientras leemos en stream
+            response.raw.decode_content = True
+            lector = _LectorConExtremos(response.raw)
+            recibidas = 0
+            # Con el stream, bajar y parsear son la misma etapa: se mide lo que tarda cada feature en llegar
+            for feature in medir_iterable("descarga_y_parseo", _parsear_features(lector)):
+                recibidas += 1
+                yield feature
+            coincidentes, devueltas = lector.totales()
+            contar("bytes_descargados", response.raw.tell())
+
+        if devueltas is not None and devueltas != recibidas:
+            raise ValueError(f"La página con startIndex={start_index} informa {devueltas} features y llegaron {recibidas}")
+        start_index += recibidas
+        # El servidor puede devolver menos que `count` (su propio límite por página):
+        # una página corta no es la última, solo lo es llegar al total o una página vacía
+        if coincidentes is not None and start_index >= coincidentes:
+            break
+        if recibidas == 0:
+            if coincidentes is not None:
+                raise ValueError(f"El paginado terminó en {start_index} features de {coincidentes}")
+            break
+
+
+def en_lotes(iterable, tamano):
+    """Agrupa un iterable en listas de a `tamano` elementos."""
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def sin_fid_repetidos(parcelas):
+    """Descarta las parcelas cuyo fid ya apareció en una página anterior (las que no tienen fid quedan)."""
+    repetidas = parcelas['fid'].notna() & parcelas['fid'].duplicated()
+    if repetidas.any():
+        contar("parcelas_repetidas_entre_paginas", int(repetidas.sum()))
+        parcelas = parcelas[~repetidas].reset_index(drop=True)
+    return parcelas
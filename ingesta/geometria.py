@@ -0,0 +1,30 @@
+from ingesta.metricas import contar, etapa
+
+# CRS métrico para calcular centroides: POSGAR 2007 / Argentina 4, la faja
+# Gauss-Krüger que cubre Córdoba (meridiano central -63°). Calcular el centroide
+# en EPSG:4326 trata los grados como si fueran planos y lo corre un poco.
+CRS_METRICO = "EPSG:5346"
+
+
+def calcular_centroides(geometrias, crs_metrico=CRS_METRICO, representativo=False):
+    """Centroides de todas las geometrías de una vez, calculados en un CRS métrico.
+
+    Las geometrías inválidas se reparan con make_valid en vez de descartarlas.
+    Se reproyecta una sola vez la serie completa y los puntos vuelven al CRS
+    original. Con `representativo=True` se usa un punto garantizado dentro de
+    la parcela (útil para lotes en L o con huecos). Devuelve (puntos, reparadas).
+    """
+    with etapa("centroides") as medicion:
+        # Con ~isna() y no notna(), que en geopandas 1.x avisa si hay geometrías vacías.
+        # Las vacías son válidas: no se reparan con ninguna de las dos formas
+        invalidas = ~geometrias.isna() & ~geometrias.is_valid
+        reparadas = int(invalidas.sum())
+        if reparadas:
+            geometrias = geometrias.copy()
+            geometrias[invalidas] = geometrias[invalidas].make_valid()
+            contar("geometrias_reparadas", reparadas)
+
+        proyectadas = geometrias.to_crs(crs_metrico)
+        puntos = proyectadas.representative_point() if representativo else proyectadas.centroid
+        medicion.items = len(puntos)
+        return puntos.to_crs(geometrias.crs), reparadas
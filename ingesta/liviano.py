@@ -0,0 +1,288 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from ingesta.clasificacion import clasificar
+from ingesta.cliente import DIRECTORIO_HTTP, crear_sesion, desalojar_respuestas
+from ingesta.descarga import (MAX_WORKERS, ORDEN_PAGINADO, TAMANO_PAGINA, TAMANO_TILE_GRADOS, clave_feature,
+                              descargar_tile, dividir_bbox_en_tiles, en_lotes, iterar_features_paginado,
+                              sin_fid_repetidos)
+from ingesta.geometria import CRS_METRICO
+from ingesta.metricas import contar, etapa
+
+try:
+    from pyproj import Transformer
+except ImportError as e:
+    # Sin reproyectar, el centroide saldría en grados y no coincidiría con el del otro motor
+    raise ImportError("El motor liviano necesita pyproj para calcular los centroides en "
+                      f"{CRS_METRICO} (pip install pyproj).") from e
+
+# --- Motor liviano: centroides sin geopandas ---
+# Para cargar casas alcanza con el centroide, el Estado y un identificador de
+# cada parcela. Acá las coordenadas del GeoJSON van directo a arrays de numpy y
+# el centroide sale de la fórmula del área (shoelace), sin GeoDataFrames ni un
+# objeto shapely por parcela. Las cuentas siguen paso a paso las de GEOS (el
+# centroide de geopandas), así los dos motores dan las mismas coordenadas.
+# Los polígonos con huecos o varias partes, y los anillos que se cruzan o
+# tienen puntas, van por shapely con make_valid, igual que en ingesta/geometria.py.
+
+# Margen para decidir que un anillo da exactamente una vuelta (en radianes)
+TOLERANCIA_GIRO = 1e-6
+
+
+@lru_cache
+def _transformador(origen, destino):
+    return Transformer.from_crs(origen, destino, always_xy=True)
+
+
+def _proyectar(x, y, origen, destino):
+    return _transformador(origen, destino).transform(x, y)
+
+
+def _proyectar_geometrias(geometrias, origen, destino):
+    """Reproyecta un array de geometrías shapely como GeoSeries.to_crs (las que tienen Z, con su Z)."""
+    funcion = _transformador(origen, destino).transform
+    tiene_z = shapely.has_z(geometrias)
+    resultado = geometrias.copy()
+    resultado[~tiene_z] = shapely.transform(geometrias[~tiene_z], funcion, interleaved=False)
+    resultado[tiene_z] = shapely.transform(geometrias[tiene_z], funcion, include_z=True, interleaved=False)
+    return resultado
+
+
+def _aplanar(geometrias):
+    """Separa los polígonos de un solo anillo (la enorme mayoría) del resto.
+
+    Devuelve las coordenadas de todos los anillos simples en un array Nx2, la
+    cantidad de puntos de cada anillo, la posición en `geometrias` de cada uno
+    y las posiciones de las geometrías que tienen que ir por shapely. Las nulas
+    y vacías no aparecen en ninguna de las dos listas.
+    """
+    coordenadas = []
+    largos = []
+    simples = []
+    otras = []
+    for i, geometria in enumerate(geometrias):
+        if not geometria:
+            continue
+        tipo = geometria.get("type")
+        partes = geometria.get("coordinates")
+        if tipo == "MultiPolygon" and partes and len(partes) == 1:
+            tipo, partes = "Polygon", partes[0]
+        # Los que tienen Z (IDECOR no los manda) se reproyectan con su Z: van por shapely
+        if tipo == "Polygon" and partes and len(partes) == 1 and len(partes[0]) >= 4 and len(partes[0][0]) == 2:
+            coordenadas.extend(partes[0])
+            largos.append(len(partes[0]))
+            simples.append(i)
+        elif partes or tipo == "GeometryCollection":
+            otras.append(i)
+    try:
+        puntos = np.array(coordenadas, dtype=float).reshape(-1, 2)
+    except ValueError:  # un anillo con Z después del primer punto: la Z no se usa
+        puntos = np.array([punto[:2] for punto in coordenadas], dtype=float).reshape(-1, 2)
+    return puntos, np.array(largos, dtype=np.int64), np.array(simples, dtype=np.int64), otras
+
+
+def _sin_ultimos(largos):
+    """Posiciones de todos los puntos menos el último de cada anillo (donde empieza cada arista)."""
+    ultimo = np.zeros(int(largos.sum()), dtype=bool)
+    ultimo[np.cumsum(largos) - 1] = True
+    return np.flatnonzero(~ultimo)
+
+
+def _da_una_vuelta(x, y, largos):
+    """Si cada anillo es un polígono simple: gira una sola vez y no tiene puntas.
+
+    Un anillo cruzado (moño, ocho) suma 0 vueltas y uno con una punta tiene un
+    giro de 180°; esos van por make_valid. Los puntos repetidos no cuentan.
+    """
+    anillo_de_punto = np.repeat(np.arange(len(largos)), largos)
+    i = _sin_ultimos(largos)
+    ex, ey = x[i + 1] - x[i], y[i + 1] - y[i]
+    no_nulas = (ex != 0) | (ey != 0)
+    ex, ey, anillo = ex[no_nulas], ey[no_nulas], anillo_de_punto[i][no_nulas]
+    if not len(ex):
+        return np.zeros(len(largos), dtype=bool)
+
+    # La arista siguiente de cada una, volviendo a la primera del anillo al final
+    cambia = anillo[1:] != anillo[:-1]
+    primeras = np.flatnonzero(np.r_[True, cambia])
+    siguiente = np.arange(1, len(ex) + 1)
+    siguiente[np.r_[cambia, True]] = primeras
+    giros = np.arctan2(ex * ey[siguiente] - ey * ex[siguiente], ex * ex[siguiente] + ey * ey[siguiente])
+
+    vueltas = np.bincount(anillo, weights=giros, minlength=len(largos))
+    aristas = np.bincount(anillo, minlength=len(largos))
+    puntas = np.bincount(anillo, weights=np.abs(giros) > math.pi - TOLERANCIA_GIRO, minlength=len(largos))
+    return (aristas >= 3) & (puntas == 0) & (np.abs(np.abs(vueltas) - 2 * math.pi) < TOLERANCIA_GIRO)
+
+
+def _centroides_anillos(x, y, largos):
+    """Centroide de cada anillo con las mismas operaciones que GEOS (Centroid::addShell).
+
+    Triángulos en abanico desde el primer punto, con el signo según la
+    orientación, y las sumas acumuladas en orden: así el resultado es el mismo
+    número que calcula geopandas, no solo uno muy parecido.
+    """
+    inicios = np.cumsum(largos) - largos
+    anillo_de_punto = np.repeat(np.arange(len(largos)), largos)
+    i = _sin_ultimos(largos)
+    base = inicios[anillo_de_punto[i]]
+    x0, y0, x1, y1, x2, y2 = x[base], y[base], x[i], y[i], x[i + 1], y[i + 1]
+    area2 = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+
+    # GEOS suma el área positiva en los anillos horarios y negativa en los antihorarios
+    antihorario = np.bincount(anillo_de_punto[i], weights=area2, minlength=len(largos)) > 0
+    area2 = np.where(antihorario[anillo_de_punto[i]], -1.0, 1.0) * area2
+    terminos = np.stack([area2, area2 * (x0 + x1 + x2), area2 * (y0 + y1 + y2)])
+
+    # Sumas en orden por anillo: cumsum es estrictamente secuencial, sum no (suma por pares)
+    sumas = np.empty((3, len(largos)))
+    triangulos = largos - 1
+    for cantidad in np.unique(triangulos):
+        anillos = np.flatnonzero(triangulos == cantidad)
+        columnas = (inicios[anillos] - anillos)[:, None] + np.arange(cantidad)
+        sumas[:, anillos] = np.cumsum(terminos[:, columnas], axis=2)[:, :, -1]
+    areas, cx, cy = sumas
+    return cx / 3 / areas, cy / 3 / areas
+
+
+def _centroides_shapely(geometrias, crs_code, crs_metrico, representativo):
+    """El camino de ingesta/geometria.py para las geometrías que no son un anillo simple."""
+    geometrias = np.array([shapely.geometry.shape(geometria) for geometria in geometrias], dtype=object)
+    invalidas = ~shapely.is_valid(geometrias)
+    if invalidas.any():
+        geometrias[invalidas] = shapely.make_valid(geometrias[invalidas])
+    geometrias = _proyectar_geometrias(geometrias, crs_code, crs_metrico)
+    puntos = shapely.point_on_surface(geometrias) if representativo else shapely.centroid(geometrias)
+    puntos = _proyectar_geometrias(puntos, crs_metrico, crs_code)
+    vacios = shapely.is_empty(puntos)
+    x = np.where(vacios, np.nan, shapely.get_x(puntos))
+    y = np.where(vacios, np.nan, shapely.get_y(puntos))
+    return x, y, invalidas
+
+
+def centroides(geometrias, crs_code="EPSG:4326", crs_metrico=CRS_METRICO, representativo=False):
+    """Centroides de una lista de geometrías GeoJSON, calculados en un CRS métrico.
+
+    Devuelve (longitudes, latitudes, reparadas), con `reparadas` True en las
+    inválidas que pasaron por make_valid; las nulas o vacías quedan en NaN.
+    Con `representativo=True` todas van por shapely, porque el punto
+    garantizado dentro de la parcela no tiene fórmula cerrada.
+    """
+    with etapa("centroides") as medicion:
+        medicion.items = len(geometrias)
+        lon = np.full(len(geometrias), np.nan)
+        lat = np.full(len(geometrias), np.nan)
+        puntos, largos, simples, otras = _aplanar(geometrias)
+        if representativo:
+            otras = sorted([*otras, *simples.tolist()])
+            simples = simples[:0]
+        elif len(simples):
+            una_vuelta = _da_una_vuelta(puntos[:, 0], puntos[:, 1], largos)
+            if not una_vuelta.all():
+                otras = sorted([*otras, *simples[~una_vuelta].tolist()])
+                puntos = puntos[np.repeat(una_vuelta, largos)]
+                simples, largos = simples[una_vuelta], largos[una_vuelta]
+
+        if len(simples):
+            x, y = _proyectar(puntos[:, 0], puntos[:, 1], crs_code, crs_metrico)
+            cx, cy = _centroides_anillos(np.asarray(x), np.asarray(y), largos)
+            lon[simples], lat[simples] = _proyectar(cx, cy, crs_metrico, crs_code)
+
+        reparadas = np.zeros(len(geometrias), dtype=bool)
+        if otras:
+            x, y, invalidas = _centroides_shapely([geometrias[i] for i in otras], crs_code, crs_metrico,
+                                                  representativo)
+            lon[otras], lat[otras], reparadas[otras] = x, y, invalidas
+        return lon, lat, reparadas
+
+
+def reducir_features(features, columnas=None, crs_code="EPSG:4326", representativo=False):
+    """Convierte features GeoJSON en una frame de atributos con latitud y longitud (sin polígonos).
+
+    Se quedan solo las `columnas` de las propiedades que vinieron (todas si es
+    None), más fid, _clave y _reparada. Las parcelas sin centroide quedan con
+    NaN hasta _descartar_vacias, así se cuentan igual que en geopandas.
+    """
+    lon, lat, reparadas = centroides([feature.get("geometry") for feature in features], crs_code,
+                                     representativo=representativo)
+    propiedades = pd.DataFrame([feature.get("properties") or {} for feature in features], index=range(len(features)))
+    if columnas is not None:
+        propiedades = propiedades[[columna for columna in columnas if columna in propiedades]]
+    frame = propiedades.assign(
+        fid=[feature.get("id") for feature in features],
+        _clave=[clave_feature(feature) for feature in features],
+        _reparada=reparadas,
+        latitud=lat,
+        longitud=lon,
+    )
+    return frame
+
+
+def _descartar_vacias(parcelas):
+    """Cuenta las geometrías reparadas y descarta las parcelas sin centroide (nulas o vacías)."""
+    reparadas = int(parcelas["_reparada"].sum())
+    if reparadas:
+        contar("geometrias_reparadas", reparadas)
+    parcelas = parcelas[parcelas["latitud"].notna()].drop(columns=["_clave", "_reparada"]).reset_index(drop=True)
+    return parcelas, reparadas
+
+
+def _tile_liviano(session, wfs_url, layer_name, tile, crs_code, version, directorio_http, filtro, columnas,
+                  representativo):
+    features = descargar_tile(session, wfs_url, layer_name, tile, crs_code, version, directorio_http, filtro)
+    # Los polígonos se sueltan acá: del tile queda solo la frame de centroides
+    return reducir_features(features, columnas, crs_code, representativo)
+
+
+def centroides_en_tiles(wfs_url, layer_name, bbox, columnas=None, crs_code="EPSG:4326", version="1.0.0",
+                        tamano_tile=TAMANO_TILE_GRADOS, max_workers=MAX_WORKERS, directorio_http=DIRECTORIO_HTTP,
+                        filtro=None, representativo=False):
+    """Como wfs.descargar_parcelas_en_tiles + calcular_centroides, sin geopandas.
+
+    Cada tile se reduce a centroides apenas llega, así en memoria nunca están
+    los polígonos de toda la zona. Las repetidas entre tiles se descartan en el
+    orden de los tiles. Con `filtro`, como en la otra descarga, quedan solo sus
+    categorías aunque GeoServer no lo haya aceptado. Devuelve (frame con
+    `columnas`, fid, latitud y longitud, reparadas).
+    """
+    tiles = dividir_bbox_en_tiles(*bbox, tamano_tile=tamano_tile)
+    print(f"Descargando {len(tiles)} tiles de '{layer_name}' con {max_workers} conexiones en paralelo (motor liviano)...")
+    with crear_sesion(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if filtro is not None:
+            filtro.preparar(session, wfs_url, layer_name, version)
+        piezas = list(executor.map(
+            lambda tile: _tile_liviano(session, wfs_url, layer_name, tile, crs_code, version, directorio_http,
+                                       filtro, columnas, representativo),
+            tiles,
+        ))
+    # Este motor no pasa por la cache de parcelas (que es la que recorta las respuestas al guardar)
+    if directorio_http is not None:
+        desalojar_respuestas(directorio_http)
+
+    parcelas = pd.concat(piezas, ignore_index=True)
+    parcelas = parcelas[~parcelas["_clave"].duplicated()]
+    if filtro is not None and filtro.categorias and len(parcelas):
+        parcelas = parcelas[np.asarray(clasificar(parcelas, filtro.reglas).isin(filtro.categorias))]
+    return _descartar_vacias(parcelas)
+
+
+def centroides_paginado(wfs_url, layer_name, bbox, crs_code="EPSG:4326", tamano_pagina=TAMANO_PAGINA,
+                        sort_by=ORDEN_PAGINADO):
+    """Como wfs.descargar_centroides_paginado, sin geopandas ni checkpoint: una frame con latitud/longitud."""
+    paginas = []
+    with crear_sesion(1) as session:
+        features = iterar_features_paginado(session, wfs_url, layer_name, bbox, crs_code,
+                                            tamano_pagina=tamano_pagina, sort_by=sort_by)
+        for lote in en_lotes(features, tamano_pagina):
+            pagina, reparadas = _descartar_vacias(reducir_features(lote, crs_code=crs_code))
+            if reparadas:
+                print(f"  se repararon {reparadas} geometrías inválidas en esta página")
+            paginas.append(pagina)
+    if not paginas:
+        return pd.DataFrame(columns=["latitud", "longitud"])
+    return sin_fid_repetidos(pd.concat(paginas, ignore_index=True))
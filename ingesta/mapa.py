@@ -0,0 +1,174 @@
+import gzip
+import hashlib
+import json
+import math
+import os
+import struct
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import brotli
+except ImportError:  # sin brotli se precomprime solo con gzip
+    brotli = None
+
+# --- Datos precalculados para el mapa ---
+# La app sirve public/datos como archivos estáticos (ver server.js). Con zoom
+# bajo admin.html dibuja los grupos por celda en vez de una marca por casa y
+# selecciona con los puntos binarios; desde ZOOM_PUNTOS pide las casas a /casas.
+# Se exportan de la tabla casas después de cargarla (ver exportar_mapa.py).
+DIRECTORIO_MAPA = Path(__file__).resolve().parent.parent / "public" / "datos"
+ZOOM_MINIMO = 10
+ZOOM_PUNTOS = 17
+# Lado de la celda de agrupamiento en píxeles de pantalla (un grupo cada ~60 px)
+PIXELES_CELDA = 64
+# Los puntos se guardan en micro-grados enteros: ~0.1 m de precisión en 4 bytes
+ESCALA_COORDENADAS = 1_000_000
+MAGIA = b"CAS1"
+
+
+def puntos_binarios(ids, latitudes, longitudes, codigos):
+    """Empaqueta los puntos en columnas little-endian, listas para TypedArrays en el navegador.
+
+    Formato: "CAS1", uint32 cantidad, int32 ids[n], int32 latitudes[n] y
+    int32 longitudes[n] en micro-grados, uint8 códigos de estado[n].
+    """
+    cantidad = len(ids)
+    return b"".join([
+        MAGIA,
+        struct.pack("<I", cantidad),
+        np.asarray(ids, dtype="<i4").tobytes(),
+        np.round(np.asarray(latitudes, dtype=float) * ESCALA_COORDENADAS).astype("<i4").tobytes(),
+        np.round(np.asarray(longitudes, dtype=float) * ESCALA_COORDENADAS).astype("<i4").tobytes(),
+        np.asarray(codigos, dtype="u1").tobytes(),
+    ])
+
+
+def _pixeles(latitudes, longitudes, zoom):
+    """Coordenadas en píxeles Web Mercator (las de Leaflet) en el zoom dado."""
+    escala = 256 * 2 ** zoom
+    lat = np.radians(np.clip(latitudes, -85.05112878, 85.05112878))
+    x = (np.asarray(longitudes) + 180) / 360 * escala
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * escala
+    return x, y
+
+
+def agrupar_por_celda(latitudes, longitudes, codigos, cantidad_categorias, zoom):
+    """Agrupa los puntos por celdas de PIXELES_CELDA píxeles en el zoom dado.
+
+    Devuelve una fila por celda: [lat, lon, total, cantidad por categoría...],
+    con lat/lon en el promedio de sus puntos.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    x, y = _pixeles(latitudes, longitudes, zoom)
+    celdas = (x // PIXELES_CELDA).astype(np.int64) * (2 ** 31) + (y // PIXELES_CELDA).astype(np.int64)
+    _, celda, totales = np.unique(celdas, return_inverse=True, return_counts=True)
+    latitud = np.bincount(celda, weights=latitudes) / totales
+    longitud = np.bincount(celda, weights=longitudes) / totales
+    por_categoria = np.zeros((len(totales), cantidad_categorias), dtype=np.int64)
+    np.add.at(por_categoria, (celda, np.asarray(codigos)), 1)
+    return [
+        [round(la, 6), round(lo, 6), int(t), *map(int, c)]
+        for la, lo, t, c in zip(latitud, longitud, totales, por_categoria)
+    ]
+
+
+def _escribir(directorio, nombre, extension, contenido):
+    """Escribe el archivo con el hash del contenido en el nombre, más sus versiones .gz y .br."""
+    huella = hashlib.sha256(contenido).hexdigest()[:10]
+    archivo = f"{nombre}.{huella}{extension}" if nombre != "manifest" else f"{nombre}{extension}"
+    variantes = {archivo: contenido, f"{archivo}.gz": gzip.compress(contenido, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes[f"{archivo}.br"] = brotli.compress(contenido, quality=11)
+    else:
+        # Que no quede un .br de una exportación anterior sirviéndose en lugar del nuevo
+        (directorio / f"{archivo}.br").unlink(missing_ok=True)
+    for nombre_variante, datos in variantes.items():
+        temporal = directorio / f"{nombre_variante}.tmp"
+        temporal.write_bytes(datos)
+        os.replace(temporal, directorio / nombre_variante)
+    return archivo
+
+
+def exportar_mapa(ids, latitudes, longitudes, categorias, directorio=DIRECTORIO_MAPA,
+                  zoom_minimo=ZOOM_MINIMO, zoom_puntos=ZOOM_PUNTOS):
+    """Genera los puntos binarios, los grupos por zoom y el manifest que los lista.
+
+    `categorias` es una columna (idealmente categórica) con el estado de
+    cada casa. Los archivos de datos llevan el hash del contenido en el nombre
+    para poder cachearlos para siempre; el manifest se reescribe cada vez y se
+    borran los archivos de la exportación anterior. Devuelve el manifest.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    categorias = pd.Categorical(categorias)
+    codigos = categorias.codes
+    nombres = [str(c) for c in categorias.categories]
+    if (codigos < 0).any():  # categoría nula: va a una categoría propia al final
+        codigos = np.where(codigos < 0, len(nombres), codigos)
+        nombres.append("sin_categoria")
+
+    manifest = {
+        "generado": int(time.time()),
+        "total": len(ids),
+        "categorias": nombres,
+        "bbox": [float(np.min(longitudes)), float(np.min(latitudes)), float(np.max(longitudes)), float(np.max(latitudes))]
+        if len(ids) else None,
+        "zoom_puntos": zoom_puntos,
+        "puntos": _escribir(directorio, "puntos", ".bin", puntos_binarios(ids, latitudes, longitudes, codigos)),
+        "grupos": {},
+    }
+    for zoom in range(zoom_minimo, zoom_puntos):
+        filas = agrupar_por_celda(latitudes, longitudes, codigos, len(nombres), zoom)
+        contenido = json.dumps(filas, separators=(",", ":")).encode("utf-8")
+        manifest["grupos"][str(zoom)] = _escribir(directorio, f"grupos_z{zoom}", ".json", contenido)
+
+    ruta_manifest = directorio / "manifest.json"
+    anteriores = set()
+    if ruta_manifest.exists():
+        viejo = json.loads(ruta_manifest.read_text(encoding="utf-8"))
+        anteriores = {viejo.get("puntos"), *viejo.get("grupos", {}).values()} - {None}
+    _escribir(directorio, "manifest", ".json", json.dumps(manifest, indent=1).encode("utf-8"))
+
+    vigentes = {manifest["puntos"], *manifest["grupos"].values()}
+    for archivo in anteriores - vigentes:
+        for sufijo in ("", ".gz", ".br"):
+            (directorio / f"{archivo}{sufijo}").unlink(missing_ok=True)
+    return manifest
+
+
+# Estados de la app, en el orden de sus códigos en los puntos binarios
+ESTADOS = ["visitada", "no_atendieron", "otro"]
+
+
+def exportar_mapa_desde_base(dsn=None, directorio=DIRECTORIO_MAPA):
+    """Lee id, latitud, longitud y estado de la tabla casas y genera los datos del mapa.
+
+    Los ids son los de la tabla, así admin.html puede asignar las casas que
+    selecciona sobre los puntos binarios. Un estado nulo cuenta como 'otro',
+    igual que en la app. Usa DATABASE_URL si no se pasa `dsn`. Devuelve el manifest.
+    """
+    from ingesta.postgres import psycopg2
+
+    if psycopg2 is None:
+        raise RuntimeError("Para leer la base hace falta instalar psycopg2 (pip install psycopg2-binary).")
+    conn = psycopg2.connect(dsn or os.environ["DATABASE_URL"])
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, latitud::float8, longitud::float8, coalesce(estado, 'otro')
+                FROM casas
+                WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+                ORDER BY id
+            """)
+            casas = pd.DataFrame(cur.fetchall(), columns=["id", "latitud", "longitud", "estado"])
+    finally:
+        conn.close()
+    # Estados que no son de la app (cargados a mano) van después de los conocidos
+    estados = ESTADOS + sorted(set(casas["estado"]) - set(ESTADOS))
+    return exportar_mapa(casas["id"], casas["latitud"], casas["longitud"],
+                         pd.Categorical(casas["estado"], categories=estados), directorio)
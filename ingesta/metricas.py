@@ -0,0 +1,193 @@
+import contextlib
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # en Windows no hay getrusage: el reporte sale sin memoria
+    resource = None
+
+try:
+    import pyinstrument
+except ImportError:  # sin pyinstrument se puede perfilar igual con cProfile
+    pyinstrument = None
+
+# --- Métricas de una corrida de ingesta ---
+# Las funciones de ingesta/ registran sus etapas con `etapa()` y `contar()`.
+# Mientras no haya una corrida activa (ver `corrida()`) no registran nada, así
+# que los scripts que no piden reporte no pagan ningún costo.
+_activa = None
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso hasta ahora, en MB (None si el sistema no lo informa)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # En Linux ru_maxrss viene en KB; en macOS, en bytes
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+
+
+class _Medicion:
+    """Lo que se anota dentro de un `with etapa(...)`: cuántos elementos procesó."""
+
+    def __init__(self):
+        self.items = 0
+
+
+class Metricas:
+    """Tiempos por etapa y contadores de una corrida, seguros para usar desde varios hilos.
+
+    Una misma etapa puede medirse muchas veces (una por tile o por página): los
+    tiempos y elementos se acumulan. En etapas que corren en paralelo el tiempo
+    es la suma de los hilos, no el tiempo de reloj.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.inicio = time.time()
+        self._reloj = time.perf_counter()
+        self.etapas = {}
+        self.contadores = {}
+        self.datos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre, segundos, items=0):
+        with self._lock:
+            registro = self.etapas.setdefault(nombre, {"segundos": 0.0, "llamadas": 0, "items": 0})
+            registro["segundos"] += segundos
+            registro["llamadas"] += 1
+            registro["items"] += items
+            registro["rss_pico_mb"] = rss_pico_mb()
+
+    def contar(self, nombre, cantidad=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def reporte(self):
+        """El reporte de la corrida como diccionario listo para serializar a JSON."""
+        etapas = {}
+        for nombre, registro in self.etapas.items():
+            por_segundo = registro["items"] / registro["segundos"] if registro["items"] and registro["segundos"] else None
+            etapas[nombre] = {
+                **registro,
+                "segundos": round(registro["segundos"], 4),
+                "items_por_segundo": round(por_segundo) if por_segundo else None,
+            }
+        return {
+            "corrida": self.nombre,
+            "inicio": datetime.fromtimestamp(self.inicio).isoformat(timespec="seconds"),
+            "duracion_segundos": round(time.perf_counter() - self._reloj, 4),
+            "rss_pico_mb": rss_pico_mb(),
+            "etapas": etapas,
+            "contadores": dict(self.contadores),
+            **({"datos": self.datos} if self.datos else {}),
+        }
+
+    def guardar(self, ruta):
+        Path(ruta).write_text(json.dumps(self.reporte(), indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+    def resumen(self):
+        """Tabla corta por etapa para imprimir al final, de la más lenta a la más rápida."""
+        lineas = [f"Etapas de '{self.nombre}' (pico de memoria {rss_pico_mb()} MB):"]
+        for nombre, registro in sorted(self.etapas.items(), key=lambda e: -e[1]["segundos"]):
+            linea = f"  {nombre:<20} {registro['segundos']:>9.3f} s"
+            if registro["items"] and registro["segundos"]:
+                linea += f" {registro['items'] / registro['segundos']:>12,.0f} por segundo"
+            lineas.append(linea)
+        for nombre, valor in self.contadores.items():
+            lineas.append(f"  {nombre:<20} {valor:>11,}")
+        return "\n".join(lineas)
+
+
+@contextlib.contextmanager
+def corrida(nombre):
+    """Activa las métricas para todo lo que corra dentro del bloque y las devuelve."""
+    global _activa
+    anterior, _activa = _activa, Metricas(nombre)
+    try:
+        yield _activa
+    finally:
+        _activa = anterior
+
+
+@contextlib.contextmanager
+def etapa(nombre):
+    """Mide el bloque como una ejecución de la etapa `nombre`; se puede anotar `.items`."""
+    medicion = _Medicion()
+    metricas = _activa
+    if metricas is None:
+        yield medicion
+        return
+    inicio = time.perf_counter()
+    try:
+        yield medicion
+    finally:
+        metricas.registrar(nombre, time.perf_counter() - inicio, medicion.items)
+
+
+def medir_iterable(nombre, iterable):
+    """Recorre `iterable` midiendo solo el tiempo que tarda en producir cada elemento.
+
+    Sirve para streams como las features que se parsean a medida que llegan los
+    bytes: lo que hace el consumidor entre elemento y elemento no se cuenta.
+    """
+    metricas = _activa
+    if metricas is None:
+        yield from iterable
+        return
+    iterador = iter(iterable)
+    segundos = 0.0
+    items = 0
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                break
+            finally:
+                segundos += time.perf_counter() - inicio
+            items += 1
+            yield elemento
+    finally:
+        metricas.registrar(nombre, segundos, items)
+
+
+def contar(nombre, cantidad=1):
+    """Suma `cantidad` al contador `nombre` de la corrida activa (bytes, reintentos, ...)."""
+    if _activa is not None:
+        _activa.contar(nombre, cantidad)
+
+
+@contextlib.contextmanager
+def perfilar(ruta, motor="cprofile"):
+    """Perfila el bloque y deja el resultado en `ruta`.
+
+    Con cprofile se guarda un .prof para abrir con snakeviz o pstats; con
+    pyinstrument (si está instalado), un HTML con el árbol de llamadas.
+    """
+    if motor == "pyinstrument":
+        if pyinstrument is None:
+            raise RuntimeError("pyinstrument no está instalado (pip install pyinstrument); usá el perfil cprofile")
+        perfilador = pyinstrument.Profiler()
+        perfilador.start()
+        try:
+            yield
+        finally:
+            perfilador.stop()
+            Path(ruta).write_text(perfilador.output_html(), encoding="utf-8")
+        return
+
+    import cProfile
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    try:
+        yield
+    finally:
+        perfilador.disable()
+        perfilador.dump_stats(ruta)
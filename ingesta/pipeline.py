@@ -0,0 +1,99 @@
+import pandas as pd
+
+from ingesta.clasificacion import REGLAS_ESTADO, clasificar
+from ingesta.descarga import MAX_WORKERS, TAMANO_TILE_GRADOS, FiltroWFS
+from ingesta.geometria import calcular_centroides
+from ingesta.liviano import centroides_en_tiles
+from ingesta.recorte import recortar_a_poligono
+
+# Columnas de IDECOR que se conservan después de calcular los centroides
+COLUMNAS_ATRIBUTOS = ["fid", "gid", "nomenclatura", "Estado"]
+# geopandas: GeoDataFrames con cache en GeoParquet y checkpoints.
+# liviano: centroides con numpy a medida que llegan los tiles (ver ingesta/liviano.py),
+# arranca sin importar geopandas y usa mucha menos memoria; mismo resultado.
+MOTORES = ["geopandas", "liviano"]
+
+
+def _parcelas_geopandas(zona, wfs_url, layer_name, columnas, filtro, crs_code, refrescar, tamano_tile, max_workers):
+    # geopandas se importa solo si se usa este motor: el liviano no lo necesita
+    from ingesta.cache import parcelas_con_cache
+    from ingesta.wfs import descargar_parcelas_en_tiles
+
+    gdf = parcelas_con_cache(
+        descargar_parcelas_en_tiles,
+        wfs_url,
+        layer_name,
+        zona["bbox"],
+        srs_name=crs_code,
+        refrescar=refrescar,
+        tamano_tile=tamano_tile,
+        max_workers=max_workers,
+        filtro=filtro,
+    )
+
+    # Calcular el centroide de cada geometría (parcela/casa) en un CRS métrico.
+    # Las inválidas se reparan; las nulas o vacías se filtran
+    centroides, reparadas = calcular_centroides(gdf.geometry, representativo=zona.get("representativo", False))
+    validos = centroides.notna() & centroides.is_valid & ~centroides.is_empty
+    gdf = gdf[validos]
+    centroides = centroides[validos]
+
+    parcelas = pd.DataFrame({col: gdf[col].to_numpy() for col in columnas if col in gdf})
+    parcelas["latitud"] = centroides.y.to_numpy()
+    parcelas["longitud"] = centroides.x.to_numpy()
+    return parcelas, reparadas
+
+
+def _parcelas_livianas(zona, wfs_url, layer_name, columnas, filtro, crs_code, tamano_tile, max_workers):
+    # Sin cache en GeoParquet: cada tile se pide condicional y, si no cambió, GeoServer contesta 304
+    frame, reparadas = centroides_en_tiles(
+        wfs_url,
+        layer_name,
+        zona["bbox"],
+        columnas,
+        crs_code=crs_code,
+        tamano_tile=tamano_tile,
+        max_workers=max_workers,
+        filtro=filtro,
+        representativo=zona.get("representativo", False),
+    )
+    parcelas = pd.DataFrame({col: frame[col].to_numpy() for col in columnas if col in frame})
+    parcelas["latitud"] = frame["latitud"].to_numpy()
+    parcelas["longitud"] = frame["longitud"].to_numpy()
+    return parcelas, reparadas
+
+
+def procesar_zona(zona, wfs_url, layer_name, crs_code="EPSG:4326", refrescar=False,
+                  tamano_tile=TAMANO_TILE_GRADOS, max_workers=MAX_WORKERS, reglas=REGLAS_ESTADO, motor="geopandas"):
+    """Descarga una zona y la reduce a una frame liviana de centroides (sin polígonos).
+
+    Corre dentro de un proceso del pool de ingestar_zonas.py, así que devuelve
+    una DataFrame común que se serializa rápido entre procesos. `motor` es uno
+    de MOTORES; los dos dan las mismas parcelas con las mismas coordenadas.
+    """
+    # Además de los atributos fijos se conservan las columnas que usan las reglas de clasificación
+    columnas = list(dict.fromkeys(COLUMNAS_ATRIBUTOS + [columna for _, columna, _ in reglas]))
+    # GeoServer devuelve solo esas columnas y, si la zona lo pide, solo esas categorías
+    # (fid es el id de la feature, viene siempre)
+    filtro = FiltroWFS([col for col in columnas if col != "fid"], zona.get("categorias"), reglas)
+    if motor == "liviano":
+        parcelas, reparadas = _parcelas_livianas(zona, wfs_url, layer_name, columnas, filtro, crs_code,
+                                                 tamano_tile, max_workers)
+    else:
+        parcelas, reparadas = _parcelas_geopandas(zona, wfs_url, layer_name, columnas, filtro, crs_code,
+                                                  refrescar, tamano_tile, max_workers)
+    if reparadas:
+        print(f"Zona '{zona['nombre']}': se repararon {reparadas} geometrías inválidas")
+
+    # Zonas definidas por polígono: el BBOX fue solo el prefiltro del pedido a IDECOR
+    if zona.get("esquinas"):
+        antes = len(parcelas)
+        parcelas = recortar_a_poligono(parcelas, zona["esquinas"])
+        print(f"Zona '{zona['nombre']}': {antes - len(parcelas)} de {antes} parcelas quedaron fuera del polígono")
+
+    parcelas["categoria"] = clasificar(parcelas, reglas)
+    # Filtro opcional por categoría (ej. ["edificadas"] para no cargar baldíos)
+    if zona.get("categorias"):
+        parcelas = parcelas[parcelas["categoria"].isin(zona["categorias"])]
+
+    return parcelas.assign(zona=zona["nombre"]).reset_index(drop=True)
@@ -0,0 +1,173 @@
+import io
+import os
+
+import numpy as np
+
+from ingesta.celdas import completar_geohash
+from ingesta.metricas import etapa
+from ingesta.sql import (COLUMNAS_CASAS, COLUMNAS_CASAS_IDECOR, CONFLICTO_IDECOR, TAMANO_LOTE, como_texto,
+                         direcciones_o_prefijo, sql_ajustar_secuencia)
+
+try:
+    import psycopg2
+except ImportError:  # solo hace falta para la carga directa; los archivos COPY se generan igual
+    psycopg2 = None
+
+# Decimales con que se comparan coordenadas al vincular casas viejas sin idecor_id (≈ 0.1 m)
+DECIMALES_VINCULO = 6
+
+
+def renderizar_filas_csv(direcciones, latitudes, longitudes, ids=None, geohashes=None):
+    """Arma las líneas CSV `id,"direccion",lat,lon` (y `,geohash`) de todas las filas a la vez."""
+    # En CSV las comillas dobles se escapan doblándolas; la dirección siempre va entre comillas
+    direcciones = np.char.replace(como_texto(direcciones), '"', '""')
+    filas = np.char.add('"', np.char.add(direcciones, '",'))
+    if ids is not None:
+        filas = np.char.add(np.char.add(como_texto(ids), ","), filas)
+    filas = np.char.add(filas, como_texto(latitudes))
+    filas = np.char.add(filas, ",")
+    filas = np.char.add(filas, como_texto(longitudes))
+    if geohashes is not None:
+        filas = np.char.add(filas, np.char.add(",", como_texto(geohashes)))
+    return np.char.add(filas, "\n")
+
+
+def lotes_csv(gdf, ids, direcciones_de=direcciones_o_prefijo, tamano_lote=TAMANO_LOTE, con_geohash=False):
+    """Genera el CSV de la frame de a `tamano_lote` filas (con la columna geohash si `con_geohash`)."""
+    for inicio in range(0, len(gdf), tamano_lote):
+        parte = gdf.iloc[inicio:inicio + tamano_lote]
+        ids_parte = ids[inicio:inicio + tamano_lote]
+        yield renderizar_filas_csv(direcciones_de(parte, ids_parte), parte["latitud"], parte["longitud"], ids=ids_parte,
+                                   geohashes=parte["geohash"] if con_geohash else None)
+
+
+def escribir_copy(archivo, lotes, tabla="public.casas", columnas=COLUMNAS_CASAS):
+    """Escribe un COPY ... FROM STDIN con los datos en CSV, listo para `psql -f archivo`.
+
+    Devuelve la cantidad de filas escritas.
+    """
+    total = 0
+    with etapa("copy") as medicion:
+        archivo.write(f"COPY {tabla} ({columnas}) FROM STDIN WITH (FORMAT csv);\n")
+        for filas in lotes:
+            archivo.writelines(filas.tolist())
+            total += len(filas)
+        archivo.write("\\.\n")
+        medicion.items = total
+    return total
+
+
+class _LectorDeLotes(io.RawIOBase):
+    """Archivo de solo lectura que va consumiendo los lotes CSV a medida que COPY los pide."""
+
+    def __init__(self, lotes):
+        self._lotes = iter(lotes)
+        self._pendiente = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pendiente:
+            try:
+                self._pendiente = "".join(next(self._lotes).tolist()).encode("utf-8")
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._pendiente))
+        buffer[:n] = self._pendiente[:n]
+        self._pendiente = self._pendiente[n:]
+        return n
+
+
+def _entre_comillas(valores):
+    return np.char.add('"', np.char.add(np.char.replace(como_texto(valores), '"', '""'), '"'))
+
+
+def lotes_csv_idecor(gdf, idecor_ids, direcciones, tamano_lote=TAMANO_LOTE, con_geohash=False):
+    """Genera el CSV `"idecor_id","direccion",lat,lon,"categoria"` de la frame de a `tamano_lote` filas.
+
+    Es la entrada de cargar_con_copy: sin id propio, la parcela se reconoce por su idecor_id.
+    La categoría sale de la columna `categoria` de la frame (ver clasificacion.clasificar)
+    y con `con_geohash` se agrega al final la columna geohash.
+    """
+    idecor_ids = np.asarray(idecor_ids)
+    direcciones = np.asarray(direcciones)
+    for inicio in range(0, len(gdf), tamano_lote):
+        parte = gdf.iloc[inicio:inicio + tamano_lote]
+        filas = np.char.add(_entre_comillas(idecor_ids[inicio:inicio + tamano_lote]), ",")
+        filas = np.char.add(filas, _entre_comillas(direcciones[inicio:inicio + tamano_lote]))
+        filas = np.char.add(filas, ",")
+        filas = np.char.add(filas, como_texto(parte["latitud"]))
+        filas = np.char.add(filas, ",")
+        filas = np.char.add(filas, como_texto(parte["longitud"]))
+        filas = np.char.add(filas, ",")
+        filas = np.char.add(filas, _entre_comillas(parte["categoria"]))
+        if con_geohash:
+            filas = np.char.add(filas, np.char.add(",", como_texto(parte["geohash"])))
+        yield np.char.add(filas, "\n")
+
+
+def vincular_por_coordenadas(cur, staging, tabla="casas", decimales=DECIMALES_VINCULO):
+    """Pone el idecor_id de `staging` en las casas viejas que no lo tienen y están en el mismo centroide.
+
+    Así las casas cargadas antes de existir idecor_id no se duplican al cargarlas
+    de nuevo. Devuelve la cantidad de casas vinculadas.
+    """
+    cur.execute(f"""
+        UPDATE {tabla} c SET idecor_id = v.idecor_id
+        FROM (
+            SELECT DISTINCT ON (s.idecor_id) s.idecor_id, c2.id
+            FROM {staging} s
+            JOIN {tabla} c2
+              ON c2.idecor_id IS NULL
+             AND round(c2.latitud, %(dec)s) = round(s.latitud, %(dec)s)
+             AND round(c2.longitud, %(dec)s) = round(s.longitud, %(dec)s)
+            WHERE NOT EXISTS (SELECT 1 FROM {tabla} c3 WHERE c3.idecor_id = s.idecor_id)
+            ORDER BY s.idecor_id, c2.id
+        ) v
+        WHERE c.id = v.id
+    """, {"dec": decimales})
+    return cur.rowcount
+
+
+def cargar_con_copy(lotes, dsn=None, tabla="public.casas"):
+    """Carga los lotes CSV de lotes_csv_idecor directo en la base con COPY y hace upsert por idecor_id.
+
+    Los datos entran primero a una tabla temporal y desde ahí se insertan en
+    `tabla`. Las parcelas nuevas toman id de la secuencia; si el idecor_id ya
+    existe solo se actualizan direccion/latitud/longitud de esa misma parcela,
+    así no se pisan el estado, comentario ni la asignación que ya cargaron. Las
+    casas viejas sin idecor_id se vinculan antes por coordenadas.
+    Las columnas geom (PostGIS) y geohash las completan los triggers de la tabla ("script bd neon").
+    Usa DATABASE_URL (igual que db.js) si no se pasa `dsn`. Devuelve las filas copiadas.
+    """
+    if psycopg2 is None:
+        raise RuntimeError("Para cargar directo en la base hace falta instalar psycopg2 (pip install psycopg2-binary).")
+    dsn = dsn or os.environ["DATABASE_URL"]
+
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE casas_staging (
+                idecor_id text,
+                direccion text,
+                latitud numeric,
+                longitud numeric,
+                categoria text
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f"COPY casas_staging ({COLUMNAS_CASAS_IDECOR}) FROM STDIN WITH (FORMAT csv)",
+            io.BufferedReader(_LectorDeLotes(lotes), buffer_size=1024 * 1024),
+        )
+        copiadas = cur.rowcount
+        vincular_por_coordenadas(cur, "casas_staging", tabla)
+        # Las cargas por SQL traen ids explícitos: la secuencia puede haber quedado atrás
+        cur.execute(sql_ajustar_secuencia(tabla))
+        cur.execute(f"""
+            INSERT INTO {tabla} ({COLUMNAS_CASAS_IDECOR})
+            SELECT DISTINCT ON (idecor_id) {COLUMNAS_CASAS_IDECOR} FROM casas_staging
+            ON CONFLICT {CONFLICTO_IDECOR}
+        """)
+        completar_geohash(cur, tabla)
+    conn.close()
+    return copiadas
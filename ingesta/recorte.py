@@ -0,0 +1,24 @@
+import numpy as np
+import shapely
+
+
+def recortar_a_poligono(parcelas, esquinas):
+    """Se queda con las parcelas cuyo centroide cae dentro del polígono de `esquinas` [(lon, lat)].
+
+    El BBOX del pedido WFS ya hizo de prefiltro; acá se arma un STRtree con los
+    centroides y se consulta con el polígono, así solo se evalúa el
+    punto-en-polígono sobre los candidatos cuyo rectángulo cae dentro.
+    """
+    if parcelas.empty:
+        return parcelas
+    poligono = shapely.Polygon(esquinas)
+    if not poligono.is_valid:
+        # Esquinas cargadas en orden cruzado: make_valid lo deja como (multi)polígono usable
+        poligono = shapely.make_valid(poligono)
+
+    centroides = shapely.points(parcelas["longitud"].to_numpy(), parcelas["latitud"].to_numpy())
+    arbol = shapely.STRtree(centroides)
+    # predicate="contains" evalúa poligono.contains(centroide) para cada candidato del árbol
+    dentro = np.sort(arbol.query(poligono, predicate="contains"))
+    return parcelas.iloc[dentro]
+
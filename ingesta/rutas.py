@@ -0,0 +1,189 @@
+import math
+
+import numpy as np
+
+# --- Parámetros de la partición en rutas ---
+RADIO_TIERRA_M = 6371008.8
+ITERACIONES_KMEANS = 25
+PASADAS_2OPT = 8
+
+
+def proyectar_metros(latitudes, longitudes):
+    """Pasa lat/lon a metros en un plano local (equirectangular centrado en la zona).
+
+    Para un pueblo o una ciudad el error frente a una proyección Gauss-Krüger es
+    de centímetros, y no hace falta pyproj ni geopandas.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    lat0 = lat.mean()
+    x = (lon - lon.mean()) * math.cos(lat0) * RADIO_TIERRA_M
+    y = (lat - lat0) * RADIO_TIERRA_M
+    return np.column_stack([x, y])
+
+
+def _distancias(puntos, centros):
+    return np.sqrt(((puntos[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2))
+
+
+def _centros_iniciales(puntos, k, rng):
+    """k-means++: cada centro nuevo se elige lejos de los anteriores."""
+    centros = [puntos[rng.integers(len(puntos))]]
+    minima = ((puntos - centros[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        centros.append(puntos[rng.choice(len(puntos), p=minima / minima.sum())])
+        minima = np.minimum(minima, ((puntos - centros[-1]) ** 2).sum(axis=1))
+    return np.array(centros)
+
+
+def _asignar_con_capacidad(distancias, capacidad):
+    """Asigna cada punto al centro más cercano que todavía tenga lugar.
+
+    Por rondas: todos los puntos libres piden su centro más cercano con lugar,
+    cada centro se queda con los más cercanos hasta llenarse y el resto vuelve
+    a pedir en la ronda siguiente. A lo sumo hay tantas rondas como centros.
+    """
+    n, k = distancias.shape
+    distancias = distancias.copy()
+    asignacion = np.full(n, -1)
+    carga = np.zeros(k, dtype=int)
+    libres = np.arange(n)
+    while len(libres):
+        pedido = distancias[libres].argmin(axis=1)
+        distancia = distancias[libres, pedido]
+        # Agrupados por centro pedido y, dentro de cada uno, del más cercano al más lejano
+        orden = np.lexsort((distancia, pedido))
+        pedido_ordenado = pedido[orden]
+        primero = np.searchsorted(pedido_ordenado, pedido_ordenado, side="left")
+        puesto = np.arange(len(orden)) - primero
+        entra = puesto < (capacidad - carga)[pedido_ordenado]
+
+        aceptados = libres[orden[entra]]
+        asignacion[aceptados] = pedido_ordenado[entra]
+        carga += np.bincount(pedido_ordenado[entra], minlength=k)
+        distancias[:, carga >= capacidad] = np.inf
+        libres = libres[orden[~entra]]
+    return asignacion
+
+
+def _rebalancear(puntos, asignacion, centros):
+    """Completa los grupos que quedaron con menos de floor(n / grupos) casas.
+
+    La capacidad solo pone techo: k-means puede dejar un grupo corto (9 casas en
+    4 grupos salían [3, 1, 3, 2]). Mientras haya uno corto, el grupo más grande
+    le pasa su casa más cercana al centro del corto. Al final ningún grupo difiere
+    de otro en más de una casa.
+    """
+    grupos = len(centros)
+    minimo = len(puntos) // grupos
+    asignacion = asignacion.copy()
+    conteo = np.bincount(asignacion, minlength=grupos)
+    while conteo.min() < minimo:
+        destino = int(conteo.argmin())
+        origen = int(conteo.argmax())
+        candidatos = np.flatnonzero(asignacion == origen)
+        elegido = candidatos[((puntos[candidatos] - centros[destino]) ** 2).sum(axis=1).argmin()]
+        asignacion[elegido] = destino
+        conteo[origen] -= 1
+        conteo[destino] += 1
+    return asignacion
+
+
+def particionar(puntos, grupos, iteraciones=ITERACIONES_KMEANS, semilla=0):
+    """Parte los puntos (en metros) en `grupos` zonas compactas de tamaño parejo.
+
+    k-means con capacidad: ningún grupo pasa de ceil(n / grupos) casas, y después
+    se rebalancea para que ninguno quede con menos de floor(n / grupos). Devuelve
+    el grupo de cada punto (0..grupos-1).
+    """
+    puntos = np.asarray(puntos, dtype=float)
+    grupos = min(grupos, len(puntos))
+    capacidad = math.ceil(len(puntos) / grupos)
+    rng = np.random.default_rng(semilla)
+    centros = _centros_iniciales(puntos, grupos, rng)
+
+    asignacion = None
+    for _ in range(iteraciones):
+        nueva = _asignar_con_capacidad(_distancias(puntos, centros), capacidad)
+        if asignacion is not None and np.array_equal(nueva, asignacion):
+            break
+        asignacion = nueva
+        conteo = np.bincount(asignacion, minlength=grupos)[:, None]
+        sumas = np.zeros_like(centros)
+        np.add.at(sumas, asignacion, puntos)
+        centros = np.where(conteo > 0, sumas / np.maximum(conteo, 1), centros)
+    return _rebalancear(puntos, asignacion, centros)
+
+
+def ruta_vecino_mas_cercano(puntos):
+    """Orden de visita empezando por la casa más alejada del centro y yendo siempre a la más cercana."""
+    n = len(puntos)
+    if n <= 2:
+        return np.arange(n)
+    actual = int(((puntos - puntos.mean(axis=0)) ** 2).sum(axis=1).argmax())
+    visitado = np.zeros(n, dtype=bool)
+    orden = np.empty(n, dtype=int)
+    for paso in range(n):
+        orden[paso] = actual
+        visitado[actual] = True
+        if paso == n - 1:
+            break
+        distancia = ((puntos - puntos[actual]) ** 2).sum(axis=1)
+        distancia[visitado] = np.inf
+        actual = int(distancia.argmin())
+    return orden
+
+
+def mejorar_2opt(puntos, orden, pasadas=PASADAS_2OPT):
+    """Mejora un recorrido abierto invirtiendo tramos mientras eso lo acorte (2-opt).
+
+    Para cada arista se evalúan de una vez, con numpy, todos los tramos que
+    empiezan en ella; se aplica la mejor inversión y se sigue.
+    """
+    orden = np.array(orden)
+    n = len(orden)
+    if n < 4:
+        return orden
+    for _ in range(pasadas):
+        mejoro = False
+        for i in range(n - 2):
+            p = puntos[orden]
+            a, b = p[i], p[i + 1]
+            c = p[i + 2:]
+            # El siguiente de cada c; el último no tiene siguiente (recorrido abierto)
+            d = np.vstack([p[i + 3:], [np.nan, np.nan]])
+            quitado = np.hypot(*(a - b)) + np.hypot(*(c - d).T)
+            agregado = np.hypot(*(a - c).T) + np.hypot(*(b - d).T)
+            # Invertir hasta el final: solo cambia la arista a-b por a-c
+            quitado[-1] = np.hypot(*(a - b))
+            agregado[-1] = np.hypot(*(a - c[-1]))
+            ganancia = quitado - agregado
+            j = int(np.argmax(ganancia))
+            if ganancia[j] > 1e-6:
+                orden[i + 1:i + 3 + j] = orden[i + 1:i + 3 + j][::-1]
+                mejoro = True
+        if not mejoro:
+            break
+    return orden
+
+
+def largo_recorrido(puntos, orden):
+    """Metros a pie (en línea recta entre casas) de recorrer los puntos en ese orden."""
+    p = puntos[orden]
+    return float(np.hypot(*np.diff(p, axis=0).T).sum())
+
+
+def armar_rutas(latitudes, longitudes, grupos, semilla=0):
+    """Parte las casas en `grupos` rutas parejas y ordena cada una para recorrerla a pie.
+
+    Devuelve una lista con, por cada grupo, los índices (posiciones en las
+    entradas) en orden de visita.
+    """
+    puntos = proyectar_metros(latitudes, longitudes)
+    asignacion = particionar(puntos, grupos, semilla=semilla)
+    rutas = []
+    for grupo in range(asignacion.max() + 1):
+        indices = np.flatnonzero(asignacion == grupo)
+        orden = mejorar_2opt(puntos[indices], ruta_vecino_mas_cercano(puntos[indices]))
+        rutas.append(indices[orden])
+    return rutas
@@ -0,0 +1,147 @@
+import io
+import os
+
+import numpy as np
+
+from ingesta.celdas import completar_geohash
+from ingesta.postgres import _LectorDeLotes, lotes_csv_idecor, psycopg2, vincular_por_coordenadas
+from ingesta.sql import COLUMNAS_CASAS_IDECOR, como_texto, sql_ajustar_secuencia
+
+# Campos de IDECOR que identifican una parcela entre descargas, en orden de preferencia
+CAMPOS_IDENTIFICADOR = ("nomenclatura", "gid", "fid")
+# Diferencia mínima de coordenadas (en grados, ≈ 1 m) para considerar que una parcela se movió
+TOLERANCIA_GRADOS = 1e-5
+
+
+def columna_idecor_id(gdf, campos=CAMPOS_IDENTIFICADOR, respaldo=None):
+    """Identificador estable de cada parcela: el primer campo de `campos` que tenga valor.
+
+    Si ninguno tiene valor se usa `respaldo` (un array del largo de la frame) o, sin
+    respaldo, se lanza un error.
+    """
+    idecor_ids = np.full(len(gdf), "", dtype=object) if respaldo is None else np.asarray(respaldo, dtype=object)
+    for campo in reversed(campos):
+        if campo not in gdf:
+            continue
+        texto = como_texto(gdf[campo].astype(str))
+        tiene_valor = gdf[campo].notna().to_numpy() & (texto != "")
+        idecor_ids = np.where(tiene_valor, texto, idecor_ids)
+    if (idecor_ids == "").any():
+        raise ValueError(f"Hay parcelas sin ninguno de los campos {campos}: no se pueden sincronizar.")
+    return idecor_ids
+
+
+def sincronizar_casas(gdf, direcciones, bbox, dsn=None, borrar_bajas=False, simular=False,
+                      tolerancia=TOLERANCIA_GRADOS, categorias=None):
+    """Aplica en la tabla casas solo la diferencia con las parcelas descargadas de una zona.
+
+    - altas: parcelas con idecor_id que no está en la tabla (toman id de la secuencia)
+    - cambios: parcelas cuyo centroide se movió más que `tolerancia`; solo se tocan latitud/longitud
+    - bajas: casas de la zona (`bbox`) y de las `categorias` sincronizadas cuyo idecor_id ya
+      no viene de IDECOR. Solo se borran con `borrar_bajas` y si nadie las relevó (sin
+      asignar, sin comentario, estado 'otro')
+
+    `categorias` son las categorías que se descargaron (por defecto, las de la columna
+    categoria de `gdf`): una sincronización de edificadas no da de baja los baldíos
+    cargados de otra corrida. Las casas sin categoría no se cuentan nunca como bajas.
+
+    Las casas cargadas antes de existir idecor_id se vinculan primero por coordenadas,
+    así la primera sincronización no las duplica. Todo corre en una transacción;
+    con `simular=True` se hace rollback y solo se informan los conteos.
+    """
+    if psycopg2 is None:
+        raise RuntimeError("Para sincronizar con la base hace falta instalar psycopg2 (pip install psycopg2-binary).")
+    dsn = dsn or os.environ["DATABASE_URL"]
+    min_lon, min_lat, max_lon, max_lat = bbox
+    idecor_ids = columna_idecor_id(gdf)
+    # Si IDECOR repite un identificador nos quedamos con la primera parcela
+    _, primeras = np.unique(idecor_ids, return_index=True)
+    primeras.sort()
+    gdf = gdf.iloc[primeras]
+    idecor_ids = idecor_ids[primeras]
+    direcciones = np.asarray(direcciones)[primeras]
+    if categorias is None:
+        categorias = sorted(gdf["categoria"].astype(str).unique())
+    resumen = {}
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE parcelas_sync (
+                    idecor_id text PRIMARY KEY,
+                    direccion text,
+                    latitud numeric,
+                    longitud numeric,
+                    categoria text
+                ) ON COMMIT DROP
+            """)
+            cur.copy_expert(
+                f"COPY parcelas_sync ({COLUMNAS_CASAS_IDECOR}) FROM STDIN WITH (FORMAT csv)",
+                io.BufferedReader(_LectorDeLotes(lotes_csv_idecor(gdf, idecor_ids, direcciones))),
+            )
+
+            # Casas viejas sin idecor_id: las vinculamos a la parcela con el mismo centroide
+            resumen["vinculadas"] = vincular_por_coordenadas(cur, "parcelas_sync")
+
+            cur.execute("""
+                UPDATE casas c SET latitud = s.latitud, longitud = s.longitud
+                FROM parcelas_sync s
+                WHERE c.idecor_id = s.idecor_id
+                  AND (abs(c.latitud - s.latitud) > %(tol)s OR abs(c.longitud - s.longitud) > %(tol)s)
+            """, {"tol": tolerancia})
+            resumen["cambios"] = cur.rowcount
+            # Las casas vinculadas o cargadas antes de existir la columna toman su categoría
+            cur.execute("""
+                UPDATE casas c SET categoria = s.categoria
+                FROM parcelas_sync s
+                WHERE c.idecor_id = s.idecor_id AND c.categoria IS DISTINCT FROM s.categoria
+            """)
+
+            # Las cargas por SQL traen ids explícitos: la secuencia puede haber quedado atrás
+            cur.execute(sql_ajustar_secuencia("casas"))
+            cur.execute("""
+                INSERT INTO casas (idecor_id, direccion, latitud, longitud, categoria)
+                SELECT s.idecor_id, s.direccion, s.latitud, s.longitud, s.categoria
+                FROM parcelas_sync s
+                WHERE NOT EXISTS (SELECT 1 FROM casas c WHERE c.idecor_id = s.idecor_id)
+            """)
+            resumen["altas"] = cur.rowcount
+            # geom y geohash los completan los triggers de la tabla; esto cubre las casas
+            # de antes del trigger de geohash (ver "script bd neon")
+            completar_geohash(cur, "casas")
+
+            bajas_sql = """
+                FROM casas c
+                WHERE c.idecor_id IS NOT NULL
+                  AND c.categoria = ANY(%(categorias)s)
+                  AND c.longitud BETWEEN %(min_lon)s AND %(max_lon)s
+                  AND c.latitud BETWEEN %(min_lat)s AND %(max_lat)s
+                  AND NOT EXISTS (SELECT 1 FROM parcelas_sync s WHERE s.idecor_id = c.idecor_id)
+            """
+            limites = {"min_lon": min_lon, "max_lon": max_lon, "min_lat": min_lat, "max_lat": max_lat,
+                       "categorias": list(categorias)}
+            # Las casas que ya se relevaron no se borran nunca, solo se informan
+            sin_relevar = """
+                  AND c.asignado_a IS NULL
+                  AND c.comentario IS NULL
+                  AND coalesce(c.estado, 'otro') = 'otro'
+            """
+            cur.execute("SELECT count(*) " + bajas_sql, limites)
+            resumen["bajas"] = cur.fetchone()[0]
+            if borrar_bajas:
+                cur.execute("DELETE " + bajas_sql + sin_relevar, limites)
+                resumen["borradas"] = cur.rowcount
+            else:
+                resumen["borradas"] = 0
+
+        if simular:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return resumen
@@ -0,0 +1,128 @@
+import numpy as np
+
+from ingesta.metricas import etapa
+
+# Columnas que cargan los scripts en la tabla casas
+COLUMNAS_CASAS = "id, direccion, latitud, longitud"
+# Lo mismo más la celda geohash, para bases que ya tienen esa columna (ver ingesta/celdas.py)
+COLUMNAS_CASAS_GEOHASH = COLUMNAS_CASAS + ", geohash"
+# Sin id: la parcela se reconoce por su idecor_id y el id lo pone la secuencia.
+# La categoría (edificadas, baldios, ...) acota las bajas de la sincronización
+COLUMNAS_CASAS_IDECOR = "idecor_id, direccion, latitud, longitud, categoria"
+# Una parcela que ya está solo se actualiza: ni se duplica ni se descarta en silencio
+CONFLICTO_IDECOR = ("(idecor_id) DO UPDATE SET direccion = EXCLUDED.direccion, "
+                    "latitud = EXCLUDED.latitud, longitud = EXCLUDED.longitud, categoria = EXCLUDED.categoria")
+
+
+def como_texto(valores):
+    """Convierte una columna a un array de strings de numpy (los float quedan con repr, como en un f-string)."""
+    return np.asarray(valores).astype(str)
+
+
+def como_literal(valores):
+    """Convierte una columna en literales SQL entre comillas simples (escapadas doblándolas)."""
+    return np.char.add("'", np.char.add(np.char.replace(como_texto(valores), "'", "''"), "'"))
+
+
+def direcciones_o_prefijo(gdf, ids, campo="nomenclatura", prefijo="Parcela_"):
+    """Columna de direcciones: el `campo` de IDECOR si la capa lo trae, si no `prefijo` + id."""
+    if campo in gdf:
+        return como_texto(gdf[campo].astype(str))
+    return np.char.add(prefijo, como_texto(ids))
+
+
+def direcciones_con_respaldo(gdf, ids, campos=("nomenclatura", "gid"), prefijo="IDECOR_Parcela_"):
+    """Columna de direcciones tomando el primer campo con valor de `campos`, o `prefijo` + id."""
+    direcciones = np.char.add(prefijo, como_texto(ids))
+    # Recorremos de atrás para adelante para que el primer campo tenga prioridad
+    for campo in reversed(campos):
+        if campo not in gdf:
+            continue
+        texto = como_texto(gdf[campo].astype(str))
+        tiene_valor = gdf[campo].notna().to_numpy() & (texto != "")
+        direcciones = np.where(tiene_valor, texto, direcciones)
+    return direcciones
+
+
+def renderizar_filas(direcciones, latitudes, longitudes, ids=None, geohashes=None, categorias=None):
+    """Arma las tuplas `(id, 'direccion', lat, lon)` de todas las filas a la vez.
+
+    Las comillas simples de la dirección se escapan doblándolas, igual que antes.
+    Si `ids` es None se omite la columna id; con `categorias` y `geohashes` se
+    agregan al final, en ese orden.
+    """
+    direcciones = np.char.replace(como_texto(direcciones), "'", "''")
+    filas = np.char.add("'", np.char.add(direcciones, "', "))
+    if ids is not None:
+        filas = np.char.add(np.char.add("(", como_texto(ids)), np.char.add(", ", filas))
+    else:
+        filas = np.char.add("(", filas)
+    filas = np.char.add(filas, como_texto(latitudes))
+    filas = np.char.add(filas, ", ")
+    filas = np.char.add(filas, como_texto(longitudes))
+    if categorias is not None:
+        filas = np.char.add(filas, np.char.add(", ", como_literal(categorias)))
+    if geohashes is not None:
+        # El alfabeto del geohash no tiene comillas: no hace falta escapar
+        filas = np.char.add(filas, np.char.add(", '", np.char.add(como_texto(geohashes), "'")))
+    return np.char.add(filas, ")")
+
+
+def armar_insert(filas, tabla="public.casas", columnas=COLUMNAS_CASAS):
+    """Une las filas renderizadas en un único INSERT ... VALUES."""
+    return f"INSERT INTO {tabla} ({columnas}) VALUES\n" + ",\n".join(filas.tolist()) + ";"
+
+
+def sql_ajustar_secuencia(tabla="public.casas"):
+    """Sentencia que deja la secuencia de ids después del id más alto de la tabla.
+
+    Las cargas con ids explícitos no la mueven: sin esto, la próxima fila que
+    tome id de la secuencia puede chocar con una existente.
+    """
+    return f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), GREATEST((SELECT MAX(id) FROM {tabla}), 1));\n"
+
+
+# Filas por INSERT en la salida por lotes: Postgres parsea cada sentencia por separado
+# y una fila con error solo hace fallar su lote
+TAMANO_LOTE = 1000
+
+
+def lotes_de_filas(gdf, ids, direcciones_de=direcciones_o_prefijo, tamano_lote=TAMANO_LOTE, con_geohash=False,
+                   con_categoria=False):
+    """Genera las filas renderizadas de a `tamano_lote`, sin armar nunca el texto completo.
+
+    Con `con_geohash` se agrega la columna geohash de la frame (ver COLUMNAS_CASAS_GEOHASH)
+    y con `con_categoria` la columna categoria (ver COLUMNAS_CASAS_IDECOR).
+    """
+    for inicio in range(0, len(gdf), tamano_lote):
+        parte = gdf.iloc[inicio:inicio + tamano_lote]
+        ids_parte = ids[inicio:inicio + tamano_lote]
+        yield renderizar_filas(direcciones_de(parte, ids_parte), parte["latitud"], parte["longitud"], ids=ids_parte,
+                               geohashes=parte["geohash"] if con_geohash else None,
+                               categorias=parte["categoria"] if con_categoria else None)
+
+
+def escribir_inserts_por_lotes(archivo, lotes, tabla="public.casas", columnas=COLUMNAS_CASAS,
+                               transaccion=False, conflicto="(id) DO NOTHING"):
+    """Escribe un INSERT por lote en `archivo` (ya abierto) a medida que llegan los lotes.
+
+    Con `conflicto` cada INSERT lleva ON CONFLICT, así que si la carga se corta
+    se puede volver a correr el mismo archivo y solo entran las filas que faltaban.
+    Con `transaccion=True` todo el archivo va dentro de BEGIN/COMMIT (todo o nada).
+    Devuelve la cantidad de filas escritas.
+    """
+    total = 0
+    with etapa("sql") as medicion:
+        if transaccion:
+            archivo.write("BEGIN;\n")
+        for filas in lotes:
+            if not len(filas):
+                continue
+            archivo.write(f"INSERT INTO {tabla} ({columnas}) VALUES\n")
+            archivo.write(",\n".join(filas.tolist()))
+            archivo.write(f"\nON CONFLICT {conflicto};\n" if conflicto else ";\n")
+            total += len(filas)
+        if transaccion:
+            archivo.write("COMMIT;\n")
+        medicion.items = total
+    return total
@@ -0,0 +1,156 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import geopandas as gpd
+
+from ingesta.checkpoint import abrir_checkpoint
+from ingesta.cliente import DIRECTORIO_HTTP, crear_sesion
+from ingesta.descarga import (MAX_WORKERS, ORDEN_PAGINADO, TAMANO_PAGINA, TAMANO_TILE_GRADOS, clave_feature,
+                              descargar_tile, dividir_bbox_en_tiles, en_lotes, iterar_features_paginado,
+                              sin_fid_repetidos)
+from ingesta.geometria import calcular_centroides
+from ingesta.metricas import etapa
+
+# Descarga de la capa como GeoDataFrames: los pedidos están en ingesta/descarga.py
+# y acá se arman las frames, se guardan los checkpoints y se calculan centroides.
+
+
+def _clave_tile(tile):
+    return ",".join(f"{c:.7f}" for c in tile)
+
+
+def _descargar_pieza(session, wfs_url, layer_name, tile, crs_code, version, directorio_http, checkpoint, filtro):
+    """Descarga un tile y lo convierte en GeoDataFrame; con checkpoint, la deja guardada en disco."""
+    features = descargar_tile(session, wfs_url, layer_name, tile, crs_code, version, directorio_http, filtro)
+    pieza = None
+    if features:
+        with etapa("geodataframe") as medicion:
+            pieza = gpd.GeoDataFrame.from_features(features)
+            pieza.set_crs(crs_code, allow_override=True, inplace=True)
+            medicion.items = len(pieza)
+        # from_features descarta el id de GeoServer; lo guardamos como identificador estable
+        pieza['fid'] = [feature.get('id') for feature in features]
+        pieza['_clave'] = [clave_feature(feature) for feature in features]
+    if checkpoint is not None:
+        checkpoint.guardar(_clave_tile(tile), pieza)
+    return pieza
+
+
+def descargar_parcelas_en_tiles(wfs_url, layer_name, bbox, crs_code="EPSG:4326", version="1.0.0",
+                                tamano_tile=TAMANO_TILE_GRADOS, max_workers=MAX_WORKERS,
+                                directorio_http=DIRECTORIO_HTTP, checkpoint=None, filtro=None):
+    """Descarga la capa en tiles concurrentes y devuelve una sola GeoDataFrame sin parcelas repetidas.
+
+    `bbox` es (min_lon, min_lat, max_lon, max_lat) en grados decimales. Cada
+    tile se pide de forma condicional contra las respuestas guardadas en
+    `directorio_http` (None para no guardar nada). Con `checkpoint` (una
+    carpeta) cada tile terminado queda guardado: si la descarga se corta, la
+    próxima corrida baja solo los que faltan. Al terminar se borra. Con
+    `filtro` (un FiltroWFS) GeoServer devuelve solo las parcelas y atributos pedidos.
+    """
+    tiles = dividir_bbox_en_tiles(*bbox, tamano_tile=tamano_tile)
+    journal = abrir_checkpoint(checkpoint)
+    # Una pieza por tile, en el orden de la grilla: así el dedup y los ids no dependen
+    # de qué tile terminó primero
+    piezas = [None] * len(tiles)
+    pendientes = list(range(len(tiles)))
+    if journal is not None:
+        hechos = [i for i, tile in enumerate(tiles) if _clave_tile(tile) in journal.piezas]
+        if hechos:
+            print(f"Retomando la descarga: {len(hechos)} de {len(tiles)} tiles ya estaban en el checkpoint")
+            for i in hechos:
+                piezas[i] = journal.cargar(_clave_tile(tiles[i]))
+            pendientes = [i for i, tile in enumerate(tiles) if _clave_tile(tile) not in journal.piezas]
+    print(f"Descargando {len(pendientes)} tiles de '{layer_name}' con {max_workers} conexiones en paralelo...")
+
+    with crear_sesion(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if filtro is not None and pendientes:
+            filtro.preparar(session, wfs_url, layer_name, version)
+        futuros = {
+            executor.submit(_descargar_pieza, session, wfs_url, layer_name, tiles[i], crs_code, version,
+                            directorio_http, journal, filtro): i
+            for i in pendientes
+        }
+        try:
+            # as_completed solo para informar el avance; cada pieza va a la posición de su tile
+            for n, futuro in enumerate(as_completed(futuros), start=len(tiles) - len(pendientes) + 1):
+                piezas[futuros[futuro]] = futuro.result()
+                print(f"  tile {n}/{len(tiles)} listo")
+        except BaseException:
+            # Ctrl-C o un tile que falló: los que están en cola no arrancan y los que
+            # están en curso terminan y quedan en el checkpoint para la próxima corrida
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    piezas = [pieza for pieza in piezas if pieza is not None]
+    if not piezas:
+        gdf = gpd.GeoDataFrame(geometry=[], crs=crs_code)
+    else:
+        # Las parcelas que cruzan el borde entre dos tiles vienen en ambos: nos quedamos con una
+        gdf = pd.concat(piezas, ignore_index=True)
+        gdf = gdf[~gdf['_clave'].duplicated()].drop(columns='_clave').reset_index(drop=True)
+    if filtro is not None:
+        gdf = filtro.aplicar_local(gdf)
+    if journal is not None:
+        journal.borrar()
+    return gdf
+
+
+def centroides_por_pagina(features, crs_code="EPSG:4326", tamano_lote=TAMANO_PAGINA):
+    """Convierte el stream de features en GeoDataFrames de centroides, una por lote.
+
+    Los polígonos de cada lote se descartan apenas se calcula el centroide, así
+    que la memoria no crece con la cantidad de parcelas de la zona.
+    """
+    for lote in en_lotes(features, tamano_lote):
+        with etapa("geodataframe") as medicion:
+            gdf = gpd.GeoDataFrame.from_features(lote, crs=crs_code)
+            gdf['fid'] = [feature.get('id') for feature in lote]
+            medicion.items = len(gdf)
+        gdf['geometry'], reparadas = calcular_centroides(gdf.geometry)
+        if reparadas:
+            print(f"  se repararon {reparadas} geometrías inválidas en esta página")
+        # Algunas geometrías pueden ser nulas o vacías, las filtramos
+        gdf = gdf[gdf.geometry.notna() & gdf.geometry.is_valid & ~gdf.geometry.is_empty]
+        gdf['latitud'] = gdf.geometry.y
+        gdf['longitud'] = gdf.geometry.x
+        yield gdf
+
+
+def descargar_centroides_paginado(wfs_url, layer_name, bbox, crs_code="EPSG:4326",
+                                  tamano_pagina=TAMANO_PAGINA, sort_by=ORDEN_PAGINADO, checkpoint=None):
+    """Descarga la capa paginada y devuelve una GeoDataFrame de centroides con latitud/longitud.
+
+    Con `checkpoint` (una carpeta) cada página queda guardada apenas se
+    procesa y una corrida cortada sigue desde la página siguiente. El
+    `sort_by` hace que el startIndex apunte a las mismas parcelas entre
+    corridas; igual, al unir las páginas se descartan las repetidas por fid.
+    """
+    journal = abrir_checkpoint(checkpoint)
+    paginas = []
+    inicio = 0
+    if journal is not None and journal.piezas:
+        registros = sorted(journal.piezas.values(), key=lambda r: r["inicio"])
+        paginas = [journal.cargar(r["clave"]) for r in registros]
+        inicio = registros[-1]["inicio"] + registros[-1]["cantidad"]
+        print(f"Retomando la descarga: {len(registros)} páginas ya estaban en el checkpoint")
+
+    if journal is None or not journal.completo:
+        with crear_sesion(1) as session:
+            features = iterar_features_paginado(session, wfs_url, layer_name, bbox, crs_code,
+                                                tamano_pagina=tamano_pagina, sort_by=sort_by, inicio=inicio)
+            for n, pagina in enumerate(centroides_por_pagina(features, crs_code, tamano_pagina)):
+                if journal is not None:
+                    desde = inicio + n * tamano_pagina
+                    journal.guardar(f"pagina:{desde}", pagina, inicio=desde, cantidad=tamano_pagina)
+                paginas.append(pagina)
+        if journal is not None:
+            journal.marcar_completo()
+
+    paginas = [pagina for pagina in paginas if pagina is not None]
+    if journal is not None:
+        journal.borrar()
+    if not paginas:
+        return gpd.GeoDataFrame(columns=['latitud', 'longitud'], geometry=[], crs=crs_code)
+    return sin_fid_repetidos(pd.concat(paginas, ignore_index=True))
+
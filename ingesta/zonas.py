@@ -0,0 +1,69 @@
+import json
+import re
+
+# Acepta coordenadas como 31°37'48.4"S, 31°37'48.4''S o 31 37 48.4 S
+_PATRON_DMS = re.compile(r"""^\s*(\d+)\s*[°º ]\s*(\d+)\s*['′ ]\s*([\d.]+)\s*(?:"|''|″)?\s*([NSEWO])\s*$""", re.IGNORECASE)
+
+
+# --- Función para convertir Grados, Minutos, Segundos (DMS) a Grados Decimales ---
+def dms_to_decimal(degrees, minutes, seconds, direction):
+    """Convierte coordenadas DMS a grados decimales."""
+    decimal = float(degrees) + float(minutes)/60 + float(seconds)/(3600)
+    if direction in ['S', 'W']:
+        decimal *= -1
+    return decimal
+
+
+def a_decimal(valor):
+    """Convierte una coordenada del archivo de zonas (decimal, texto DMS o [g, m, s, 'S']) a grados decimales."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, (list, tuple)):
+        return dms_to_decimal(*valor)
+    coincidencia = _PATRON_DMS.match(valor)
+    if not coincidencia:
+        return float(valor)
+    grados, minutos, segundos, direccion = coincidencia.groups()
+    # 'O' (oeste) es como se escribe en castellano; dms_to_decimal espera 'W'
+    direccion = direccion.upper().replace("O", "W")
+    return dms_to_decimal(grados, minutos, segundos, direccion)
+
+
+def normalizar_zona(zona):
+    """Devuelve la zona con `bbox` (min_lon, min_lat, max_lon, max_lat) y `esquinas` [(lon, lat)] en decimal.
+
+    Una zona se define con `bbox` (min_lat/max_lat/min_lon/max_lon) o con
+    `esquinas`, una lista de [lat, lon] que forman un polígono; en ese caso el
+    BBOX es el rectángulo que lo contiene.
+    """
+    normalizada = dict(zona)
+    if "esquinas" in zona:
+        esquinas = [(a_decimal(lon), a_decimal(lat)) for lat, lon in zona["esquinas"]]
+        lons = [lon for lon, _ in esquinas]
+        lats = [lat for _, lat in esquinas]
+        normalizada["esquinas"] = esquinas
+        normalizada["bbox"] = (min(lons), min(lats), max(lons), max(lats))
+    elif "bbox" in zona:
+        bbox = zona["bbox"]
+        normalizada["bbox"] = (
+            a_decimal(bbox["min_lon"]),
+            a_decimal(bbox["min_lat"]),
+            a_decimal(bbox["max_lon"]),
+            a_decimal(bbox["max_lat"]),
+        )
+        normalizada["esquinas"] = None
+    else:
+        raise ValueError(f"La zona '{zona.get('nombre')}' no tiene ni 'bbox' ni 'esquinas'.")
+    return normalizada
+
+
+def leer_config(ruta):
+    """Lee el archivo de zonas y normaliza las coordenadas de cada una."""
+    with open(ruta, encoding="utf-8") as f:
+        config = json.load(f)
+    nombres = [zona["nombre"] for zona in config["zonas"]]
+    repetidos = {nombre for nombre in nombres if nombres.count(nombre) > 1}
+    if repetidos:
+        raise ValueError(f"Hay zonas con el mismo nombre en {ruta}: {sorted(repetidos)}")
+    config["zonas"] = [normalizar_zona(zona) for zona in config["zonas"]]
+    return config
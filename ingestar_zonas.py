@@ -0,0 +1,154 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ingesta.celdas import geohash
+from ingesta.clasificacion import REGLAS_ESTADO
+from ingesta.descarga import MAX_WORKERS, TAMANO_TILE_GRADOS
+from ingesta.pipeline import MOTORES, procesar_zona
+from ingesta.postgres import escribir_copy, lotes_csv_idecor
+from ingesta.sincronizacion import columna_idecor_id
+from ingesta.sql import (COLUMNAS_CASAS_IDECOR, CONFLICTO_IDECOR, TAMANO_LOTE, como_literal, direcciones_con_respaldo,
+                         escribir_inserts_por_lotes, lotes_de_filas, sql_ajustar_secuencia)
+from ingesta.zonas import leer_config
+
+# Un solo punto de entrada para todas las zonas: reemplaza a las copias de
+# agregar_casas.py / villaDelPrado_casas.py que solo cambiaban las esquinas.
+parser = argparse.ArgumentParser(description="Descarga de IDECOR todas las zonas de un archivo de configuración y genera la carga de casas.")
+parser.add_argument("--config", default="zonas.json", help="Archivo JSON con las zonas (por defecto zonas.json)")
+parser.add_argument("--salida", default="salida_zonas", help="Carpeta donde se escriben los archivos generados")
+parser.add_argument("--formato", choices=["sql", "copy", "parquet"], default="sql",
+                    help="sql: INSERTs por lotes; copy: COPY ... FROM STDIN para psql; parquet: tabla columnar")
+parser.add_argument("--zonas", nargs="*", help="Procesar solo estas zonas (por nombre)")
+parser.add_argument("--procesos", type=int, default=4, help="Zonas que se procesan en paralelo")
+parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help=f"Filas por INSERT (por defecto {TAMANO_LOTE})")
+parser.add_argument("--tamano-tile", type=float, default=TAMANO_TILE_GRADOS, help="Lado de cada tile de descarga, en grados")
+parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Descargas simultáneas por zona")
+parser.add_argument("--refresh", action="store_true",
+                    help="Ignora la cache local y vuelve a descargar de IDECOR (solo --motor geopandas)")
+parser.add_argument("--motor", choices=MOTORES, default="geopandas",
+                    help="liviano: centroides con numpy sin geopandas (arranca rápido y usa menos memoria, "
+                         "sin cache local de parcelas); mismo resultado que geopandas")
+parser.add_argument("--geohash", action="store_true",
+                    help="Incluye la columna geohash en los INSERT/COPY (la base tiene que tenerla, ver \"script bd neon\")")
+
+
+def escribir_salida(ruta, parcelas, formato, tamano_lote, con_geohash=False):
+    """Escribe las parcelas (con columnas idecor_id y direccion ya asignadas) en el formato pedido.
+
+    Como en villaDelPrado_casas_filtrado_baldios.py, las filas no llevan id: cada
+    parcela va con su idecor_id y toma id de la secuencia al cargarse, así los
+    archivos de cada zona, el unido y los por categoría se pueden cargar en
+    cualquier orden sin chocar. El parquet lleva siempre el geohash; los
+    INSERT/COPY solo con `con_geohash`.
+    """
+    if formato == "parquet":
+        parcelas.to_parquet(ruta, index=False)
+        return len(parcelas)
+
+    # La dirección ya está calculada: se la pasamos tal cual a los renderizadores
+    direcciones_de = lambda parte, _ids: parte["direccion"]  # noqa: E731
+    columnas = COLUMNAS_CASAS_IDECOR + (", geohash" if con_geohash else "")
+    with open(ruta, "w") as f:
+        f.write(sql_ajustar_secuencia())
+        if formato == "copy":
+            # COPY no tiene ON CONFLICT: si una parcela ya estaba, la carga falla entera
+            lotes = lotes_csv_idecor(parcelas, parcelas["idecor_id"], parcelas["direccion"], tamano_lote, con_geohash)
+            return escribir_copy(f, lotes, columnas=columnas)
+        lotes = lotes_de_filas(parcelas, como_literal(parcelas["idecor_id"]), direcciones_de, tamano_lote, con_geohash,
+                               con_categoria=True)
+        return escribir_inserts_por_lotes(f, lotes, columnas=columnas, conflicto=CONFLICTO_IDECOR)
+
+
+def unir_zonas(por_zona, orden):
+    """Une las zonas y descarta las parcelas repetidas entre zonas por su idecor_id.
+
+    Ante una parcela repetida gana la zona que aparece primero en el archivo de
+    configuración. Los ids no se asignan acá sino en la base, con la secuencia.
+    También se calcula la celda geohash de cada casa, en una sola pasada para todas.
+    """
+    todas = pd.concat([por_zona[nombre] for nombre in orden if nombre in por_zona], ignore_index=True)
+
+    # Parcelas sin identificador de IDECOR se reconocen por su centroide redondeado (≈ 0.1 m).
+    # Como strings de Python y no un array de numpy de ancho fijo: es una cuarta parte de memoria
+    por_coordenadas = np.array([
+        f"coord:{latitud},{longitud}"
+        for latitud, longitud in zip(todas["latitud"].round(6).tolist(), todas["longitud"].round(6).tolist())
+    ], dtype=object)
+    todas["idecor_id"] = columna_idecor_id(todas, respaldo=por_coordenadas)
+    repetidas = todas["idecor_id"].duplicated(keep="first")
+    if repetidas.any():
+        print(f"Descartadas {int(repetidas.sum())} parcelas repetidas entre zonas")
+    todas = todas[~repetidas].reset_index(drop=True)
+
+    # Sin nomenclatura ni gid, la dirección se arma con el id de IDECOR
+    todas["direccion"] = direcciones_con_respaldo(todas, todas["fid"], prefijo="IDECOR_")
+    todas["geohash"] = geohash(todas["latitud"], todas["longitud"])
+    return todas
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.refresh and args.motor == "liviano":
+        parser.error("--refresh no aplica con --motor liviano: ese motor no usa la cache local y descarga siempre")
+    config = leer_config(args.config)
+    zonas = [z for z in config["zonas"] if not args.zonas or z["nombre"] in args.zonas]
+    if not zonas:
+        print("No hay zonas para procesar. Revisá --zonas y el archivo de configuración.")
+        exit()
+
+    # Las reglas de clasificación se pueden redefinir en el archivo de zonas: [[categoria, columna, patron], ...]
+    reglas = [tuple(regla) for regla in config.get("reglas", REGLAS_ESTADO)]
+
+    print(f"Procesando {len(zonas)} zonas con {args.procesos} procesos...")
+    por_zona = {}
+    with ProcessPoolExecutor(max_workers=args.procesos) as executor:
+        futuros = {
+            executor.submit(
+                procesar_zona,
+                zona,
+                config["wfs_url"],
+                config["layer_name"],
+                refrescar=args.refresh,
+                tamano_tile=args.tamano_tile,
+                max_workers=args.workers,
+                reglas=reglas,
+                motor=args.motor,
+            ): zona["nombre"]
+            for zona in zonas
+        }
+        for futuro in as_completed(futuros):
+            nombre = futuros[futuro]
+            try:
+                por_zona[nombre] = futuro.result()
+                print(f"Zona '{nombre}': {len(por_zona[nombre])} parcelas")
+            except Exception as e:
+                print(f"Error procesando la zona '{nombre}': {e}")
+
+    if not por_zona:
+        print("No se pudo procesar ninguna zona.")
+        exit(1)
+
+    todas = unir_zonas(por_zona, [z["nombre"] for z in zonas])
+
+    salida = Path(args.salida)
+    salida.mkdir(parents=True, exist_ok=True)
+    extension = {"sql": ".sql", "copy": ".copy.sql", "parquet": ".parquet"}[args.formato]
+
+    for nombre in por_zona:
+        ruta = salida / f"{nombre}{extension}"
+        total = escribir_salida(ruta, todas[todas["zona"] == nombre], args.formato, args.lote, args.geohash)
+        print(f"Archivo generado: {ruta} ({total} filas)")
+
+    ruta = salida / f"todas{extension}"
+    total = escribir_salida(ruta, todas, args.formato, args.lote, args.geohash)
+    print(f"Archivo generado: {ruta} ({total} filas)")
+
+    # Además del unido, uno por categoría (edificadas, baldíos, ...) con las mismas parcelas
+    for categoria, grupo in todas.groupby("categoria", observed=True, sort=True):
+        ruta = salida / f"todas_{categoria}{extension}"
+        total = escribir_salida(ruta, grupo, args.formato, args.lote, args.geohash)
+        print(f"Archivo generado: {ruta} ({total} filas)")
@@ -24,10 +24,16 @@ out center;
       lon = el.center.lon;
     }
     const direccion = `OSM-${el.id}`;
-    return `('${direccion}', ${lat}, ${lon})`;
+    return { direccion, lat, lon };
   });
 
-  const sql = `INSERT INTO casas (direccion, latitud, longitud) VALUES\n${filas.join(',\n')};`;
+  // Con --csv sale un CSV para pasarlo por conflar_casas.py y no cargar casas que ya están
+  if (process.argv.includes('--csv')) {
+    console.log(['direccion,latitud,longitud', ...filas.map(f => `${f.direccion},${f.lat},${f.lon}`)].join('\n'));
+    return;
+  }
+
+  const sql = `INSERT INTO casas (direccion, latitud, longitud) VALUES\n${filas.map(f => `('${f.direccion}', ${f.lat}, ${f.lon})`).join(',\n')};`;
 
   console.log(sql);
 })();
@@ -1,6 +1,13 @@
+import sys
+from pathlib import Path
+
 import requests
-import geopandas as gpd
-from io import BytesIO
+
+# El paquete `ingesta` está en la raíz del repo, un nivel más arriba que este script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ingesta.checkpoint import ruta_checkpoint
+from ingesta.sql import armar_insert, direcciones_con_respaldo, renderizar_filas
+from ingesta.wfs import descargar_centroides_paginado
 
 # --- Función para convertir Grados, Minutos, Segundos (DMS) a Grados Decimales ---
 def dms_to_decimal(degrees, minutes, seconds, direction):
@@ -28,8 +35,6 @@ max_lon_d = dms_to_decimal(64, 27, 11.5, 'W')
 # Latitud máxima (más al norte)
 max_lat_d = dms_to_decimal(31, 13, 59.1, 'S')
 
-# Formato del BBOX para WFS: minLon,minLat,maxLon,maxLat,CRS
-bbox_coords = f"{min_lon_d},{min_lat_d},{max_lon_d},{max_lat_d}"
 crs_code = "EPSG:4326" # Sistema de Coordenadas de Referencia (WGS84 para lat/lon)
 
 # --- 2. Configuración del servicio WFS de IDECOR ---
@@ -40,95 +45,43 @@ wfs_url = "https://idecor-ws.mapascordoba.gob.ar/geoserver/idecor/wfs"
 # Si este nombre no es exacto, el script no encontrará datos.
 layer_name = "idecor:parcelas" # <<<<<<< ¡VERIFICÁ Y CAMBIÁ ESTO SI ES NECESARIO!
 
-# --- 3. Parámetros para la solicitud WFS GetFeature ---
-params = {
-    'service': 'WFS',
-    'version': '1.0.0', # La versión común. Podría ser '2.0.0' en algunos casos.
-    'request': 'GetFeature',
-    'typeName': layer_name,
-    'outputFormat': 'application/json', # Pedimos GeoJSON
-    'srsName': crs_code, # Especificamos el CRS para la salida
-    'bbox': f"{bbox_coords},{crs_code}" # Aplicamos el filtro de la zona
-}
+# --- 3. Descarga paginada (WFS 2.0 startIndex/count) ---
+# Cuántas parcelas se piden por página; la memoria queda acotada a una página a la vez
+tamano_pagina = 1000
 
 # --- 4. Realizar la solicitud al WFS ---
 print(f"Intentando obtener datos de la capa '{layer_name}' de IDECOR...")
-print(f"URL de la solicitud (para depuración): {wfs_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}")
 
 try:
-    response = requests.get(wfs_url, params=params)
-    response.raise_for_status() # Lanza una excepción para errores HTTP (4xx o 5xx)
-
-    # Verificar si la respuesta es GeoJSON
-    content_type = response.headers.get('content-type', '').split(';')[0].strip()
-    if content_type == 'application/json':
-        geojson_data = response.json()
-        if not geojson_data or not geojson_data.get('features'):
-            print("No se encontraron elementos (parcelas/casas) en la zona delimitada o la capa no tiene datos.")
-            print("Por favor, verifica el 'layer_name' y las coordenadas del 'bbox'.")
-            exit()
-
-        gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
-        
-        # --- SOLUCIÓN AL ERROR DE GEOMETRÍAS NAIVE ---
-        # Forzamos el CRS de la GeoDataFrame. Asumimos que los datos ya vienen en EPSG:4326.
-        gdf.set_crs(crs_code, allow_override=True, inplace=True)
-        # -----------------------------------------------
-
-    else:
-        print(f"Error: El servicio WFS no devolvió 'application/json'. Tipo de contenido recibido: {content_type}")
-        print("Esto puede significar que el 'outputFormat' no es soportado o la solicitud es incorrecta.")
-        print("Intenta revisar la documentación de IDECOR o usar QGIS para depurar la conexión WFS.")
+    # Cada página se lee en stream y se reduce a centroides antes de pedir la siguiente
+    gdf = descargar_centroides_paginado(
+        wfs_url,
+        layer_name,
+        (min_lon_d, min_lat_d, max_lon_d, max_lat_d),
+        crs_code=crs_code,
+        tamano_pagina=tamano_pagina,
+        # Cada página queda guardada: si la corrida se corta, la próxima sigue desde donde quedó
+        checkpoint=ruta_checkpoint(wfs_url, layer_name, (min_lon_d, min_lat_d, max_lon_d, max_lat_d), crs_code),
+    )
+    if gdf.empty:
+        print("No se encontraron elementos (parcelas/casas) en la zona delimitada o la capa no tiene datos.")
+        print("Por favor, verifica el 'layer_name' y las coordenadas del 'bbox'.")
         exit()
 
-    # --- 5. Procesar los datos y generar los centroides ---
-    # La línea gdf.to_crs(crs_code) ya no es estrictamente necesaria aquí si set_crs fue exitoso,
-    # pero la dejamos por si acaso o para reproyectar a otro CRS en el futuro.
-    # En este caso, no hace daño si ya está seteado.
-    if gdf.crs != crs_code:
-        gdf = gdf.to_crs(crs_code)
+    # --- 6. Formatear la salida SQL ---
+    # Aquí puedes elegir qué propiedades de la parcela usar como 'direccion'.
+    # Es muy recomendable usar un campo de IDECOR si existe, como 'NomenclaturaCatastral', 'id_parcela', etc.
+    # Puedes descomentar la siguiente línea para ver los nombres de las columnas/atributos disponibles
+    # print(gdf.columns)
 
-    # Calcular el centroide de cada geometría (parcela/casa)
-    # Algunas geometrías pueden ser nulas o inválidas, las filtramos
-    gdf['centroid'] = gdf.geometry.centroid
-    gdf = gdf[gdf['centroid'].is_valid]
+    # Por defecto, intentamos usar 'nomenclatura' si existe, o 'gid', o un identificador generado
+    direcciones = direcciones_con_respaldo(gdf, gdf.index)
 
-    # Extraer latitud y longitud
-    gdf['latitud'] = gdf['centroid'].y
-    gdf['longitud'] = gdf['centroid'].x
+    # Sin columna id: la tabla la completa con su secuencia
+    filas_sql = renderizar_filas(direcciones, gdf['latitud'], gdf['longitud'])
 
-    # --- 6. Formatear la salida SQL ---
-    filas_sql = []
-    for index, row in gdf.iterrows():
-        # Aquí puedes elegir qué propiedad de la parcela usar como 'direccion'.
-        # Es muy recomendable usar un campo de IDECOR si existe, como 'NomenclaturaCatastral', 'id_parcela', etc.
-        # Puedes descomentar la siguiente línea para ver los nombres de las columnas/atributos disponibles
-        # print(row.keys())
-
-        # Por defecto, intentamos usar 'nomenclatura' si existe, o 'gid', o un identificador generado
-        direccion = ""
-        if 'nomenclatura' in row and row['nomenclatura']:
-            direccion = str(row['nomenclatura'])
-        elif 'gid' in row and row['gid']:
-            direccion = str(row['gid'])
-        else:
-            direccion = f"IDECOR_Parcela_{index}" # Genera un ID si no hay uno más descriptivo
-
-        lat = row['latitud']
-        lon = row['longitud']
-
-        # Escapar comillas simples en la dirección para SQL (doblando la comilla)
-        direccion_escaped = str(direccion).replace("'", "''")
-
-        filas_sql.append(f"('{direccion_escaped}', {lat}, {lon})")
-
-    if filas_sql:
-        # Generar la parte de las filas del SQL por separado
-        filas_unidas = ',\n'.join(filas_sql)
-
-        # Ahora construir el SQL completo usando un f-string multilinea
-        sql_insert = f"""INSERT INTO casas (direccion, latitud, longitud) VALUES
-{filas_unidas};"""
+    if len(filas_sql):
+        sql_insert = armar_insert(filas_sql, tabla="casas", columnas="direccion, latitud, longitud")
 
         print("\n--- SQL Generado ---")
         print(sql_insert)
@@ -2,13 +2,66 @@
 const express = require('express');
 const app = express();
 const pool = require('./db'); // tu pool pg o conexión a DB
+const fs = require('fs');
+const path = require('path');
 
 app.use(express.json());
+
+// Datos del mapa precalculados por exportar_mapa.py (public/datos), que usa admin.html.
+// Se sirve la versión .br o .gz ya comprimida según lo que acepte el navegador.
+// Los archivos llevan el hash del contenido en el nombre, así que se cachean
+// para siempre; el manifest.json cambia en cada exportación y se revalida.
+const DIRECTORIO_DATOS = path.join(__dirname, 'public', 'datos');
+const TIPOS_DATOS = { '.json': 'application/json', '.bin': 'application/octet-stream' };
+app.use('/datos', (req, res, next) => {
+  const tipo = TIPOS_DATOS[path.extname(req.path)];
+  const archivo = path.join(DIRECTORIO_DATOS, path.normalize(req.path));
+  if (!tipo || !archivo.startsWith(DIRECTORIO_DATOS + path.sep)) return next();
+
+  const cache = path.basename(archivo) === 'manifest.json' ? 'no-cache' : 'public, max-age=31536000, immutable';
+  const acepta = req.headers['accept-encoding'] || '';
+  res.set({ 'Vary': 'Accept-Encoding', 'Cache-Control': cache });
+  for (const [codificacion, sufijo] of [['br', '.br'], ['gzip', '.gz']]) {
+    if (acepta.includes(codificacion) && fs.existsSync(archivo + sufijo)) {
+      res.set({ 'Content-Encoding': codificacion, 'Content-Type': tipo });
+      return res.sendFile(archivo + sufijo);
+    }
+  }
+  next();
+});
+
 app.use(express.static('public')); // sirviendo archivos públicos
 
+// Columnas que se pueden pedir con ?fields= (la lista va directo al SELECT)
+const COLUMNAS_CASAS = ['id', 'direccion', 'latitud', 'longitud', 'estado', 'comentario',
+  'asignado_a', 'fecha_asignacion', 'actualizado_por', 'updated_at', 'idecor_id'];
+
+// Si la tabla tiene la columna PostGIS geom (ver "script bd neon"), el filtro por
+// bbox usa su índice GiST; si no, el índice sobre (latitud, longitud).
+let tieneGeom = null;
+async function usaGeom() {
+  if (tieneGeom === null) {
+    const r = await pool.query(`
+      SELECT 1 FROM information_schema.columns
+      WHERE table_schema = 'public' AND table_name = 'casas' AND column_name = 'geom'
+    `);
+    tieneGeom = r.rowCount > 0;
+  }
+  return tieneGeom;
+}
+
+// ?bbox=minLon,minLat,maxLon,maxLat (el formato de map.getBounds().toBBoxString() de Leaflet)
+function leerBbox(texto) {
+  const valores = String(texto).split(',').map(Number);
+  if (valores.length !== 4 || !valores.every(Number.isFinite)) return null;
+  const [minLon, minLat, maxLon, maxLat] = valores;
+  if (minLon > maxLon || minLat > maxLat) return null;
+  return valores;
+}
+
 // VOLVER AL ANTEERIOR SI NO SANDSAAAAAAAA 
 app.get('/casas', async (req, res) => {
-  const { usuario } = req.query;
+  const { usuario, bbox, fields } = req.query;
 
   try {
     if (usuario) {
@@ -24,6 +77,19 @@ app.get('/casas', async (req, res) => {
   [usuario]
 );
       return res.json(result.rows);
+    } else if (bbox) {
+      // Solo las casas del área visible del mapa, con las columnas pedidas
+      const limites = leerBbox(bbox);
+      if (!limites) return res.status(400).send('bbox inválido (minLon,minLat,maxLon,maxLat)');
+      const columnas = fields ? String(fields).split(',').map(c => c.trim()) : COLUMNAS_CASAS;
+      if (!columnas.length || columnas.some(c => !COLUMNAS_CASAS.includes(c))) {
+        return res.status(400).send(`fields inválido (columnas posibles: ${COLUMNAS_CASAS.join(', ')})`);
+      }
+      const filtro = await usaGeom()
+        ? 'geom && ST_MakeEnvelope($1, $2, $3, $4, 4326)'
+        : 'longitud BETWEEN $1 AND $3 AND latitud BETWEEN $2 AND $4';
+      const result = await pool.query(`SELECT ${columnas.join(', ')} FROM casas WHERE ${filtro}`, limites);
+      return res.json(result.rows);
     } else {
       const result = await pool.query('SELECT * FROM casas');
       return res.json(result.rows);
@@ -36,7 +102,7 @@ app.get('/casas', async (req, res) => {
 
 // Endpoint para asignar casas
 app.post('/asignar', async (req, res) => {
-  const { usuario, ids, fecha } = req.body;
+  const { usuario, ids, fecha, ordenar } = req.body;
 
   // Validaciones
   if (!usuario || !ids || !Array.isArray(ids) || !fecha) {
@@ -44,7 +110,16 @@ app.post('/asignar', async (req, res) => {
   }
 
   try {
-    const q = `
+    // Con ordenar, cada casa queda un segundo después de la anterior en la lista:
+    // /casas?usuario= ordena por fecha_asignacion, así sale en el orden de la ruta
+    const q = ordenar
+      ? `
+      UPDATE casas 
+      SET asignado_a = $1,
+          fecha_asignacion = $2::timestamp + (array_position($3::int[], id) - 1) * interval '1 second'
+      WHERE id = ANY($3::int[])
+    `
+      : `
       UPDATE casas 
       SET asignado_a = $1, fecha_asignacion = $2
       WHERE id = ANY($3::int[])
@@ -91,36 +166,79 @@ app.post('/actualizar', async (req, res) => {
   }
 });
 
-// Endpoint para estadísticas
+// Conteos por persona y estado, agregados en la base
+async function contarPorPersona() {
+  const result = await pool.query(`
+    SELECT asignado_a, estado, count(*)::int AS cantidad
+    FROM casas
+    GROUP BY asignado_a, estado
+  `);
+  return result.rows;
+}
+
+// Endpoint para estadísticas: los conteos salen agregados de la base y de las
+// casas solo viajan las que ya se relevaron (con estado distinto de 'otro', el
+// valor por defecto de la columna, o con comentario)
 app.get('/stats', async (req, res) => {
   try {
-    const casasRes = await pool.query('SELECT * FROM casas');
-    const casas = casasRes.rows;
+    const [comentariosRes, conteos] = await Promise.all([
+      pool.query(`
+        SELECT id, direccion, latitud, longitud, asignado_a, estado, comentario
+        FROM casas
+        WHERE (estado IS NOT NULL AND estado <> 'otro') OR comentario IS NOT NULL
+        ORDER BY asignado_a, id
+      `),
+      contarPorPersona()
+    ]);
 
     // Comentarios por casa
-    const comentarios = casas.map(c => ({
-      id: c.id,
-      direccion: c.direccion,
-      asignado_a: c.asignado_a,
-      estado: c.estado,
-      comentario: c.comentario
-    }));
+    const comentarios = comentariosRes.rows;
 
+    let totalVisitadas = 0;
     // Casas visitadas por persona
     const visitadas = {};
     // Casas asignadas por persona
     const asignadas = {};
 
-    casas.forEach(c => {
+    conteos.forEach(c => {
+      if (c.estado === 'visitada') totalVisitadas += c.cantidad;
+      if (c.asignado_a) {
+        asignadas[c.asignado_a] = (asignadas[c.asignado_a] || 0) + c.cantidad;
+        if (c.estado === 'visitada') {
+          visitadas[c.asignado_a] = (visitadas[c.asignado_a] || 0) + c.cantidad;
+        }
+      }
+    });
+
+    res.json({ total_visitadas: totalVisitadas, comentarios, visitadas, asignadas });
+  } catch (e) {
+    console.error(e);
+    res.status(500).send('Error al obtener estadísticas');
+  }
+});
+
+// Solo los totales, sin traer las casas: lo que cuesta no depende del tamaño de la tabla en Node
+app.get('/stats/resumen', async (req, res) => {
+  try {
+    const conteos = await contarPorPersona();
+    let total = 0;
+    const porEstado = {};
+    const visitadas = {};
+    const asignadas = {};
+
+    conteos.forEach(c => {
+      const estado = c.estado || 'sin_estado';
+      total += c.cantidad;
+      porEstado[estado] = (porEstado[estado] || 0) + c.cantidad;
       if (c.asignado_a) {
-        asignadas[c.asignado_a] = (asignadas[c.asignado_a] || 0) + 1;
+        asignadas[c.asignado_a] = (asignadas[c.asignado_a] || 0) + c.cantidad;
         if (c.estado === 'visitada') {
-          visitadas[c.asignado_a] = (visitadas[c.asignado_a] || 0) + 1;
+          visitadas[c.asignado_a] = (visitadas[c.asignado_a] || 0) + c.cantidad;
         }
       }
     });
 
-    res.json({ comentarios, visitadas, asignadas });
+    res.json({ total, por_estado: porEstado, visitadas, asignadas });
   } catch (e) {
     console.error(e);
     res.status(500).send('Error al obtener estadísticas');
@@ -133,6 +251,7 @@ app.post('/agregar', async (req, res) => {
     return res.status(400).send('Faltan datos');
   }
   try {
+    // geom y geohash los completan los triggers de la tabla (ver "script bd neon")
     const q = 'INSERT INTO casas (direccion, latitud, longitud) VALUES ($1, $2, $3)';
     await pool.query(q, [direccion, latitud, longitud]);
     res.sendStatus(200);
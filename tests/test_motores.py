@@ -0,0 +1,81 @@
+"""Los dos motores de ingesta (geopandas y liviano) tienen que dar las mismas parcelas y coordenadas.
+
+parcelas_mixtas.geojson tiene un caso de cada cosa que separa los caminos del
+motor liviano: anillos simples (horarios, antihorarios, en L, con puntos
+repetidos), polígonos con hueco, multipolígonos de una y de dos partes,
+inválidos (moño, punta, hueco afuera) y geometrías nulas o vacías.
+"""
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from ingesta.geometria import calcular_centroides  # noqa: E402
+from ingesta.liviano import centroides, centroides_en_tiles  # noqa: E402
+from ingesta.wfs import descargar_parcelas_en_tiles  # noqa: E402
+from servidor_wfs import ServidorWFS  # noqa: E402
+
+FEATURES = json.loads((Path(__file__).resolve().parent / "parcelas_mixtas.geojson").read_text(encoding="utf-8"))["features"]
+CAPA = "idecor:parcelas"
+# Tiles más chicos que la zona del archivo: varias parcelas cruzan de un tile a otro
+TAMANO_TILE = 0.001
+
+
+def _bbox(features):
+    return tuple(gpd.GeoDataFrame.from_features(features).total_bounds.tolist())
+
+
+@pytest.fixture(scope="module")
+def servidor():
+    servidor = ServidorWFS(FEATURES).iniciar()
+    yield servidor
+    servidor.detener()
+
+
+@pytest.mark.parametrize("representativo", [False, True])
+def test_centroides_iguales_a_geopandas(representativo):
+    gdf = gpd.GeoDataFrame.from_features(FEATURES, crs="EPSG:4326")
+    puntos, reparadas = calcular_centroides(gdf.geometry, representativo=representativo)
+    sin_punto = puntos.isna() | puntos.is_empty
+
+    lon, lat, reparadas_livianas = centroides([feature["geometry"] for feature in FEATURES],
+                                              representativo=representativo)
+
+    np.testing.assert_array_equal(np.isnan(lon), sin_punto.to_numpy())
+    # Los mismos números, no solo parecidos
+    np.testing.assert_array_equal(lon[~sin_punto], puntos[~sin_punto].x.to_numpy())
+    np.testing.assert_array_equal(lat[~sin_punto], puntos[~sin_punto].y.to_numpy())
+    assert int(reparadas_livianas.sum()) == reparadas == 3
+
+
+def test_tiles_mismas_parcelas_que_geopandas(servidor):
+    bbox = _bbox(FEATURES)
+    gdf = descargar_parcelas_en_tiles(servidor.url, CAPA, bbox, tamano_tile=TAMANO_TILE, directorio_http=None)
+    puntos, reparadas = calcular_centroides(gdf.geometry)
+    validos = puntos.notna() & ~puntos.is_empty
+    gdf, puntos = gdf[validos], puntos[validos]
+
+    parcelas, reparadas_livianas = centroides_en_tiles(servidor.url, CAPA, bbox, ["caso"],
+                                                       tamano_tile=TAMANO_TILE, directorio_http=None)
+
+    assert parcelas["fid"].tolist() == gdf["fid"].tolist()
+    np.testing.assert_array_equal(parcelas["longitud"].to_numpy(), puntos.x.to_numpy())
+    np.testing.assert_array_equal(parcelas["latitud"].to_numpy(), puntos.y.to_numpy())
+    assert reparadas_livianas == reparadas
+
+
+def test_tiles_mismo_orden_en_cada_corrida(servidor):
+    # Con varios tiles en paralelo el orden en que terminan cambia; el resultado no
+    bbox = _bbox(FEATURES)
+    corridas = [
+        descargar_parcelas_en_tiles(servidor.url, CAPA, bbox, tamano_tile=TAMANO_TILE, max_workers=8,
+                                    directorio_http=None)["fid"].tolist()
+        for _ in range(5)
+    ]
+    assert all(corrida == corridas[0] for corrida in corridas)
+    assert len(corridas[0]) == len(set(corridas[0]))
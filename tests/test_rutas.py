@@ -0,0 +1,25 @@
+"""La partición en rutas tiene que dar grupos parejos: ninguno con más de una casa de diferencia."""
+import numpy as np
+import pytest
+
+from ingesta.rutas import armar_rutas, particionar
+
+
+@pytest.mark.parametrize("casas, grupos", [(9, 4), (10, 3), (13, 5), (50, 7)])
+@pytest.mark.parametrize("semilla", range(20))
+def test_grupos_parejos(casas, grupos, semilla):
+    # Casas al azar en un cuadrado de 500 m: con 9 en 4 grupos el k-means solo dejaba grupos de 1 y de 3
+    puntos = np.random.default_rng(semilla).uniform(0, 500, (casas, 2))
+    conteo = np.bincount(particionar(puntos, grupos), minlength=grupos)
+    assert conteo.sum() == casas
+    assert conteo.max() - conteo.min() <= 1
+
+
+def test_rutas_cubren_todas_las_casas_una_vez():
+    rng = np.random.default_rng(0)
+    latitudes = -31.617 + rng.uniform(-0.003, 0.003, 40)
+    longitudes = -64.39 + rng.uniform(-0.003, 0.003, 40)
+    rutas = armar_rutas(latitudes, longitudes, 6)
+    assert len(rutas) == 6
+    assert sorted(np.concatenate(rutas).tolist()) == list(range(40))
+    assert max(map(len, rutas)) - min(map(len, rutas)) <= 1
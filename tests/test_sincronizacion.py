@@ -0,0 +1,122 @@
+"""La sincronización contra una base de verdad, con las parcelas del servidor WFS local.
+
+Necesita un Postgres: el de DATABASE_URL_TEST o, si no está, uno temporal con
+pgserver (pip install pgserver). Sin ninguno de los dos los tests se saltean.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from ingesta.clasificacion import clasificar  # noqa: E402
+from ingesta.descarga import FiltroWFS  # noqa: E402
+from ingesta.liviano import centroides_en_tiles  # noqa: E402
+from ingesta.postgres import cargar_con_copy, lotes_csv_idecor  # noqa: E402
+from ingesta.sincronizacion import columna_idecor_id, sincronizar_casas  # noqa: E402
+from ingesta.sql import direcciones_con_respaldo  # noqa: E402
+from parcelas_sinteticas import generar_features  # noqa: E402
+from servidor_wfs import ServidorWFS  # noqa: E402
+
+FEATURES = list(generar_features(60, semilla=3, proporcion_invalidas=0))
+CAPA = "idecor:parcelas"
+BBOX = (-64.4, -31.63, -64.38, -31.6)
+TAMANO_TILE = 0.005
+
+# Las columnas de casas que tocan la carga y la sincronización (ver "script bd")
+ESQUEMA = """
+    DROP TABLE IF EXISTS casas;
+    CREATE TABLE casas (
+        id serial PRIMARY KEY,
+        direccion text,
+        latitud numeric,
+        longitud numeric,
+        estado text DEFAULT 'otro',
+        comentario text,
+        asignado_a integer,
+        idecor_id text,
+        categoria text
+    );
+    CREATE UNIQUE INDEX casas_idecor_id_key ON casas (idecor_id);
+"""
+
+
+@pytest.fixture(scope="module")
+def dsn(tmp_path_factory):
+    if os.environ.get("DATABASE_URL_TEST"):
+        yield os.environ["DATABASE_URL_TEST"]
+        return
+    pgserver = pytest.importorskip("pgserver")
+    servidor = pgserver.get_server(tmp_path_factory.mktemp("pgdata"), cleanup_mode="stop")
+    yield servidor.get_uri()
+    servidor.cleanup()
+
+
+@pytest.fixture
+def casas(dsn):
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute(ESQUEMA)
+    conn.close()
+    return dsn
+
+
+def _descargar(features, categorias=None):
+    servidor = ServidorWFS(features).iniciar()
+    try:
+        filtro = FiltroWFS(propiedades=["Estado", "nomenclatura", "gid"], categorias=categorias)
+        parcelas, _ = centroides_en_tiles(servidor.url, CAPA, BBOX, filtro.propiedades, tamano_tile=TAMANO_TILE,
+                                          directorio_http=None, filtro=filtro)
+    finally:
+        servidor.detener()
+    parcelas["categoria"] = clasificar(parcelas)
+    return parcelas
+
+
+def _categorias_en_base(dsn):
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("SELECT categoria, count(*) FROM casas GROUP BY categoria")
+        conteos = dict(cur.fetchall())
+    conn.close()
+    return conteos
+
+
+def _sincronizar_edificadas(features, dsn):
+    edificadas = _descargar(features, categorias=["edificadas"])
+    direcciones = direcciones_con_respaldo(edificadas, edificadas["fid"], prefijo="IDECOR_")
+    return sincronizar_casas(edificadas, direcciones, BBOX, dsn, borrar_bajas=True, categorias=["edificadas"])
+
+
+def test_sync_de_edificadas_no_borra_baldios(casas):
+    # Primero se cargan todas las categorías, como con --categorias edificadas baldios desconocidas
+    todas = _descargar(FEATURES)
+    cargar_con_copy(lotes_csv_idecor(todas, columna_idecor_id(todas),
+                                     direcciones_con_respaldo(todas, todas["fid"], prefijo="IDECOR_")), casas)
+    antes = _categorias_en_base(casas)
+    assert antes.get("baldios") and antes.get("edificadas")
+
+    resumen = _sincronizar_edificadas(FEATURES, casas)
+
+    assert resumen["altas"] == resumen["bajas"] == resumen["borradas"] == 0
+    assert _categorias_en_base(casas) == antes
+
+
+def test_sync_de_edificadas_borra_las_edificadas_que_ya_no_estan(casas):
+    todas = _descargar(FEATURES)
+    cargar_con_copy(lotes_csv_idecor(todas, columna_idecor_id(todas),
+                                     direcciones_con_respaldo(todas, todas["fid"], prefijo="IDECOR_")), casas)
+    antes = _categorias_en_base(casas)
+    # IDECOR deja de traer una edificada y un baldío: solo la edificada es baja de esta sincronización
+    edificada = next(f for f in FEATURES if f["properties"]["Estado"] == "Edificado")
+    baldio = next(f for f in FEATURES if f["properties"]["Estado"] == "Baldío")
+    restantes = [f for f in FEATURES if f is not edificada and f is not baldio]
+
+    resumen = _sincronizar_edificadas(restantes, casas)
+
+    assert resumen["bajas"] == resumen["borradas"] == 1
+    despues = _categorias_en_base(casas)
+    assert despues["edificadas"] == antes["edificadas"] - 1
+    assert despues["baldios"] == antes["baldios"]
@@ -1,6 +1,41 @@
-import requests
-import geopandas as gpd
-from io import BytesIO
+import argparse
+
+from ingesta.clasificacion import CATEGORIA_DESCONOCIDA, REGLAS_ESTADO, clasificar
+from ingesta.descarga import FiltroWFS
+from ingesta.liviano import centroides_en_tiles
+from ingesta.pipeline import MOTORES
+from ingesta.postgres import cargar_con_copy, escribir_copy, lotes_csv_idecor
+from ingesta.sincronizacion import columna_idecor_id, sincronizar_casas
+from ingesta.sql import (COLUMNAS_CASAS_IDECOR, CONFLICTO_IDECOR, TAMANO_LOTE, como_literal, direcciones_con_respaldo,
+                         escribir_inserts_por_lotes, lotes_de_filas, sql_ajustar_secuencia)
+
+CATEGORIAS = [categoria for categoria, _, _ in REGLAS_ESTADO] + [CATEGORIA_DESCONOCIDA]
+
+parser = argparse.ArgumentParser(description="Descarga parcelas de IDECOR y genera el SQL de casas edificadas, baldíos y desconocidas.")
+parser.add_argument("--refresh", action="store_true",
+                    help="Ignora la cache local (.cache_idecor/) y vuelve a descargar de IDECOR (solo --motor geopandas)")
+parser.add_argument("--lote", type=int, default=TAMANO_LOTE,
+                    help=f"Filas por INSERT en el SQL generado (por defecto {TAMANO_LOTE})")
+parser.add_argument("--transaccion", action="store_true",
+                    help="Envuelve todo el SQL en BEGIN/COMMIT (todo o nada)")
+parser.add_argument("--formato", choices=["sql", "copy"], default="sql",
+                    help="sql: INSERTs por lotes; copy: COPY ... FROM STDIN en CSV para psql (mucho más rápido)")
+parser.add_argument("--cargar", action="store_true",
+                    help="Además de generar los archivos, carga las edificadas directo en la base de DATABASE_URL con COPY + upsert por idecor_id")
+parser.add_argument("--sync", action="store_true",
+                    help="En vez de generar SQL, aplica en la base solo las altas/cambios/bajas respecto de IDECOR")
+parser.add_argument("--borrar-bajas", action="store_true",
+                    help="Con --sync, borra las casas que ya no están en IDECOR (nunca las ya relevadas)")
+parser.add_argument("--simular", action="store_true",
+                    help="Con --sync, calcula la diferencia y hace rollback sin cambiar nada")
+parser.add_argument("--categorias", nargs="+", choices=CATEGORIAS, default=CATEGORIAS,
+                    help="Categorías a descargar y generar (por defecto todas); GeoServer filtra las demás")
+parser.add_argument("--motor", choices=MOTORES, default="geopandas",
+                    help="liviano: centroides con numpy sin geopandas (arranca rápido y usa menos memoria, "
+                         "sin cache local de parcelas); mismo resultado que geopandas")
+args = parser.parse_args()
+if args.refresh and args.motor == "liviano":
+    parser.error("--refresh no aplica con --motor liviano: ese motor no usa la cache local y descarga siempre")
 
 # --- Función para convertir DMS a Decimal ---
 def dms_to_decimal(degrees, minutes, seconds, direction):
@@ -15,69 +50,124 @@ max_lat_d = dms_to_decimal(31, 36, 17.1, 'S')
 min_lon_d = dms_to_decimal(64, 25, 6.0, 'W')
 max_lon_d = dms_to_decimal(64, 22, 4.0, 'W')
 
-bbox_coords = f"{min_lon_d},{min_lat_d},{max_lon_d},{max_lat_d}"
 crs_code = "EPSG:4326"
 
 # --- Configuración del WFS ---
 wfs_url = "https://idecor-ws.mapascordoba.gob.ar/geoserver/idecor/wfs"
 layer_name = "idecor:parcelas"
 
-params = {
-    'service': 'WFS',
-    'version': '1.0.0',
-    'request': 'GetFeature',
-    'typeName': layer_name,
-    'outputFormat': 'application/json',
-    'srsName': crs_code,
-    'bbox': f"{bbox_coords},{crs_code}"
-}
-
-print("Descargando parcelas dentro del BBOX...")
-resp = requests.get(wfs_url, params=params)
-resp.raise_for_status()
-
-gjson = resp.json()
-gdf = gpd.GeoDataFrame.from_features(gjson["features"])
-gdf.set_crs(crs_code, allow_override=True, inplace=True)
-
-# --- Calcular centroides ---
-gdf["centroid"] = gdf.geometry.centroid
-gdf["latitud"] = gdf["centroid"].y
-gdf["longitud"] = gdf["centroid"].x
-
-# --- Normalizamos el campo Estado ---
-gdf["Estado"] = gdf["Estado"].astype(str).str.upper()
-
-gdf_baldios = gdf[gdf["Estado"].str.contains("BALD")]
-gdf_edificados = gdf[gdf["Estado"].str.contains("EDIF")]
+# --- Descarga en tiles ---
+# Tamaño de cada tile en grados y cantidad de descargas simultáneas contra IDECOR
+TAMANO_TILE_GRADOS = 0.01
+MAX_WORKERS = 4
+
+# Solo se le piden a IDECOR las categorías que se van a usar (la sincronización usa
+# solo edificadas) y los atributos Estado/nomenclatura/gid, no todos los de la capa
+filtro = FiltroWFS(
+    propiedades=["Estado", "nomenclatura", "gid"],
+    categorias=["edificadas"] if args.sync else args.categorias,
+)
+
+if args.motor == "liviano":
+    # Centroides con numpy a medida que llegan los tiles, sin geopandas (ver ingesta/liviano.py)
+    gdf, reparadas = centroides_en_tiles(
+        wfs_url,
+        layer_name,
+        (min_lon_d, min_lat_d, max_lon_d, max_lat_d),
+        filtro.propiedades,
+        crs_code=crs_code,
+        tamano_tile=TAMANO_TILE_GRADOS,
+        max_workers=MAX_WORKERS,
+        filtro=filtro,
+    )
+else:
+    from ingesta.cache import parcelas_con_cache
+    from ingesta.geometria import calcular_centroides
+    from ingesta.wfs import descargar_parcelas_en_tiles
+
+    # Si ya se descargó esta misma zona se lee de la cache local en vez de ir a IDECOR
+    gdf = parcelas_con_cache(
+        descargar_parcelas_en_tiles,
+        wfs_url,
+        layer_name,
+        (min_lon_d, min_lat_d, max_lon_d, max_lat_d),
+        srs_name=crs_code,
+        refrescar=args.refresh,
+        tamano_tile=TAMANO_TILE_GRADOS,
+        max_workers=MAX_WORKERS,
+        filtro=filtro,
+    )
+
+    # --- Calcular centroides ---
+    # En un CRS métrico y de una sola vez; las geometrías inválidas se reparan
+    gdf["centroid"], reparadas = calcular_centroides(gdf.geometry)
+    gdf["latitud"] = gdf["centroid"].y
+    gdf["longitud"] = gdf["centroid"].x
+if reparadas:
+    print(f"Se repararon {reparadas} geometrías inválidas")
+
+# --- Clasificamos las parcelas por Estado (edificadas, baldíos, desconocidas) ---
+# Una sola pasada sobre la frame; las reglas están en ingesta/clasificacion.py
+gdf["categoria"] = clasificar(gdf)
+gdf_edificados = gdf[gdf["categoria"] == "edificadas"]
 
 print(f"Total parcelas descargadas: {len(gdf)}")
-print(f"Encontrados EDIFICADOS: {len(gdf_edificados)}")
-print(f"Encontrados BALDIOS: {len(gdf_baldios)}")
+for categoria, cantidad in gdf["categoria"].value_counts(sort=False).items():
+    print(f"Encontradas {categoria.upper()}: {cantidad}")
 
 # --- Función para crear SQL ---
-def generar_sql(nombre_archivo, gdf):
-    filas = []
-    current_id = 0
-
-    for _, row in gdf.iterrows():
-        direccion = str(row.get("nomenclatura", f"Parcela_{current_id}"))
-        direccion = direccion.replace("'", "''")
-
-        lat = row["latitud"]
-        lon = row["longitud"]
-
-        filas.append(f"({current_id}, '{direccion}', {lat}, {lon})")
-        current_id += 1
-
-    sql = f"INSERT INTO public.casas (id, direccion, latitud, longitud) VALUES\n" + ",\n".join(filas) + ";"
+def generar_sql(nombre_archivo, gdf, cargar=False):
+    # Sin ids propios: cada parcela va con su idecor_id y toma id de la secuencia al
+    # cargarse, así los archivos de corridas distintas (o de otras categorías) no chocan
+    gdf = gdf.assign(
+        idecor_id=columna_idecor_id(gdf),
+        direccion=direcciones_con_respaldo(gdf, gdf["fid"], prefijo="IDECOR_"),
+    )
+    gdf = gdf[~gdf["idecor_id"].duplicated()]
+    # La dirección ya está calculada: se la pasamos tal cual a los renderizadores
+    direcciones_de = lambda parte, _ids: parte["direccion"]  # noqa: E731
 
     with open(nombre_archivo, "w") as f:
-        f.write(sql)
-
-    print(f"Archivo generado: {nombre_archivo} ({len(filas)} filas)")
-
+        f.write(sql_ajustar_secuencia())
+        if args.formato == "copy":
+            # COPY no tiene ON CONFLICT: si una parcela ya estaba, la carga falla entera
+            total = escribir_copy(f, lotes_csv_idecor(gdf, gdf["idecor_id"], gdf["direccion"], tamano_lote=args.lote),
+                                  columnas=COLUMNAS_CASAS_IDECOR)
+        else:
+            lotes = lotes_de_filas(gdf, como_literal(gdf["idecor_id"]), direcciones_de, tamano_lote=args.lote,
+                                   con_categoria=True)
+            total = escribir_inserts_por_lotes(f, lotes, columnas=COLUMNAS_CASAS_IDECOR, conflicto=CONFLICTO_IDECOR,
+                                               transaccion=args.transaccion)
+
+    print(f"Archivo generado: {nombre_archivo} ({total} filas)")
+
+    if cargar:
+        copiadas = cargar_con_copy(lotes_csv_idecor(gdf, gdf["idecor_id"], gdf["direccion"], tamano_lote=args.lote))
+        print(f"Cargadas {copiadas} filas en la base con COPY")
+
+
+# --- Sincronización incremental con la tabla casas ---
+if args.sync:
+    # Para las altas sin nomenclatura ni gid, la dirección se arma con el id de IDECOR
+    direcciones = direcciones_con_respaldo(gdf_edificados, gdf_edificados["fid"], prefijo="IDECOR_")
+    resumen = sincronizar_casas(
+        gdf_edificados,
+        direcciones,
+        (min_lon_d, min_lat_d, max_lon_d, max_lat_d),
+        borrar_bajas=args.borrar_bajas,
+        simular=args.simular,
+        # Solo se descargaron edificadas: los baldíos de la zona no son bajas
+        categorias=["edificadas"],
+    )
+    print(f"Sincronización{' (simulada)' if args.simular else ''}: {resumen}")
+    exit()
 
 # --- Generar archivos SQL ---
-generar_sql("casas_edificadas.sql", gdf_edificados)
-"""generar_sql("casas_baldios.sql", gdf_baldios)"""
+# Un archivo por categoría en la misma corrida. Como las filas se identifican por
+# idecor_id, se pueden cargar en cualquier orden y volver a cargar sin duplicar.
+# Con --cargar solo se cargan en la base las edificadas.
+for categoria, grupo in gdf.groupby("categoria", observed=False, sort=True):
+    # Las categorías que no se pidieron no se descargaron: no se pisa su archivo anterior
+    if categoria not in args.categorias:
+        continue
+    generar_sql(f"casas_{categoria}.sql", grupo, cargar=args.cargar and categoria == "edificadas")